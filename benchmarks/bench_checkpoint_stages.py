@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You(youansheng@gmail.com)
+# Activation checkpointing: peak allocated memory & step time of network.checkpoint_stages settings on CPU.
+
+
+import os
+import sys
+import time
+import argparse
+import torch
+from torch.profiler import profile, ProfilerActivity
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.tools.util.configer import Configer
+from model.seg.model_manager import ModelManager
+from model.seg.loss.loss import Loss
+
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'configs/seg/sfnet_res101_ui.conf')
+
+SETTINGS = dict(
+    res_sfnet=[[], ['stage1', 'stage2', 'stage3', 'stage4'], ['stage1', 'stage2', 'stage3', 'stage4', 'head']],
+    pspnet=[[], ['stage1', 'stage2'], ['stage1', 'stage2', 'ppm']],
+    deeplabv3=[[], ['stage1', 'stage2'], ['stage1', 'stage2', 'head']],
+)
+
+
+def build(args, stages):
+    configer = Configer(config_file=CONFIG_FILE)
+    configer.update('network.model_name', args.model)
+    configer.update('network.backbone', args.backbone)
+    configer.update('network.pretrained', None)
+    configer.update('network.checkpoint_stages', stages)
+    configer.add('phase', 'train')
+    if args.model != 'res_sfnet':
+        configer.update('loss.loss_type', 'dsnohemce_loss')
+
+    torch.manual_seed(0)
+    return configer, ModelManager(configer).get_seg_model(), Loss(configer)
+
+
+def make_batch(args, num_classes):
+    generator = torch.Generator().manual_seed(1)
+    img = torch.randn(args.batch_size, 3, args.size, args.size, generator=generator)
+    labelmap = torch.randint(0, num_classes, (args.batch_size, args.size // 16, args.size // 16), generator=generator)
+    labelmap = labelmap.repeat_interleave(16, 1).repeat_interleave(16, 2)
+    return dict(img=img, labelmap=labelmap)
+
+
+def step(net, loss, data_dict):
+    net.zero_grad()
+    loss_value = loss(net(data_dict))['loss']
+    loss_value.backward()
+    return loss_value
+
+
+def peak_memory(net, loss, data_dict):
+    """Peak of the bytes allocated during a train step, replayed from the profiler memory events."""
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        step(net, loss, data_dict)
+
+    allocated, peak = 0, 0
+    for event in sorted(prof.events(), key=lambda e: e.time_range.start):
+        allocated += event.self_cpu_memory_usage
+        peak = max(peak, allocated)
+
+    return peak / 2 ** 20
+
+
+def run_setting(args, stages):
+    configer, net, loss = build(args, stages)
+    data_dict = make_batch(args, configer.get('data.num_classes'))
+    step(net, loss, data_dict)
+    peak_mb = peak_memory(net, loss, data_dict)
+    start_time = time.time()
+    for _ in range(args.iters):
+        step(net, loss, data_dict)
+
+    return peak_mb, (time.time() - start_time) / args.iters
+
+
+def parity(args, stages):
+    """Loss, gradients & BatchNorm running stats of a step with and without checkpointing."""
+    results = []
+    for setting in [[], stages]:
+        configer, net, loss = build(args, setting)
+        data_dict = make_batch(args, configer.get('data.num_classes'))
+        loss_value = step(net, loss, data_dict)
+        grads = torch.cat([p.grad.flatten() for p in net.parameters() if p.grad is not None])
+        buffers = torch.cat([b.float().flatten() for b in net.buffers()])
+        results.append((loss_value.detach(), grads, buffers))
+
+    return [(a - b).abs().max().item() for a, b in zip(*results)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default='res_sfnet', choices=sorted(SETTINGS.keys()), help='The seg model.')
+    parser.add_argument('--backbone', default='deepbase_resnet101', type=str, help='The backbone.')
+    parser.add_argument('--batch_size', default=2, type=int, help='The batch size.')
+    parser.add_argument('--size', default=128, type=int, help='The input size.')
+    parser.add_argument('--iters', default=3, type=int, help='The number of timed steps.')
+    args = parser.parse_args()
+
+    diff = parity(args, SETTINGS[args.model][-1])
+    print('parity with all stages checkpointed: loss {:.2e}, grad {:.2e}, BN running stats {:.2e}'.format(*diff))
+    print('{} {} {}x3x{}x{}, train step on CPU'.format(args.model, args.backbone, args.batch_size, args.size, args.size))
+    print('| checkpoint_stages | peak allocated (MB) | step (s) |')
+    print('|---|---|---|')
+    for stages in SETTINGS[args.model]:
+        peak_mb, step_s = run_setting(args, stages)
+        print('| {} | {:.0f} | {:.2f} |'.format(', '.join(stages) if stages else 'none', peak_mb, step_s))
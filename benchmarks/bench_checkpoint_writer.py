@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You(youansheng@gmail.com)
+# Checkpoint saving: training-thread time of the old four torch.save calls vs CheckpointWriter.
+
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.runner.checkpoint_writer import CheckpointWriter
+from lib.tools.util.configer import Configer
+from model.seg.model_manager import ModelManager
+
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'configs/seg/sfnet_res101_ui.conf')
+
+FILE_NAMES = ['net_iters{}.pth', 'net_latest.pth', 'net_max_performance.pth', 'net_min_loss.pth']
+
+
+def build_state(backbone):
+    configer = Configer(config_file=CONFIG_FILE)
+    configer.update('network.backbone', backbone)
+    configer.update('network.pretrained', None)
+    configer.add('phase', 'train')
+    net = ModelManager(configer).get_seg_model()
+    return dict(config_dict=configer.to_dict(), state_dict=net.state_dict(),
+                runner_state=dict(iters=0, epoch=0, max_performance=0, min_val_loss=0))
+
+
+def save_sync(state, checkpoints_dir, iters):
+    # The previous save_net: one complete torch.save per name.
+    for file_name in FILE_NAMES:
+        torch.save(state, os.path.join(checkpoints_dir, file_name.format(iters)))
+
+
+def check_files(state, checkpoints_dir, iters):
+    paths = [os.path.join(checkpoints_dir, file_name.format(iters)) for file_name in FILE_NAMES]
+    inodes = set(os.stat(path).st_ino for path in paths)
+    saved = torch.load(paths[1], weights_only=False)['state_dict']
+    max_diff = max((saved[key] - value).abs().max().item() if value.is_floating_point()
+                   else float((saved[key] != value).any()) for key, value in state['state_dict'].items())
+    return len(inodes), max_diff
+
+
+def disk_mb(checkpoints_dir):
+    stats = [os.stat(os.path.join(checkpoints_dir, file_name)) for file_name in os.listdir(checkpoints_dir)]
+    return sum(dict((stat.st_ino, stat.st_size) for stat in stats).values()) / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the checkpoint writer.')
+    parser.add_argument('--backbone', default='deepbase_resnet101', type=str, help='The backbone.')
+    parser.add_argument('--saves', default=3, type=int, help='The number of saves.')
+    parser.add_argument('--keep', default=2, type=int, help='network.keep_checkpoints for the writer.')
+    args = parser.parse_args()
+
+    state = build_state(args.backbone)
+    size_mb = sum(value.numel() * value.element_size() for value in state['state_dict'].values()) / 2 ** 20
+    print('State: {}, {:.0f} MB'.format(args.backbone, size_mb))
+
+    root_dir = tempfile.mkdtemp()
+    try:
+        sync_dir, async_dir = os.path.join(root_dir, 'sync'), os.path.join(root_dir, 'async')
+        os.makedirs(sync_dir)
+        os.makedirs(async_dir)
+
+        start = time.perf_counter()
+        for iters in range(args.saves):
+            save_sync(state, sync_dir, iters)
+
+        sync_ms = (time.perf_counter() - start) * 1e3 / args.saves
+
+        writer = CheckpointWriter(keep_checkpoints=args.keep)
+        block_ms = 0.0
+        for iters in range(args.saves):
+            submit_start = time.perf_counter()
+            writer.submit(state, async_dir, [file_name.format(iters) for file_name in FILE_NAMES],
+                          rotate_name='net')
+            block_ms += (time.perf_counter() - submit_start) * 1e3
+            # Stands in for the training steps between two saves.
+            time.sleep(sync_ms / 1e3)
+
+        writer.wait()
+        num_inodes, max_diff = check_files(state, async_dir, args.saves - 1)
+        kept = sorted(name for name in os.listdir(async_dir) if 'iters' in name)
+        print('Parity: max diff {}, {} inode(s) for {} names, kept {}'.format(
+            max_diff, num_inodes, len(FILE_NAMES), kept))
+        print('Disk: {:.0f} MB sync, {:.0f} MB writer'.format(disk_mb(sync_dir), disk_mb(async_dir)))
+        print('| save_net | training thread ms / save |')
+        print('|---|---|')
+        print('| 4x torch.save | {:.0f} |'.format(sync_ms))
+        print('| CheckpointWriter | {:.0f} |'.format(block_ms / args.saves))
+    finally:
+        shutil.rmtree(root_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You(youansheng@gmail.com)
+# Config lookup cost: pyhocon Configer.get vs FrozenConfig, per call, per UIDataset item & per CLI parse.
+
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.seg.datasets.ui_dataset import UIDataset
+from lib.data.cv2_aug_transforms import CV2AugCompose
+from lib.tools.util.configer import Configer
+
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'configs/seg/sfnet_res101_ui.conf')
+
+
+class HoconView(object):
+    """Attribute view answering every lookup with Configer.get, the cost of the old hot paths."""
+    def __init__(self, configer, prefix=''):
+        self.configer = configer
+        self.prefix = prefix
+
+    def __getattr__(self, name):
+        value = self.configer.get(self.prefix + name, default=None)
+        return HoconView(self.configer, self.prefix + name + '.') if isinstance(value, dict) else value
+
+
+def time_calls(fn, number):
+    start_time = time.time()
+    for _ in range(number):
+        fn()
+
+    return (time.time() - start_time) / number * 1e6
+
+
+def time_items(dataset, number):
+    start_time = time.time()
+    for i in range(number):
+        dataset[i % len(dataset)]
+
+    return (time.time() - start_time) / number * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', default=2000, type=int, help='The number of calls / items.')
+    args = parser.parse_args()
+
+    configer = Configer(config_file=CONFIG_FILE)
+    frozen = configer.frozen
+    print('lookup data.input_mode: Configer.get {:.2f} us, frozen attr {:.3f} us, frozen.get {:.3f} us'.format(
+        time_calls(lambda: configer.get('data', 'input_mode'), args.number * 10),
+        time_calls(lambda: frozen.data.input_mode, args.number * 10),
+        time_calls(lambda: frozen.get('data', 'input_mode'), args.number * 10)))
+
+    root_dir = tempfile.mkdtemp()
+    try:
+        # Small images so that the per-item overhead is not hidden by decoding.
+        for split in ['train']:
+            os.makedirs(os.path.join(root_dir, split, 'image'))
+            os.makedirs(os.path.join(root_dir, split, 'label'))
+            for i in range(16):
+                cv2.imwrite(os.path.join(root_dir, split, 'image', '{}.png'.format(i)),
+                            np.full((96, 64, 3), i, dtype=np.uint8))
+                cv2.imwrite(os.path.join(root_dir, split, 'label', '{}.png'.format(i)),
+                            np.full((96, 64), i % 10, dtype=np.uint8))
+
+        configer.add('data.data_dir', root_dir)
+        configer.update('train.aug_trans.random_crop.crop_size', [32, 32])
+        dataset = UIDataset(root_dir=root_dir, dataset='train', aug_transform=CV2AugCompose(configer, split='train'),
+                            configer=configer)
+        frozen_us = time_items(dataset, args.number)
+        Configer.frozen = property(lambda self: HoconView(self))
+        hocon_us = time_items(dataset, args.number)
+        print('UIDataset.__getitem__ on 64x96 images: {:.1f} us with Configer.get, {:.1f} us frozen'.format(
+            hocon_us, frozen_us))
+    finally:
+        shutil.rmtree(root_dir)
+
+    cache_dir = tempfile.mkdtemp()
+    os.environ['CONFIG_CACHE_DIR'] = cache_dir
+    try:
+        cold_ms = time_calls(lambda: Configer(config_file=CONFIG_FILE), 1) * 1e-3
+        cached_ms = time_calls(lambda: Configer(config_file=CONFIG_FILE), 20) * 1e-3
+        print('Parse {}: {:.1f} ms cold, {:.1f} ms cached'.format(os.path.basename(CONFIG_FILE), cold_ms, cached_ms))
+    finally:
+        shutil.rmtree(cache_dir)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You(youansheng@gmail.com)
+# Fused vs. sequential random_resize -> random_crop -> random_hflip on tall screenshots.
+
+
+import os
+import sys
+import time
+import random
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.data.cv2_aug_transforms import CV2AugCompose
+from lib.tools.util.configer import Configer
+
+
+def build_aug(fuse, crop_ratio=1.0):
+    return CV2AugCompose(Configer(config_dict={
+        'data': {'input_mode': 'BGR'},
+        'train': {'aug_trans': {
+            'fuse_resize_crop': fuse,
+            'trans_seq': ['random_resize', 'random_crop', 'random_hflip'],
+            'random_resize': {'ratio': 1.0, 'method': 'random', 'scale_range': [0.7, 1.3], 'aspect_range': [0.9, 1.1]},
+            'random_crop': {'ratio': crop_ratio, 'crop_size': [512, 512], 'method': 'random',
+                            'allow_outside_center': False},
+            'random_hflip': {'ratio': 0.5, 'swap_pair': []},
+        }}
+    }), split='train')
+
+
+def synthetic_sample(width, height, seed):
+    rng = np.random.RandomState(seed)
+    img = cv2_blocks(rng, width, height, 3)
+    labelmap = cv2_blocks(rng, width, height, 1)[:, :, 0] % 10
+    return img, labelmap.astype(np.uint8)
+
+
+def cv2_blocks(rng, width, height, channels):
+    # Flat rectangles like UI components, upsampled so bilinear sampling has real gradients.
+    small = rng.randint(0, 255, (height // 16 + 1, width // 16 + 1, channels)).astype(np.uint8)
+    return np.repeat(np.repeat(small, 16, axis=0), 16, axis=1)[:height, :width].copy()
+
+
+def compare(size, samples, crop_ratio):
+    fused_aug, seq_aug = build_aug(True, crop_ratio), build_aug(False, crop_ratio)
+    img_diff, label_match, shape_match = [], [], 0
+    for i in range(samples):
+        img, labelmap = synthetic_sample(size[0], size[1], i)
+        random.seed(i)
+        fused_img, fused_label = fused_aug(img.copy(), labelmap=labelmap.copy())
+        random.seed(i)
+        seq_img, seq_label = seq_aug(img.copy(), labelmap=labelmap.copy())
+        if fused_img.shape != seq_img.shape:
+            continue
+
+        shape_match += 1
+        img_diff.append(np.abs(fused_img.astype(np.float32) - seq_img.astype(np.float32)).mean())
+        label_match.append((fused_label == seq_label).mean())
+
+    return dict(shape_match=shape_match / samples, img_mean_abs_diff=float(np.mean(img_diff)),
+                img_max_mean_abs_diff=float(np.max(img_diff)), label_agreement=float(np.mean(label_match)))
+
+
+def throughput(size, samples, fuse):
+    aug = build_aug(fuse)
+    img, labelmap = synthetic_sample(size[0], size[1], 0)
+    random.seed(0)
+    start_time = time.time()
+    for _ in range(samples):
+        aug(img.copy(), labelmap=labelmap.copy())
+
+    return (time.time() - start_time) / samples * 1000.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--samples', default=200, type=int, help='The number of samples per size.')
+    args = parser.parse_args()
+
+    for size in [(1080, 1920), (1080, 2400), (1440, 6000)]:
+        for crop_ratio in [1.0, 0.5]:
+            stats = compare(size, args.samples, crop_ratio)
+            print('{}x{} crop_ratio={}: shapes equal {shape_match:.3f}, img mean abs diff {img_mean_abs_diff:.4f} '
+                  '(worst {img_max_mean_abs_diff:.4f}), label agreement {label_agreement:.5f}'.format(
+                      size[0], size[1], crop_ratio, **stats))
+
+        seq_ms, fused_ms = throughput(size, args.samples, False), throughput(size, args.samples, True)
+        print('{}x{}: sequential {:.2f} ms/sample, fused {:.2f} ms/sample, speedup {:.1f}x'.format(
+            size[0], size[1], seq_ms, fused_ms, seq_ms / fused_ms))
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You(youansheng@gmail.com)
+# Frozen-backbone fine-tuning: step time of the full SFNet vs the heads on cached fp16 features.
+
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.data.feature_cache import FeatureCache, FeatureCacheDataset
+from lib.tools.util.configer import Configer
+from model.seg.model_manager import ModelManager
+from model.seg.loss.loss import Loss
+
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'configs/seg/sfnet_res101_ui.conf')
+
+
+def build(args):
+    configer = Configer(config_file=CONFIG_FILE)
+    configer.update('network.backbone', args.backbone)
+    configer.update('network.pretrained', None)
+    configer.add('phase', 'train')
+    torch.manual_seed(0)
+    net = ModelManager(configer).get_seg_model()
+    for name in net.feature_stages:
+        getattr(net, name).requires_grad_(False)
+
+    return configer, net, Loss(configer)
+
+
+def make_samples(args, num_classes):
+    generator = torch.Generator().manual_seed(1)
+    samples = []
+    for _ in range(args.batches * args.batch_size):
+        img = torch.randn(3, args.size, args.size, generator=generator)
+        labelmap = torch.randint(0, num_classes, (args.size // 16, args.size // 16), generator=generator)
+        samples.append(dict(img=img, labelmap=labelmap.repeat_interleave(16, 0).repeat_interleave(16, 1)))
+
+    return samples
+
+
+def time_steps(net, loss, optimizer, batches, iters):
+    net.train()
+    start = time.perf_counter()
+    for i in range(iters):
+        optimizer.zero_grad()
+        loss(net(batches[i % len(batches)]))['loss'].backward()
+        optimizer.step()
+
+    return (time.perf_counter() - start) * 1e3 / iters
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark head-only training from the feature cache.')
+    parser.add_argument('--backbone', default='deepbase_resnet101', type=str, help='The backbone.')
+    parser.add_argument('--batch_size', default=2, type=int, help='The batch size.')
+    parser.add_argument('--size', default=256, type=int, help='The input size.')
+    parser.add_argument('--batches', default=2, type=int, help='The number of cached batches.')
+    parser.add_argument('--iters', default=3, type=int, help='The number of timed steps.')
+    args = parser.parse_args()
+
+    configer, net, loss = build(args)
+    img_loader = torch.utils.data.DataLoader(make_samples(args, configer.get('data.num_classes')),
+                                             batch_size=args.batch_size)
+    batches = list(img_loader)
+    # Without pretrained weights the default BN statistics let the activations overflow fp16.
+    net.train()
+    with torch.no_grad():
+        for batch in batches:
+            net.backbone_features(batch['img'])
+    cache_dir = os.path.join(tempfile.mkdtemp(), 'feature_cache')
+    try:
+        def extract_fn(data_dict):
+            with torch.no_grad():
+                return net.backbone_features(data_dict['img'])
+
+        net.eval()
+        start = time.perf_counter()
+        FeatureCache.build(cache_dir, extract_fn, img_loader,
+                           settings=dict(), passes=1)
+        build_ms = (time.perf_counter() - start) * 1e3 / (args.batches * args.batch_size)
+
+        dataset = FeatureCacheDataset(cache_dir)
+        loader = torch.utils.data.DataLoader(dataset, batch_size=args.batch_size, shuffle=False)
+        cached_batches = list(loader)
+
+        # Parity: the heads on the fp16 cache vs the full eval forward.
+        net.eval()
+        with torch.no_grad():
+            ref = net(dict(img=batches[0]['img'], labelmap=batches[0]['labelmap']))[0]['out']
+            out = net(cached_batches[0])[0]['out']
+
+        print('Parity: max |logit diff| {:.2e} (max |logit| {:.2e})'.format(
+            (out - ref).abs().max().item(), ref.abs().max().item()))
+        print('Cache: {:.1f} MB / sample, build {:.0f} ms / sample'.format(
+            sum(os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir))
+            / 2 ** 20 / len(dataset), build_ms))
+
+        params = [param for param in net.parameters() if param.requires_grad]
+        optimizer = torch.optim.SGD(params, lr=1e-3, momentum=0.9)
+        net.train()
+        start = time.perf_counter()
+        with torch.no_grad():
+            for i in range(args.iters):
+                net.backbone_features(batches[i % len(batches)]['img'])
+
+        backbone_ms = (time.perf_counter() - start) * 1e3 / args.iters
+        full_ms = time_steps(net, loss, optimizer, batches, args.iters)
+        cached_ms = time_steps(net, loss, optimizer, cached_batches, args.iters)
+        print('| {} {}x{}x{} | ms / step |'.format(args.backbone, args.batch_size, args.size, args.size))
+        print('|---|---|')
+        print('| frozen stages, full forward | {:.0f} |'.format(full_ms))
+        print('| feature cache, heads only | {:.0f} |'.format(cached_ms))
+        print('| (frozen stage1..4 forward alone) | {:.0f} |'.format(backbone_ms))
+        print('Speedup {:.1f}x'.format(full_ms / cached_ms))
+    finally:
+        shutil.rmtree(os.path.dirname(cache_dir))
+
+
+if __name__ == '__main__':
+    main()
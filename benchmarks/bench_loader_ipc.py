@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You(youansheng@gmail.com)
+# IPC bytes & loader throughput with and without shared-memory meta arrays.
+
+
+import os
+import io
+import sys
+import time
+import argparse
+import numpy as np
+import torch
+import torch.multiprocessing  # registers the shared-memory tensor reductions
+from multiprocessing.reduction import ForkingPickler
+from torch.utils import data
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lib.data.collate as collate_module
+from lib.data.collate import collate, share_arrays
+from lib.parallel.data_container import DataContainer
+
+
+TRANS_DICT = {'size_mode': 'fix_size', 'input_size': [512, 512], 'align_method': 'only_pad', 'pad_mode': 'random'}
+
+
+class SyntheticUIDataset(data.Dataset):
+    """Val-like samples of a tall screenshot: a 512x512 crop plus the full-resolution target."""
+    def __init__(self, length, ori_size):
+        self.length = length
+        self.ori_size = ori_size
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        width, height = self.ori_size
+        # UIDataset._encode_label gives float32 targets.
+        ori_target = np.full((height, width), index % 10, dtype=np.float32)
+        meta = dict(ori_img_wh=[width, height], border_wh=[512, 512], ori_target=ori_target)
+        return dict(
+            img=DataContainer(torch.zeros(3, 512, 512), stack=True),
+            labelmap=DataContainer(torch.zeros(512, 512, dtype=torch.long), stack=True),
+            meta=DataContainer(meta, stack=False, cpu_only=True),
+        )
+
+
+def pickled_bytes(batch):
+    buf = io.BytesIO()
+    ForkingPickler(buf).dump(batch)
+    return buf.tell()
+
+
+def ipc_bytes(dataset, batch_size, shared):
+    batch = collate([dataset[i] for i in range(batch_size)], trans_dict=TRANS_DICT, device_ids=[0])
+    if shared:
+        batch = share_arrays(batch)
+
+    return pickled_bytes(batch)
+
+
+def loader_throughput(dataset, batch_size, workers, shared):
+    collate_module.SHARED_ARRAY_MIN_BYTES = 64 * 1024 if shared else float('inf')
+    loader = data.DataLoader(dataset, batch_size=batch_size, num_workers=workers, shuffle=False,
+                             collate_fn=lambda *args: collate(*args, trans_dict=TRANS_DICT, device_ids=[0]))
+    start_time = time.time()
+    checksum = 0.0
+    for batch in loader:
+        checksum += float(sum(meta['ori_target'][0, 0] for meta in batch['meta']))
+
+    return len(dataset) / (time.time() - start_time), checksum
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--samples', default=256, type=int, help='The number of samples.')
+    parser.add_argument('--batch_size', default=8, type=int, help='The batch size.')
+    parser.add_argument('--workers', default=4, type=int, help='The number of loader workers.')
+    args = parser.parse_args()
+
+    for ori_size in [(1080, 2400), (1440, 6000)]:
+        dataset = SyntheticUIDataset(args.samples, ori_size)
+        before, after = ipc_bytes(dataset, args.batch_size, False), ipc_bytes(dataset, args.batch_size, True)
+        print('{}x{}: pickled bytes per batch {:.2f} MB -> {:.4f} MB'.format(
+            ori_size[0], ori_size[1], before / 1e6, after / 1e6))
+
+        plain_fps, plain_sum = loader_throughput(dataset, args.batch_size, args.workers, False)
+        shared_fps, shared_sum = loader_throughput(dataset, args.batch_size, args.workers, True)
+        assert plain_sum == shared_sum
+        print('{}x{}: loader {:.1f} samples/s -> {:.1f} samples/s ({} workers)'.format(
+            ori_size[0], ori_size[1], plain_fps, shared_fps, args.workers))
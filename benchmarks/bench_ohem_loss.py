@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You(youansheng@gmail.com)
+# OHEM CE: sort-based threshold & per-head target scaling vs topk selection & the shared target cache.
+
+
+import os
+import sys
+import time
+import argparse
+import torch
+import torch.nn.functional as F
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.tools.util.configer import Configer
+from model.seg.loss.loss import Loss
+from model.seg.loss.ohem_ce_loss import OhemCELoss
+
+
+class SortOhemCELoss(OhemCELoss):
+    """The previous implementation: full sort, sorted index gather, per-call target scaling."""
+    def forward(self, predict, target):
+        batch_kept = self.min_kept * target.size(0)
+        target = self._scale_target(target, (predict.size(2), predict.size(3)))
+        prob_out = F.softmax(predict, dim=1)
+        tmp_target = target.clone()
+        tmp_target[tmp_target == self.ignore_index] = 0
+        prob = prob_out.gather(1, tmp_target.unsqueeze(1))
+        mask = target.contiguous().view(-1, ) != self.ignore_index
+        sort_prob, sort_indices = prob.contiguous().view(-1, )[mask].contiguous().sort()
+        min_threshold = sort_prob[min(batch_kept, sort_prob.numel() - 1)] if sort_prob.numel() > 0 else 0.0
+        threshold = max(min_threshold, self.thresh)
+        loss_matrix = F.cross_entropy(predict, target,
+                                      weight=self.weight.to(predict.device) if self.weight is not None else None,
+                                      ignore_index=self.ignore_index, reduction='none')
+        loss_matirx = loss_matrix.contiguous().view(-1, )
+        sort_loss_matirx = loss_matirx[mask][sort_indices]
+        select_loss_matrix = sort_loss_matirx[sort_prob < threshold]
+        if self.reduction == 'sum' or select_loss_matrix.numel() == 0:
+            return select_loss_matrix.sum()
+
+        return select_loss_matrix.mean()
+
+    @staticmethod
+    def _scale_target(targets_, scaled_size):
+        targets = targets_.clone().unsqueeze(1).float()
+        targets = F.interpolate(targets, size=scaled_size, mode='nearest')
+        return targets.squeeze(1).long()
+
+
+def sync(device):
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+
+
+def time_loss(loss_fn, inputs, device, number):
+    for _ in range(2):
+        loss_fn(inputs)
+
+    sync(device)
+    start_time = time.time()
+    for _ in range(number):
+        loss_fn(inputs)
+
+    sync(device)
+    return (time.time() - start_time) / number * 1e3
+
+
+def set_key(configer, key, value):
+    if key in configer.to_dict():
+        configer.update(key, value)
+    else:
+        configer.add(key, value)
+
+
+def parity(configer, device):
+    """Loss & gradient of both implementations, including ignored pixels, minkeep above thresh & class weights."""
+    max_diff = 0.0
+    for minkeep, weight in [(1, None), (1000, None), (100000, None), (5000, [1.0, 2.0, 0.5, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 3.0])]:
+        set_key(configer, 'loss.params.ohem_ce_loss.minkeep', minkeep)
+        set_key(configer, 'loss.params.ohem_ce_loss.weight', weight)
+        for size in [(64, 64), (32, 48)]:
+            predict = torch.randn(2, 10, size[0], size[1], device=device) * 3
+            target = torch.randint(0, 10, (2, 64, 64), device=device)
+            target[:, :8] = -1
+            grads = []
+            for loss_cls in [SortOhemCELoss, OhemCELoss]:
+                x = predict.clone().requires_grad_(True)
+                loss = loss_cls(configer)(x, target)
+                loss.backward()
+                grads.append((loss.detach(), x.grad))
+
+            max_diff = max(max_diff, (grads[0][0] - grads[1][0]).abs().item(),
+                           (grads[0][1] - grads[1][1]).abs().max().item())
+
+    set_key(configer, 'loss.params.ohem_ce_loss.minkeep', 100000)
+    set_key(configer, 'loss.params.ohem_ce_loss.weight', None)
+    return max_diff
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch_size', default=4, type=int, help='The batch size.')
+    parser.add_argument('--size', default=512, type=int, help='The label map size.')
+    parser.add_argument('--number', default=5, type=int, help='The number of timed calls.')
+    args = parser.parse_args()
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    configer = Configer(config_file=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                 'configs/seg/sfnet_res101_ui.conf'))
+    configer.update('loss.loss_type', 'fpndsnohemce_loss2')
+    print('parity vs sort-based OHEM: max abs diff of loss & grad {:.2e}'.format(parity(configer, device)))
+
+    num_classes = configer.get('data.num_classes')
+    target = torch.randint(0, num_classes, (args.batch_size, args.size, args.size), device=device)
+    target[:, :args.size // 16] = -1
+    predict = torch.randn(args.batch_size, num_classes, args.size, args.size, device=device, requires_grad=True)
+    for loss_cls in [SortOhemCELoss, OhemCELoss]:
+        loss_fn = loss_cls(configer)
+        ms = time_loss(lambda x: loss_fn(x, target).backward(), predict, device, args.number)
+        print('{} fwd+bwd on {}x{}x{}x{}: {:.1f} ms'.format(
+            loss_cls.__name__, args.batch_size, num_classes, args.size, args.size, ms))
+
+    # fpndsnohemce_loss2: main & dsn at full size, fpn heads at stride 4 / 8 / 16.
+    sizes = [args.size, args.size, args.size // 4, args.size // 8, args.size // 16]
+    keys = ['ohem_ce_loss', 'dsn_ohem_ce_loss', 'fpn_ohem_ce_loss0', 'fpn_ohem_ce_loss1', 'fpn_ce_loss2']
+    preds = [torch.randn(args.batch_size, num_classes, size, size, device=device, requires_grad=True)
+             for size in sizes]
+    loss_dict = {key: dict(params=[pred, target]) for key, pred in zip(keys, preds)}
+    loss = Loss(configer)
+    new_ms = time_loss(lambda d: loss([None, d])['loss'].backward(), loss_dict, device, args.number)
+    for func in loss.func_list[:2]:
+        func.target_cache = None
+    loss.func_list[1] = SortOhemCELoss(configer)
+    loss.loss_list = [(key, loss.func_list[1] if isinstance(func, OhemCELoss) else func, weight)
+                      for key, func, weight in loss.loss_list]
+    old_ms = time_loss(lambda d: loss([None, d])['loss'].backward(), loss_dict, device, args.number)
+    print('Loss with {} heads (fpndsnohemce_loss2): {:.1f} ms before, {:.1f} ms after ({:.2f}x)'.format(
+        len(keys), old_ms, new_ms, old_ms / new_ms))
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You(youansheng@gmail.com)
+# Progressive resolution: train wall-clock time to a target mIoU, fixed size vs train.size_schedule.
+# Trains FCNSegmentor on synthetic UI screenshots: blocks of 10 class colors with noise, so the
+# labels are learnable in a few hundred CPU iterations.
+
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import cv2
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.runner.controller import Controller
+from lib.tools.util.configer import Configer
+from lib.tools.util.logger import Logger as Log
+from runner.seg.fcn_segmentor import FCNSegmentor
+
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'configs/seg/sfnet_res101_ui.conf')
+
+
+def make_palette_dataset(root_dir, num_images, size):
+    """Screenshots of 32x32 blocks, every block in the color of its class plus noise."""
+    rng = np.random.RandomState(0)
+    palette = rng.randint(0, 255, (10, 3))
+    os.makedirs(os.path.join(root_dir, 'train', 'image'))
+    os.makedirs(os.path.join(root_dir, 'train', 'label'))
+    for i in range(num_images):
+        blocks = rng.randint(0, 10, (size // 32 + 1, size // 32 + 1))
+        label = blocks.repeat(32, 0).repeat(32, 1)[:size, :size].astype(np.uint8)
+        img = np.clip(palette[label] + rng.randint(-20, 21, (size, size, 3)), 0, 255).astype(np.uint8)
+        cv2.imwrite(os.path.join(root_dir, 'train', 'image', '{}.png'.format(i)), img)
+        cv2.imwrite(os.path.join(root_dir, 'train', 'label', '{}.png'.format(i)), label)
+
+
+def set_key(configer, key, value):
+    if key in configer.params_root:
+        configer.update(key, value)
+    else:
+        configer.add(key, value)
+
+
+def build_configer(args, root_dir, schedule):
+    configer = Configer(config_file=CONFIG_FILE)
+    for key, value in [('gpu', None), ('phase', 'train'), ('project_dir', root_dir), ('local_rank', 0),
+                       ('network.gather', True), ('network.resume', None), ('network.resume_continue', False),
+                       ('network.resume_strict', True), ('network.resume_val', False),
+                       ('network.checkpoints_root', None), ('network.checkpoints_dir', 'ckpt'),
+                       ('network.distributed', False), ('network.backbone', args.backbone),
+                       ('network.pretrained', None), ('data.data_dir', root_dir), ('data.drop_last', True),
+                       ('data.include_val', False), ('data.workers', 0), ('train.batch_size', args.batch_size),
+                       ('val.batch_size', 4), ('solver.max_iters', args.iters), ('solver.display_iter', args.iters),
+                       ('solver.test_interval', args.test_interval), ('solver.save_iters', args.iters * 2),
+                       ('train.aug_trans.random_crop.crop_size', [args.size, args.size]),
+                       ('train.data_transformer.input_size', [args.size, args.size]),
+                       ('val.data_transformer.input_size', [args.image_size, args.image_size])]:
+        set_key(configer, key, value)
+
+    if schedule:
+        sizes = [[size, size] for size in args.schedule]
+        milestones = [args.iters * (i + 1) // len(sizes) for i in range(len(sizes) - 1)]
+        set_key(configer, 'train.size_schedule', dict(milestones=milestones, sizes=sizes,
+                                                      scale_batch=args.scale_batch, scale_lr=args.scale_batch))
+
+    return configer
+
+
+def train(configer):
+    """Returns [(train seconds, mIoU)] at every val, the val time is not counted."""
+    torch.manual_seed(0)
+    runner = FCNSegmentor(configer)
+    curve, state = [], dict(train_time=0.0, start=None)
+    val = runner.val
+
+    def timed_val(data_loader=None):
+        state['train_time'] += time.time() - state['start']
+        val(data_loader)
+        curve.append((state['train_time'], runner.runner_state['performance']))
+        state['start'] = time.time()
+
+    runner.val = timed_val
+    Controller.init(runner)
+    state['start'] = time.time()
+    Controller.train(runner)
+    return curve
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark train.size_schedule on synthetic UI data.')
+    parser.add_argument('--backbone', default='deepbase_resnet18', type=str, help='The backbone.')
+    parser.add_argument('--images', default=16, type=int, help='The number of synthetic screenshots.')
+    parser.add_argument('--image_size', default=192, type=int, help='The screenshot size.')
+    parser.add_argument('--size', default=128, type=int, help='The final train crop size.')
+    parser.add_argument('--schedule', default=[64, 96, 128], nargs='+', type=int, help='The scheduled sizes.')
+    parser.add_argument('--scale_batch', action='store_true', help='Scale batch size & lr with the size.')
+    parser.add_argument('--batch_size', default=4, type=int, help='The batch size.')
+    parser.add_argument('--iters', default=240, type=int, help='The train iterations.')
+    parser.add_argument('--test_interval', default=40, type=int, help='Iterations between vals.')
+    args = parser.parse_args()
+
+    Log.init(log_level='warning')
+    root_dir = tempfile.mkdtemp()
+    try:
+        make_palette_dataset(root_dir, args.images, args.image_size)
+        os.makedirs(os.path.join(root_dir, 'val'))
+        for sub_dir in ['image', 'label']:
+            os.symlink(os.path.join(root_dir, 'train', sub_dir), os.path.join(root_dir, 'val', sub_dir))
+
+        curves = dict(fixed=train(build_configer(args, root_dir, False)),
+                      schedule=train(build_configer(args, root_dir, True)))
+        target = 0.9 * max(performance for _, performance in curves['fixed'])
+        print('Target mIoU {:.4f} (90% of the best fixed-size val)'.format(target))
+        print('| run | train s | best mIoU | train s to target |')
+        print('|---|---|---|---|')
+        for name, curve in curves.items():
+            reached = [seconds for seconds, performance in curve if performance >= target]
+            print('| {} | {:.1f} | {:.4f} | {} |'.format(
+                name, curve[-1][0], max(performance for _, performance in curve),
+                '{:.1f}'.format(reached[0]) if len(reached) > 0 else 'not reached'))
+
+        print('Schedule {} at iters {}'.format(args.schedule, [args.iters * (i + 1) // len(args.schedule)
+                                                               for i in range(len(args.schedule) - 1)]))
+    finally:
+        shutil.rmtree(root_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You(youansheng@gmail.com)
+# Seg train throughput: the data pipeline alone vs the model step alone, and which one bounds training.
+#   python benchmarks/bench_train_throughput.py --json throughput.json      # CPU, deepbase_resnet18, 128x128
+#   python benchmarks/bench_train_throughput.py --data_dir /data/ui --backbone config --size 0 --gpu 0
+# The data side is the train loader of FCNSegmentor (UIDataset, CV2AugCompose & collate) on the
+# synthetic UI screenshots of bench_loader_backend, or on --data_dir. The model side is the step of
+# FCNSegmentor.train (batch aug, forward, Loss, backward & optimizer step) on synthetic batches.
+# Both run alone: in a real CPU-only run the loader workers and the step share the cores.
+
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_loader_backend import make_ui_dataset
+from data.seg.data_loader import DataLoader
+from lib.data.batch_aug_transforms import BatchAugCompose
+from lib.runner.amp_helper import AmpHelper
+from lib.runner.trainer import Trainer
+from lib.tools.util.configer import Configer
+from lib.tools.util.logger import Logger as Log
+from model.seg.model_manager import ModelManager
+
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'configs/seg/sfnet_res101_ui.conf')
+# The loss of a model that is not the model of the config, the config loss fits its own model only.
+LOSS_TYPES = dict(res_sfnet='fpndsnohemce_loss2', pspnet='dsnohemce_loss', deeplabv3='dsnohemce_loss')
+
+
+def set_key(configer, key, value):
+    if key in configer.params_root:
+        configer.update(key, value)
+    else:
+        configer.add(key, value)
+
+
+def build_configer(args, data_dir, model_name=None, workers=0):
+    configer = Configer(config_file=args.config_file)
+    settings = [('phase', 'train'), ('gpu', None if args.gpu is None else [args.gpu]),
+                ('network.distributed', False), ('network.gather', True), ('network.pretrained', None),
+                ('data.data_dir', data_dir), ('data.drop_last', True), ('data.workers', workers)]
+    if args.backbone != 'config':
+        settings.append(('network.backbone', args.backbone))
+
+    if args.batch_size is not None:
+        settings.append(('train.batch_size', args.batch_size))
+
+    if args.size > 0:
+        settings += [('train.aug_trans.random_crop.crop_size', [args.size, args.size]),
+                     ('train.data_transformer.input_size', [args.size, args.size])]
+
+    if args.backend is not None:
+        settings.append(('data.loader_backend', args.backend))
+
+    if model_name is not None and model_name != configer.get('network.model_name'):
+        settings += [('network.model_name', model_name), ('loss.loss_type', LOSS_TYPES.get(model_name))]
+
+    for key, value in settings:
+        set_key(configer, key, value)
+
+    return configer
+
+
+def time_loader(configer, batches, warmup):
+    """Samples/s of the train loader over batches batches, after warmup batches (the worker startup)."""
+    torch.manual_seed(0)
+    loader = DataLoader(configer).get_trainloader()
+    samples, count, start_time = 0, 0, None
+    while count < warmup + batches:
+        for data_dict in loader:
+            if count == warmup:
+                start_time = time.perf_counter()
+
+            if count >= warmup:
+                samples += data_dict['img'].size(0)
+
+            count += 1
+            if count == warmup + batches:
+                break
+
+    return samples / (time.perf_counter() - start_time)
+
+
+def make_batch(configer, device):
+    """A batch shaped like the collated train batch: blocky labels, as in UI screenshots."""
+    width, height = configer.get('train.data_transformer.input_size')
+    batch_size = configer.get('train.batch_size')
+    generator = torch.Generator().manual_seed(1)
+    img = torch.randn(batch_size, 3, height, width, generator=generator)
+    labelmap = torch.randint(0, configer.get('data.num_classes'), (batch_size, height // 16 + 1, width // 16 + 1),
+                             generator=generator)
+    labelmap = labelmap.repeat_interleave(16, 1).repeat_interleave(16, 2)[:, :height, :width].contiguous()
+    return dict(img=img.to(device), labelmap=labelmap.to(device))
+
+
+def synchronize(device):
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+
+
+def time_step(configer, steps, warmup):
+    """Samples/s of the FCNSegmentor train step on a synthetic batch."""
+    device = torch.device('cpu' if configer.get('gpu') is None else 'cuda:{}'.format(configer.get('gpu')[0]))
+    torch.manual_seed(0)
+    model_manager = ModelManager(configer)
+    net = model_manager.get_seg_model().to(device)
+    loss = model_manager.get_seg_loss()
+    optimizer, _ = Trainer.init([param for param in net.parameters() if param.requires_grad],
+                                configer.get('solver'))
+    batch_aug_transform = BatchAugCompose(configer, split='train')
+    amp = AmpHelper(configer)
+    batch = make_batch(configer, device)
+    net.train()
+    start_time = None
+    for i in range(warmup + steps):
+        if i == warmup:
+            synchronize(device)
+            start_time = time.perf_counter()
+
+        data_dict = batch_aug_transform(dict(batch))
+        with amp.autocast():
+            loss_value = loss(net(data_dict))['loss']
+
+        optimizer.zero_grad()
+        amp.backward(loss_value)
+        amp.step(optimizer)
+
+    synchronize(device)
+    return steps * batch['img'].size(0) / (time.perf_counter() - start_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the seg data pipeline & train step throughput.')
+    parser.add_argument('--config_file', default=CONFIG_FILE, type=str, help='The seg config.')
+    parser.add_argument('--data_dir', default=None, type=str, help='A real dataset, synthetic UI data if None.')
+    parser.add_argument('--images', default=32, type=int, help='The number of synthetic screenshots.')
+    parser.add_argument('--image_size', default=[360, 780], nargs=2, type=int, help='The screenshot size (w h).')
+    parser.add_argument('--models', default=['res_sfnet', 'pspnet'], nargs='+', type=str, help='The seg models.')
+    parser.add_argument('--backbone', default='deepbase_resnet18', type=str,
+                        help='The backbone, config keeps network.backbone.')
+    parser.add_argument('--size', default=128, type=int, help='The train crop & input size, 0 keeps the config.')
+    parser.add_argument('--batch_size', default=None, type=int, help='The batch size, None keeps the config.')
+    parser.add_argument('--workers', default=[0, 1, 2], nargs='+', type=int, help='The loader worker counts.')
+    parser.add_argument('--backend', default=None, choices=['processes', 'threads'], help='data.loader_backend.')
+    parser.add_argument('--batches', default=10, type=int, help='The timed loader batches.')
+    parser.add_argument('--steps', default=5, type=int, help='The timed train steps.')
+    parser.add_argument('--warmup', default=2, type=int, help='The untimed batches & steps.')
+    parser.add_argument('--gpu', default=None, type=int, help='The gpu of the train step, None for CPU.')
+    parser.add_argument('--json', default=None, type=str, help='Writes the results to this file.')
+    args = parser.parse_args()
+
+    Log.init(log_level='warning')
+    root_dir = None
+    data_dir = args.data_dir
+    if data_dir is None:
+        root_dir = data_dir = tempfile.mkdtemp()
+        make_ui_dataset(root_dir, args.images, args.image_size)
+
+    try:
+        configer = build_configer(args, data_dir)
+        results = dict(meta=dict(config_file=args.config_file, data_dir=args.data_dir,
+                                 backbone=configer.get('network.backbone'),
+                                 batch_size=configer.get('train.batch_size'),
+                                 input_size=configer.get('train.data_transformer.input_size'),
+                                 torch=torch.__version__, threads=torch.get_num_threads(),
+                                 cpus=os.cpu_count(), machine=platform.machine(),
+                                 time=time.strftime('%Y-%m-%d %H:%M:%S')),
+                       data=dict(), model=dict())
+        for workers in args.workers:
+            results['data'][workers] = time_loader(build_configer(args, data_dir, workers=workers),
+                                                   args.batches, args.warmup)
+            print('data, {} workers: {:.1f} samples/s'.format(workers, results['data'][workers]))
+
+        for model_name in args.models:
+            results['model'][model_name] = time_step(build_configer(args, data_dir, model_name=model_name),
+                                                     args.steps, args.warmup)
+            print('step, {}: {:.1f} samples/s'.format(model_name, results['model'][model_name]))
+    finally:
+        if root_dir is not None:
+            shutil.rmtree(root_dir)
+
+    meta = results['meta']
+    print('{} {}x{}, batch {}'.format(meta['backbone'], meta['input_size'][0], meta['input_size'][1],
+                                      meta['batch_size']))
+    print('| workers | data samples/s | ' + ' | '.join('{} step samples/s'.format(name) for name in args.models) + ' |')
+    print('|---|---|' + '---|' * len(args.models))
+    results['bound'] = dict()
+    for workers, data_rate in results['data'].items():
+        cells = []
+        for model_name, model_rate in results['model'].items():
+            # The slower side bounds training, the other one idles for the rest of the step.
+            bound = 'data' if data_rate < model_rate else 'model'
+            idle = 1. - min(data_rate, model_rate) / max(data_rate, model_rate)
+            results['bound']['{}/{}'.format(workers, model_name)] = dict(
+                bound=bound, samples_per_sec=min(data_rate, model_rate), idle_ratio=idle)
+            cells.append('{:.1f} ({}-bound, {:.0f}% {} idle)'.format(
+                model_rate, bound, 100. * idle, 'model' if bound == 'data' else 'loader'))
+
+        print('| {} | {:.1f} | {} |'.format(workers, data_rate, ' | '.join(cells)))
+
+    for model_name, model_rate in results['model'].items():
+        enough = [workers for workers, data_rate in results['data'].items() if data_rate >= model_rate]
+        print('{}: {}'.format(model_name, 'the loader keeps up from {} workers'.format(min(enough))
+                              if len(enough) > 0 else 'data-bound at every worker count'))
+
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+        print('Results written to {}'.format(args.json))
+
+
+if __name__ == '__main__':
+    main()
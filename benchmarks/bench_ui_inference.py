@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You(youansheng@gmail.com)
+# Stage timings of the UI inference pipeline on synthetic screenshots, CPU only & offline.
+#   python benchmarks/bench_ui_inference.py --json ui_inference.json
+#   python benchmarks/bench_ui_inference.py --baseline ui_inference.json   # exits 1 on a regression
+
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import cv2
+import numpy as np
+import torch
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from lib.runner.runner_helper import RunnerHelper
+from lib.tools.util.configer import Configer
+from lib.tools.util.logger import Logger as Log
+from lib.tools.util.tracer import Tracer
+from model.seg.model_manager import ModelManager
+from sfnvision_tools.code_generator import generate_html_css
+from sfnvision_tools.mask_parser import parse_mask_to_components
+from ui_inference_main import inference_single_image, load_and_preprocess_image
+
+
+CONFIG_FILE = os.path.join(PROJECT_DIR, 'configs/seg/sfnet_res101_ui.conf')
+SIZES = {
+    'phone': (360, 780),
+    'tablet': (768, 1024),
+    'long_scroll': (360, 2400),
+}
+STAGES = ['decode', 'preprocess', 'forward', 'resize_argmax', 'parse_mask_to_components', 'generate_html_css']
+CLASS_NAMES = ['button', 'text', 'image', 'icon', 'input', 'list', 'card', 'toolbar', 'drawer', 'background']
+
+
+def make_screenshot(size, seed):
+    """A UI-like BGR screenshot & its label map: toolbar, cards with images, text lines, buttons, icons."""
+    width, height = size
+    rng = np.random.RandomState(seed)
+    img = np.full((height, width, 3), 245, np.uint8)
+    label = np.zeros((height, width), np.uint8)
+
+    def fill(x, y, w, h, class_id, color):
+        x, y = max(x, 0), max(y, 0)
+        w, h = min(w, width - x), min(h, height - y)
+        if w <= 0 or h <= 0:
+            return
+
+        img[y:y + h, x:x + w] = color
+        label[y:y + h, x:x + w] = class_id
+
+    toolbar_h = 56
+    fill(0, 0, width, toolbar_h, 8, (180, 90, 40))
+    for i in range(3):
+        fill(width - 44 * (i + 1), 12, 32, 32, 4, (255, 255, 255))
+
+    y = toolbar_h + 16
+    while y < height - 80:
+        card_h = int(rng.randint(120, 260))
+        fill(12, y, width - 24, card_h, 7, (255, 255, 255))
+        image_w = min(card_h - 24, (width - 48) // 3)
+        fill(24, y + 12, image_w, card_h - 24, 3, tuple(int(c) for c in rng.randint(40, 200, 3)))
+        text_x, text_y = 36 + image_w, y + 16
+        while text_y < y + card_h - 56:
+            fill(text_x, text_y, int(rng.randint(width // 4, width - text_x - 24)), 10, 2, (60, 60, 60))
+            text_y += 22
+
+        fill(width - 120, y + card_h - 44, 96, 32, 1, (40, 150, 250))
+        y += card_h + 16
+
+    fill(0, height - 64, width, 64, 6, (250, 250, 250))
+    for i in range(4):
+        fill(width * i // 4 + width // 8 - 14, height - 46, 28, 28, 4, (120, 120, 120))
+
+    # Sensor-like noise so that decode & parse do not see perfectly flat regions.
+    img = np.clip(img.astype(np.int16) + rng.randint(-3, 4, img.shape), 0, 255).astype(np.uint8)
+    return img, label
+
+
+def build_model(args, work_dir):
+    """The model of a create_dummy_checkpoint.py checkpoint, loaded like ui_inference_main.py."""
+    checkpoint = os.path.join(work_dir, 'dummy.pth')
+    command = [sys.executable, os.path.join(PROJECT_DIR, 'scripts/create_dummy_checkpoint.py'),
+               '--config', CONFIG_FILE, '--output', checkpoint, '--backbone', args.backbone]
+    subprocess.check_call(command, cwd=PROJECT_DIR, env=dict(os.environ, PYTHONPATH=PROJECT_DIR),
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    configer = Configer(config_file=CONFIG_FILE)
+    for key, value in [('phase', 'test'), ('gpu', None), ('network.resume', checkpoint),
+                       ('network.resume_strict', True), ('network.resume_continue', False),
+                       ('network.resume_val', False), ('network.gather', True),
+                       ('network.backbone', args.backbone), ('network.pretrained', None)]:
+        if key in configer.params_root:
+            configer.update(key, value)
+        else:
+            configer.add(key, value)
+
+    torch.manual_seed(0)
+    model = ModelManager(configer).get_seg_model()
+    model = RunnerHelper.load_net(type('obj', (object,), {'configer': configer})(), model)
+    model = model.module if hasattr(model, 'module') else model
+    return configer, model.eval()
+
+
+def time_size(configer, model, image_path, label, out_dir, args):
+    """{stage: [ms per iter]} of the pipeline on one screenshot."""
+    timings = {stage: [] for stage in STAGES}
+    device = torch.device('cpu')
+    for i in range(args.warmup + args.iters):
+        Tracer.enable()
+        img_tensor, img_size, _ = load_and_preprocess_image(image_path, configer)
+        inference_single_image(model, img_tensor, img_size, device, configer, None)
+        # The synthetic label map stands for the prediction, an untrained model gives noise.
+        with Tracer.span('parse_mask_to_components'):
+            components = parse_mask_to_components(label, CLASS_NAMES)
+
+        with Tracer.span('generate_html_css'), contextlib.redirect_stdout(io.StringIO()):
+            generate_html_css(components, os.path.join(out_dir, 'output.html'), img_size,
+                              background_image=os.path.basename(image_path))
+
+        totals = Tracer.totals()
+        Tracer.disable()
+        if i >= args.warmup:
+            for stage in STAGES:
+                timings[stage].append(totals[stage] * 1e3)
+
+    return timings, len(components)
+
+
+def summarize(values):
+    return dict(median_ms=float(np.median(values)), min_ms=float(np.min(values)), mean_ms=float(np.mean(values)))
+
+
+def compare(results, baseline, tolerance, min_ms):
+    """Prints the median ratio of every stage to the baseline, returns the regressed stages."""
+    regressions = []
+    print('| size | stage | baseline ms | current ms | ratio |')
+    print('|---|---|---|---|---|')
+    for name, result in results['sizes'].items():
+        if name not in baseline['sizes']:
+            continue
+
+        for stage in STAGES + ['total']:
+            base_ms = baseline['sizes'][name]['stages'][stage]['median_ms']
+            cur_ms = result['stages'][stage]['median_ms']
+            ratio = cur_ms / max(base_ms, 1e-6)
+            flag = ''
+            # Sub-millisecond stages are timer noise.
+            if ratio > 1. + tolerance and cur_ms - base_ms > min_ms:
+                regressions.append('{}/{}'.format(name, stage))
+                flag = ' REGRESSION'
+
+            print('| {} | {} | {:.2f} | {:.2f} | {:.2f}x{} |'.format(name, stage, base_ms, cur_ms, ratio, flag))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the UI inference stages on synthetic screenshots.')
+    parser.add_argument('--sizes', default=list(SIZES.keys()), nargs='+', choices=list(SIZES.keys()),
+                        help='The screenshot presets.')
+    parser.add_argument('--backbone', default='deepbase_resnet18', type=str,
+                        help='The backbone of the dummy model, deepbase_resnet101 for the shipped config.')
+    parser.add_argument('--iters', default=3, type=int, help='The timed runs per size.')
+    parser.add_argument('--warmup', default=1, type=int, help='The untimed runs per size.')
+    parser.add_argument('--threads', default=None, type=int, help='torch.set_num_threads.')
+    parser.add_argument('--json', default=None, type=str, help='Writes the results to this file.')
+    parser.add_argument('--baseline', default=None, type=str, help='Compares against a saved --json file.')
+    parser.add_argument('--tolerance', default=0.2, type=float, help='The allowed slowdown of a stage median.')
+    parser.add_argument('--min_ms', default=1.0, type=float, help='Slowdowns below this many ms are ignored.')
+    args = parser.parse_args()
+
+    Log.init(log_level='warning')
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        configer, model = build_model(args, work_dir)
+        results = dict(meta=dict(backbone=args.backbone, iters=args.iters, torch=torch.__version__,
+                                 opencv=cv2.__version__, threads=torch.get_num_threads(),
+                                 machine=platform.machine(), processor=platform.processor(),
+                                 python=platform.python_version(), time=time.strftime('%Y-%m-%d %H:%M:%S')),
+                       sizes=dict())
+        print('| size | WxH | components | ' + ' | '.join(STAGES) + ' | total ms |')
+        print('|---' * (len(STAGES) + 4) + '|')
+        for name in args.sizes:
+            img, label = make_screenshot(SIZES[name], seed=len(name))
+            image_path = os.path.join(work_dir, '{}.png'.format(name))
+            cv2.imwrite(image_path, img)
+            timings, num_components = time_size(configer, model, image_path, label, work_dir, args)
+            totals = [sum(values) for values in zip(*[timings[stage] for stage in STAGES])]
+            stages = {stage: summarize(timings[stage]) for stage in STAGES}
+            stages['total'] = summarize(totals)
+            results['sizes'][name] = dict(size=list(SIZES[name]), components=num_components, stages=stages)
+            print('| {} | {}x{} | {} | '.format(name, SIZES[name][0], SIZES[name][1], num_components)
+                  + ' | '.join('{:.2f}'.format(stages[stage]['median_ms']) for stage in STAGES)
+                  + ' | {:.2f} |'.format(stages['total']['median_ms']))
+    finally:
+        shutil.rmtree(work_dir)
+
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+        print('Results written to {}'.format(args.json))
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+
+        if baseline['meta'].get('backbone') != args.backbone:
+            print('Warning: the baseline used backbone {}.'.format(baseline['meta'].get('backbone')))
+
+        regressions = compare(results, baseline, args.tolerance, args.min_ms)
+        if len(regressions) > 0:
+            print('Regressions over {:.0f}%: {}'.format(100 * args.tolerance, ', '.join(regressions)))
+            sys.exit(1)
+
+        print('No stage regressed over {:.0f}%.'.format(100 * args.tolerance))
+
+
+if __name__ == '__main__':
+    main()
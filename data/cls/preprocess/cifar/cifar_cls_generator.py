@@ -16,8 +16,32 @@ if sys.version_info[0] == 2:
 else:
     import pickle
 
+from lib.tools.util.preprocess_runner import PreprocessRunner
+
 
 IMAGE_DIR = 'image'
+CHUNK_SIZE = 1000
+_BATCH_CACHE = dict()
+
+
+def _load_batch(file_path):
+    if file_path not in _BATCH_CACHE:
+        with open(file_path, 'rb') as f:
+            if sys.version_info[0] == 2:
+                entry = pickle.load(f)
+            else:
+                entry = pickle.load(f, encoding='latin1')
+
+        _BATCH_CACHE.clear()
+        _BATCH_CACHE[file_path] = np.array(entry['data']).reshape(-1, 3, 32, 32).transpose((0, 2, 3, 1))
+
+    return _BATCH_CACHE[file_path]
+
+
+def save_images(task):
+    batch_data = _load_batch(task['inputs'][0])
+    for row, image_path in zip(range(*task['params']['rows']), task['outputs']):
+        Image.fromarray(batch_data[row]).save(image_path)
 
 
 class Cifar10ClsGenerator(object):
@@ -60,8 +84,10 @@ class Cifar10ClsGenerator(object):
 
         self.train_data = []
         self.train_targets = []
+        self.train_sizes = []
         self.test_data = []
         self.test_targets = []
+        self.test_sizes = []
 
         # now load the picked numpy arrays
         for file_name, checksum in self.train_list:
@@ -72,6 +98,7 @@ class Cifar10ClsGenerator(object):
                 else:
                     entry = pickle.load(f, encoding='latin1')
                 self.train_data.append(entry['data'])
+                self.train_sizes.append(len(entry['data']))
                 if 'labels' in entry:
                     self.train_targets.extend(entry['labels'])
                 else:
@@ -88,6 +115,7 @@ class Cifar10ClsGenerator(object):
                 else:
                     entry = pickle.load(f, encoding='latin1')
                 self.test_data.append(entry['data'])
+                self.test_sizes.append(len(entry['data']))
                 if 'labels' in entry:
                     self.test_targets.extend(entry['labels'])
                 else:
@@ -141,6 +169,22 @@ class Cifar10ClsGenerator(object):
             return False
         return True
 
+    def _image_tasks(self, split, file_list, sizes, image_dir, num_images):
+        tasks = list()
+        index = 0
+        for (file_name, checksum), size in zip(file_list, sizes):
+            for start in range(0, size, CHUNK_SIZE):
+                end = min(size, start + CHUNK_SIZE)
+                filenames = ['{}.jpg'.format(str(index + row - start).zfill(len(str(num_images))))
+                             for row in range(start, end)]
+                tasks.append(dict(key='{}/{}/{}'.format(split, file_name, start),
+                                  inputs=[os.path.join(self.args.root_dir, file_name)],
+                                  params=dict(rows=[start, end]),
+                                  outputs=[os.path.join(image_dir, filename) for filename in filenames]))
+                index += end - start
+
+        return tasks
+
     def generate_label(self):
         """
         Args:
@@ -148,38 +192,28 @@ class Cifar10ClsGenerator(object):
         Returns:
             tuple: (image, target) where target is index of the target class.
         """
+        tasks = self._image_tasks('train', self.train_list, self.train_sizes,
+                                  self.train_image_dir, len(self.train_targets))
+        tasks += self._image_tasks('val', self.test_list, self.test_sizes,
+                                   self.val_image_dir, len(self.test_targets))
+        runner = PreprocessRunner(os.path.join(self.args.save_dir, '.manifest.json'),
+                                  workers=self.args.workers, display_iter=10, name='Cifar images')
+        runner.run(tasks, save_images)
 
         train_json_list = list()
         val_json_list = list()
-
         for index in range(len(self.train_targets)):
-            img, target = self.train_data[index], self.train_targets[index]
-
-            # doing this so that it is consistent with all other datasets
-            # to return a PIL Image
-            img = Image.fromarray(img)
-
             filename = str(index).zfill(len(str(len(self.train_targets))))
-            filename = '{}.jpg'.format(filename)
-            img.save(os.path.join(self.train_image_dir, filename))
             img_dict = dict()
-            img_dict['image_path'] = '{}/{}'.format(IMAGE_DIR, filename)
-            img_dict['label'] = target
+            img_dict['image_path'] = '{}/{}.jpg'.format(IMAGE_DIR, filename)
+            img_dict['label'] = self.train_targets[index]
             train_json_list.append(img_dict)
 
         for index in range(len(self.test_targets)):
-            img, target = self.test_data[index], self.test_targets[index]
-
-            # doing this so that it is consistent with all other datasets
-            # to return a PIL Image
-            img = Image.fromarray(img)
-
             filename = str(index).zfill(len(str(len(self.test_targets))))
-            filename = '{}.jpg'.format(filename)
-            img.save(os.path.join(self.val_image_dir, filename))
             img_dict = dict()
-            img_dict['image_path'] = '{}/{}'.format(IMAGE_DIR, filename)
-            img_dict['label'] = target
+            img_dict['image_path'] = '{}/{}.jpg'.format(IMAGE_DIR, filename)
+            img_dict['label'] = self.test_targets[index]
             val_json_list.append(img_dict)
 
         fw = open(self.train_json_file, 'w')
@@ -226,6 +260,8 @@ if __name__ == "__main__":
                         dest='root_dir', help='The directory of the image data.')
     parser.add_argument('--dataset', default="cifar10", type=str,
                         dest='dataset', help='The dataset name.')
+    parser.add_argument('--workers', default=None, type=int,
+                        dest='workers', help='The number of processes, 0 for serial.')
     args = parser.parse_args()
 
     if args.dataset == 'cifar10':
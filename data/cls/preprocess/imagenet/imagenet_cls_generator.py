@@ -9,10 +9,17 @@ import os
 import argparse
 import shutil
 
+from lib.tools.util.preprocess_runner import PreprocessRunner
+
 
 NUM_OF_CLASSES = 1000
 
 
+def list_class_images(task):
+    ori_img_dir, folder = task['params']['ori_img_dir'], task['params']['folder']
+    return [sorted(os.listdir(os.path.join(ori_img_dir, split, folder))) for split in ('train', 'val')]
+
+
 class ImageNetClsGenerator(object):
 
     def __init__(self, args):
@@ -29,21 +36,19 @@ class ImageNetClsGenerator(object):
         with open('imagenet_class_index.json', 'r') as imagenet_stream:
             imagenet_class_dict = json.load(imagenet_stream)
 
-        img_count = 0
-        for i in range(NUM_OF_CLASSES):
-            train_folder = os.path.join(self.args.ori_img_dir, 'train', imagenet_class_dict[str(i)][0])
-            val_folder = os.path.join(self.args.ori_img_dir, 'val', imagenet_class_dict[str(i)][0])
-
-            for image_file in os.listdir(train_folder):
-                img_count += 1
+        # Listing 1000 class folders is IO bound, list them in parallel & keep the class order.
+        tasks = [dict(key=str(i), params=dict(ori_img_dir=self.args.ori_img_dir, folder=imagenet_class_dict[str(i)][0]))
+                 for i in range(NUM_OF_CLASSES)]
+        runner = PreprocessRunner(workers=self.args.workers, display_iter=100, name='ImageNet classes')
+        for i, (train_files, val_files) in enumerate(runner.run(tasks, list_class_images)):
+            for image_file in train_files:
                 img_dict = dict()
                 img_dict['image_path'] = 'train/{}/{}'.format(imagenet_class_dict[str(i)][0], image_file)
                 img_dict['label'] = i
 
                 train_json_list.append(img_dict)
 
-            for image_file in os.listdir(val_folder):
-                img_count += 1
+            for image_file in val_files:
                 img_dict = dict()
                 img_dict['image_path'] = 'val/{}/{}'.format(imagenet_class_dict[str(i)][0], image_file)
                 img_dict['label'] = i
@@ -67,6 +72,8 @@ if __name__ == "__main__":
                         dest='save_dir', help='The directory to save the data.')
     parser.add_argument('--ori_img_dir', default=None, type=str,
                         dest='ori_img_dir', help='The directory of the image data.')
+    parser.add_argument('--workers', default=None, type=int,
+                        dest='workers', help='The number of processes, 0 for serial.')
 
     args = parser.parse_args()
 
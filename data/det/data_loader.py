@@ -4,12 +4,12 @@
 
 
 import torch
-from torch.utils import data
 
 import lib.data.pil_aug_transforms as pil_aug_trans
 import lib.data.cv2_aug_transforms as cv2_aug_trans
 import lib.data.transforms as trans
 from lib.data.collate import collate
+from lib.data.thread_loader import build_loader
 from lib.tools.util.logger import Logger as Log
 from data.det.datasets.default_dataset import DefaultDataset
 
@@ -53,8 +53,8 @@ class DataLoader(object):
         if self.configer.get('network.distributed'):
             sampler = torch.utils.data.distributed.DistributedSampler(dataset)
 
-        trainloader = data.DataLoader(
-            dataset, sampler=sampler,
+        trainloader = build_loader(
+            self.configer, dataset, split='train', sampler=sampler,
             batch_size=self.configer.get('train', 'batch_size'), shuffle=(sampler is None),
             num_workers=self.configer.get('data', 'workers'), pin_memory=True,
             drop_last=self.configer.get('data', 'drop_last'),
@@ -76,8 +76,8 @@ class DataLoader(object):
             Log.error('{} dataset is invalid.'.format(self.configer.get('dataset')))
             exit(1)
 
-        valloader = data.DataLoader(
-            dataset,
+        valloader = build_loader(
+            self.configer, dataset, split='val',
             batch_size=self.configer.get('val', 'batch_size'), shuffle=False,
             num_workers=self.configer.get('data', 'workers'), pin_memory=True,
             collate_fn=lambda *args: collate(
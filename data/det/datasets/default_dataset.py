@@ -9,6 +9,7 @@ import torch
 import numpy as np
 import torch.utils.data as data
 
+from lib.data.anno_index import AnnoIndex
 from lib.parallel.data_container import DataContainer
 from lib.tools.helper.json_helper import JsonHelper
 from lib.tools.helper.image_helper import ImageHelper
@@ -26,13 +27,16 @@ class DefaultDataset(data.Dataset):
         self.aug_transform = aug_transform
         self.img_transform = img_transform
         self.img_list, self.json_list = self.__list_dirs(root_dir, dataset)
+        self.anno_index = None
+        if self.configer.get('data.anno_index', default=True):
+            self.anno_index = AnnoIndex(self.json_list, self.__index_file(root_dir, dataset), self.__parse_json_file)
 
     def __getitem__(self, index):
         img = ImageHelper.read_image(self.img_list[index],
                                      tool=self.configer.get('data', 'image_tool'),
                                      mode=self.configer.get('data', 'input_mode'))
         img_size = ImageHelper.get_size(img)
-        bboxes, labels = self.__read_json_file(self.json_list[index])
+        bboxes, labels = self.__read_annos(index)
         ori_bboxes, ori_labels = bboxes.copy(), labels.copy()
 
         if self.aug_transform is not None:
@@ -61,25 +65,46 @@ class DefaultDataset(data.Dataset):
 
         return len(self.img_list)
 
-    def __read_json_file(self, json_file):
+    def __read_annos(self, index):
+        if self.anno_index is not None:
+            bboxes = self.anno_index.get('bboxes', index)
+            labels = self.anno_index.get('labels', index)
+            difficult = self.anno_index.get('difficult', index)
+        else:
+            anno_dict = self.__parse_json_file(self.json_list[index])
+            bboxes, labels, difficult = anno_dict['bboxes'], anno_dict['labels'], anno_dict['difficult']
+
+        if difficult.any() and not self.configer.get('data', 'keep_difficult'):
+            bboxes, labels = bboxes[~difficult], labels[~difficult]
+
+        return bboxes, labels
+
+    def __parse_json_file(self, json_file):
         """
             filename: JSON file
 
-            return: three list: key_points list, centers list and scales list.
+            return: dict of bboxes, labels and difficult flags of all objects.
         """
         json_dict = JsonHelper.load_file(json_file)
 
         labels = list()
         bboxes = list()
+        difficult = list()
 
         for object in json_dict['objects']:
-            if 'difficult' in object and object['difficult'] and not self.configer.get('data', 'keep_difficult'):
-                continue
-
             labels.append(object['label'])
             bboxes.append(object['bbox'])
+            difficult.append('difficult' in object and bool(object['difficult']))
+
+        return dict(bboxes=np.array(bboxes).astype(np.float32),
+                    labels=np.array(labels).astype(np.int64),
+                    difficult=np.array(difficult, dtype=bool))
+
+    def __index_file(self, root_dir, dataset):
+        if dataset == 'train' and self.configer.get('data', 'include_val'):
+            return os.path.join(root_dir, '{}_with_val_anno_index.npz'.format(dataset))
 
-        return np.array(bboxes).astype(np.float32), np.array(labels)
+        return os.path.join(root_dir, '{}_anno_index.npz'.format(dataset))
 
     def __list_dirs(self, root_dir, dataset):
         img_list = list()
@@ -11,6 +11,8 @@ import shutil
 
 from pycocotools.coco import COCO
 
+from lib.tools.util.preprocess_runner import PreprocessRunner
+
 
 JOSN_DIR = 'json'
 IMAGE_DIR = 'image'
@@ -31,6 +33,14 @@ CAT_DICT = {
 }
 
 
+def save_image_label(task):
+    json_file, image_file = task['outputs']
+    fw = open(json_file, 'w')
+    fw.write(json.dumps(task['params']))
+    fw.close()
+    shutil.copy(task['inputs'][0], image_file)
+
+
 class CocoDetGenerator(object):
 
     def __init__(self, args, json_dir=JOSN_DIR, image_dir=IMAGE_DIR):
@@ -49,7 +59,8 @@ class CocoDetGenerator(object):
         self.img_ids = list(self.coco.imgs.keys())
 
     def generate_label(self):
-        for i, img_id in enumerate(self.img_ids):
+        tasks = list()
+        for img_id in self.img_ids:
             json_dict = dict()
             file_name = self.coco.imgs[img_id]['file_name']
             json_dict['width'] = self.coco.imgs[img_id]['width']
@@ -70,14 +81,14 @@ class CocoDetGenerator(object):
                     object_list.append(object_dict)
 
             json_dict['objects'] = object_list
-            fw = open(os.path.join(self.json_dir, '{}.json'.format(file_name.split('.')[0])), 'w')
-            fw.write(json.dumps(json_dict))
-            fw.close()
-            shutil.copy(os.path.join(self.args.ori_img_dir, file_name),
-                        os.path.join(self.image_dir, file_name))
+            tasks.append(dict(key=file_name, params=json_dict,
+                              inputs=[os.path.join(self.args.ori_img_dir, file_name)],
+                              outputs=[os.path.join(self.json_dir, '{}.json'.format(file_name.split('.')[0])),
+                                       os.path.join(self.image_dir, file_name)]))
 
-            if i % 1000 == 0:
-                print("Processed {} of {}".format(i, len(self.img_ids)))
+        runner = PreprocessRunner(os.path.join(self.args.save_dir, '.manifest.json'),
+                                  workers=self.args.workers, name='COCO det')
+        runner.run(tasks, save_image_label)
 
 
 if __name__ == "__main__":
@@ -89,6 +100,8 @@ if __name__ == "__main__":
                         dest='ori_img_dir', help='The directory of the image data.')
     parser.add_argument('--anno_file', default=None, type=str,
                         dest='anno_file', help='The annotation file.')
+    parser.add_argument('--workers', default=None, type=int,
+                        dest='workers', help='The number of processes, 0 for serial.')
 
     args = parser.parse_args()
 
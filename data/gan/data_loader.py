@@ -3,7 +3,7 @@
 # Author: Donny You(youansheng@gmail.com)
 
 
-from torch.utils import data
+import torch
 
 from data.gan.datasets.default_pix2pix_dataset import DefaultPix2pixDataset
 from data.gan.datasets.default_cyclegan_dataset import DefaultCycleGANDataset
@@ -12,6 +12,7 @@ import lib.data.pil_aug_transforms as pil_aug_trans
 import lib.data.cv2_aug_transforms as cv2_aug_trans
 import lib.data.transforms as trans
 from lib.data.collate import collate
+from lib.data.thread_loader import build_loader
 from lib.tools.util.logger import Logger as Log
 
 
@@ -68,9 +69,13 @@ class DataLoader(object):
             Log.error('{} train loader is invalid.'.format(self.configer.get('train', 'loader')))
             exit(1)
 
-        trainloader = data.DataLoader(
-            dataset,
-            batch_size=self.configer.get('train', 'batch_size'), shuffle=True,
+        sampler = None
+        if self.configer.get('network.distributed', default=False):
+            sampler = torch.utils.data.distributed.DistributedSampler(dataset)
+
+        trainloader = build_loader(
+            self.configer, dataset, sampler=sampler,
+            batch_size=self.configer.get('train', 'batch_size'), shuffle=(sampler is None),
             num_workers=self.configer.get('data', 'workers'), pin_memory=True,
             drop_last=self.configer.get('data', 'drop_last'),
             collate_fn=lambda *args: collate(
@@ -107,8 +112,8 @@ class DataLoader(object):
             Log.error('{} val loader is invalid.'.format(self.configer.get('val', 'loader')))
             exit(1)
 
-        valloader = data.DataLoader(
-            dataset,
+        valloader = build_loader(
+            self.configer, dataset,
             batch_size=self.configer.get('val', 'batch_size'), shuffle=False,
             num_workers=self.configer.get('data', 'workers'), pin_memory=True,
             collate_fn=lambda *args: collate(
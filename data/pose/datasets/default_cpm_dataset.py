@@ -10,6 +10,7 @@ import torch
 import torch.utils.data as data
 
 from data.pose.utils.heatmap_generator import HeatmapGenerator
+from lib.data.anno_index import AnnoIndex
 from lib.parallel.data_container import DataContainer
 from lib.tools.helper.json_helper import JsonHelper
 from lib.tools.helper.image_helper import ImageHelper
@@ -25,13 +26,16 @@ class DefaultCPMDataset(data.Dataset):
         self.img_transform = img_transform
         self.heatmap_generator = HeatmapGenerator(self.configer)
         (self.img_list, self.json_list) = self.__list_dirs(root_dir, dataset)
+        self.anno_index = None
+        if self.configer.get('data.anno_index', default=True):
+            self.anno_index = AnnoIndex(self.json_list, self.__index_file(root_dir, dataset), self.__parse_json_file)
 
     def __getitem__(self, index):
         img = ImageHelper.read_image(self.img_list[index],
                                      tool=self.configer.get('data', 'image_tool'),
                                      mode=self.configer.get('data', 'input_mode'))
 
-        kpts, bboxes = self.__read_json_file(self.json_list[index])
+        kpts, bboxes = self.__read_annos(index)
 
         if self.aug_transform is not None:
             img, kpts, bboxes = self.aug_transform(img, kpts=kpts, bboxes=bboxes)
@@ -49,11 +53,18 @@ class DefaultCPMDataset(data.Dataset):
 
         return len(self.img_list)
 
-    def __read_json_file(self, json_file):
+    def __read_annos(self, index):
+        if self.anno_index is not None:
+            return self.anno_index.get('kpts', index), self.anno_index.get('bboxes', index)
+
+        anno_dict = self.__parse_json_file(self.json_list[index])
+        return anno_dict['kpts'], anno_dict['bboxes']
+
+    def __parse_json_file(self, json_file):
         """
             filename: JSON file
 
-            return: three list: key_points list, centers list and scales list.
+            return: dict of key_points and bboxes of all objects.
         """
         json_dict = JsonHelper.load_file(json_file)
         kpts = list()
@@ -64,7 +75,13 @@ class DefaultCPMDataset(data.Dataset):
             if 'bbox' in object:
                 bboxes.append(object['bbox'])
 
-        return np.array(kpts).astype(np.float32), np.array(bboxes).astype(np.float32)
+        return dict(kpts=np.array(kpts).astype(np.float32), bboxes=np.array(bboxes).astype(np.float32))
+
+    def __index_file(self, root_dir, dataset):
+        if dataset == 'train' and self.configer.get('data', 'include_val'):
+            return os.path.join(root_dir, '{}_with_val_anno_index.npz'.format(dataset))
+
+        return os.path.join(root_dir, '{}_anno_index.npz'.format(dataset))
 
     def __list_dirs(self, root_dir, dataset):
         img_list = list()
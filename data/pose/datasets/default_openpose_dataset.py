@@ -9,6 +9,7 @@ import torch
 import numpy as np
 import torch.utils.data as data
 
+from lib.data.anno_index import AnnoIndex
 from lib.parallel.data_container import DataContainer
 from lib.tools.helper.json_helper import JsonHelper
 from lib.tools.helper.image_helper import ImageHelper
@@ -27,6 +28,9 @@ class DefaultOpenPoseDataset(data.Dataset):
         self.heatmap_generator = HeatmapGenerator(self.configer)
         self.paf_generator = PafGenerator(self.configer)
         self.img_list, self.json_list, self.mask_list = self.__list_dirs(root_dir, dataset)
+        self.anno_index = None
+        if self.configer.get('data.anno_index', default=True):
+            self.anno_index = AnnoIndex(self.json_list, self.__index_file(root_dir, dataset), self.__parse_json_file)
 
     def __getitem__(self, index):
         img = ImageHelper.read_image(self.img_list[index],
@@ -40,7 +44,7 @@ class DefaultOpenPoseDataset(data.Dataset):
             if self.configer.get('data', 'image_tool') == 'pil':
                 maskmap = ImageHelper.to_img(maskmap)
 
-        kpts, bboxes = self.__read_json_file(self.json_list[index])
+        kpts, bboxes = self.__read_annos(index)
 
         if self.aug_transform is not None and len(bboxes) > 0:
             img, maskmap, kpts, bboxes = self.aug_transform(img, maskmap=maskmap, kpts=kpts, bboxes=bboxes)
@@ -76,14 +80,20 @@ class DefaultOpenPoseDataset(data.Dataset):
 
         return len(self.img_list)
 
-    def __read_json_file(self, json_file):
+    def __read_annos(self, index):
+        if self.anno_index is not None:
+            return self.anno_index.get('kpts', index), self.anno_index.get('bboxes', index)
+
+        anno_dict = self.__parse_json_file(self.json_list[index])
+        return anno_dict['kpts'], anno_dict['bboxes']
+
+    def __parse_json_file(self, json_file):
         """
             filename: JSON file
 
-            return: three list: key_points list, centers list and scales list.
+            return: dict of key_points and bboxes of all objects.
         """
         json_dict = JsonHelper.load_file(json_file)
-
         kpts = list()
         bboxes = list()
 
@@ -92,7 +102,13 @@ class DefaultOpenPoseDataset(data.Dataset):
             if 'bbox' in object:
                 bboxes.append(object['bbox'])
 
-        return np.array(kpts).astype(np.float32), np.array(bboxes).astype(np.float32)
+        return dict(kpts=np.array(kpts).astype(np.float32), bboxes=np.array(bboxes).astype(np.float32))
+
+    def __index_file(self, root_dir, dataset):
+        if dataset == 'train' and self.configer.get('data', 'include_val'):
+            return os.path.join(root_dir, '{}_with_val_anno_index.npz'.format(dataset))
+
+        return os.path.join(root_dir, '{}_anno_index.npz'.format(dataset))
 
     def __list_dirs(self, root_dir, dataset):
         img_list = list()
@@ -5,12 +5,13 @@
 
 
 import torch
-from torch.utils import data
 
 import lib.data.pil_aug_transforms as pil_aug_trans
 import lib.data.cv2_aug_transforms as cv2_aug_trans
 import lib.data.transforms as trans
 from lib.data.collate import collate
+from lib.data.feature_cache import FeatureCacheDataset
+from lib.data.thread_loader import build_loader
 from lib.tools.util.logger import Logger as Log
 from data.seg.datasets.default_dataset import DefaultDataset
 from data.seg.datasets.cityscapes_dataset import CityscapesDataset
@@ -46,39 +47,41 @@ class DataLoader(object):
             trans.ToLabel(),
             trans.ReLabel(255, -1), ])
 
-    def get_trainloader(self):
+    def _get_dataset(self, dataset, aug_transform):
         if self.configer.get('dataset', default=None) in [None, 'default']:
-            dataset = DefaultDataset(root_dir=self.configer.get('data', 'data_dir'), dataset='train',
-                                     aug_transform=self.aug_train_transform,
+            return DefaultDataset(root_dir=self.configer.get('data', 'data_dir'), dataset=dataset,
+                                  aug_transform=aug_transform,
+                                  img_transform=self.img_transform,
+                                  label_transform=self.label_transform,
+                                  configer=self.configer)
+
+        elif self.configer.get('dataset', default=None) == 'cityscapes':
+            return CityscapesDataset(root_dir=self.configer.get('data', 'data_dir'), dataset=dataset,
+                                     aug_transform=aug_transform,
                                      img_transform=self.img_transform,
                                      label_transform=self.label_transform,
                                      configer=self.configer)
 
-        elif self.configer.get('dataset', default=None) == 'cityscapes':
-            dataset = CityscapesDataset(root_dir=self.configer.get('data', 'data_dir'), dataset='train',
-                                        aug_transform=self.aug_train_transform,
-                                        img_transform=self.img_transform,
-                                        label_transform=self.label_transform,
-                                        configer=self.configer)
-
         elif self.configer.get('dataset', default=None) == 'ui':
-            dataset = UIDataset(root_dir=self.configer.get('data', 'data_dir'), dataset='train',
-                                aug_transform=self.aug_train_transform,
-                                img_transform=self.img_transform,
-                                label_transform=self.label_transform,
-                                configer=self.configer)
+            return UIDataset(root_dir=self.configer.get('data', 'data_dir'), dataset=dataset,
+                             aug_transform=aug_transform,
+                             img_transform=self.img_transform,
+                             label_transform=self.label_transform,
+                             configer=self.configer)
 
         else:
             Log.error('{} dataset is invalid.'.format(self.configer.get('dataset')))
             exit(1)
 
+    def get_trainloader(self):
+        dataset = self._get_dataset('train', self.aug_train_transform)
         sampler = None
         if self.configer.get('network.distributed'):
             sampler = torch.utils.data.distributed.DistributedSampler(dataset)
 
-        trainloader = data.DataLoader(
-            dataset, sampler=sampler,
-            batch_size=self.configer.get('train', 'batch_size'), shuffle=(sampler is None),
+        trainloader = build_loader(
+            self.configer, dataset, split='train', sampler=sampler,
+            batch_size=self.get_image_batch_size(dataset), shuffle=(sampler is None),
             num_workers=self.configer.get('data', 'workers'), pin_memory=True,
             drop_last=self.configer.get('data', 'drop_last'),
             collate_fn=lambda *args: collate(
@@ -88,35 +91,29 @@ class DataLoader(object):
 
         return trainloader
 
+    def get_image_batch_size(self, dataset):
+        """train.batch_size counts samples, multi-crop datasets give crops_per_image samples per image.
+
+        The samplers still index images, so every epoch visits each image once and yields
+        crops_per_image times more samples.
+        """
+        batch_size = self.configer.get('train', 'batch_size')
+        crops_per_image = getattr(dataset, 'crops_per_image', 1)
+        if batch_size % crops_per_image != 0:
+            Log.error('train.batch_size {} is not divisible by train.crops_per_image {}.'.format(
+                batch_size, crops_per_image))
+            exit(1)
 
-    def get_valloader(self):
-        if self.configer.get('dataset', default=None) in [None, 'default']:
-            dataset = DefaultDataset(root_dir=self.configer.get('data', 'data_dir'), dataset='val',
-                                     aug_transform=self.aug_val_transform,
-                                     img_transform=self.img_transform,
-                                     label_transform=self.label_transform,
-                                     configer=self.configer)
+        if crops_per_image > 1:
+            Log.info('{} crops per image, {} images per batch.'.format(crops_per_image, batch_size // crops_per_image))
 
-        elif self.configer.get('dataset', default=None) == 'cityscapes':
-            dataset = CityscapesDataset(root_dir=self.configer.get('data', 'data_dir'), dataset='val',
-                                        aug_transform=self.aug_val_transform,
-                                        img_transform=self.img_transform,
-                                        label_transform=self.label_transform,
-                                        configer=self.configer)
+        return batch_size // crops_per_image
 
-        elif self.configer.get('dataset', default=None) == 'ui':
-            dataset = UIDataset(root_dir=self.configer.get('data', 'data_dir'), dataset='val',
-                                aug_transform=self.aug_val_transform,
-                                img_transform=self.img_transform,
-                                label_transform=self.label_transform,
-                                configer=self.configer)
 
-        else:
-            Log.error('{} dataset is invalid.'.format(self.configer.get('dataset')))
-            exit(1)
-
-        valloader = data.DataLoader(
-            dataset,
+    def get_valloader(self):
+        dataset = self._get_dataset('val', self.aug_val_transform)
+        valloader = build_loader(
+            self.configer, dataset, split='val',
             batch_size=self.configer.get('val', 'batch_size'), shuffle=False,
             num_workers=self.configer.get('data', 'workers'), pin_memory=True,
             collate_fn=lambda *args: collate(
@@ -126,6 +123,37 @@ class DataLoader(object):
 
         return valloader
 
+    def get_cacheloader(self, augment=False):
+        """The train images in order, with the val transforms, or one draw of the train ones if augment."""
+        split = 'train' if augment else 'val'
+        dataset = self._get_dataset('train', self.aug_train_transform if augment else self.aug_val_transform)
+        if not augment and hasattr(dataset, 'crops_per_image'):
+            # Crops of the val transforms are all the same.
+            dataset.crops_per_image = 1
+
+        return build_loader(
+            self.configer, dataset,
+            batch_size=self.configer.get('val', 'batch_size'), shuffle=False,
+            num_workers=self.configer.get('data', 'workers'), pin_memory=True,
+            collate_fn=lambda *args: collate(
+                *args, trans_dict=self.configer.get(split, 'data_transformer')
+            )
+        )
+
+    def get_feature_trainloader(self, cache_dir):
+        """Batches of the backbone features cached by FeatureCache.build, see train.feature_cache."""
+        dataset = FeatureCacheDataset(cache_dir)
+        sampler = None
+        if self.configer.get('network.distributed'):
+            sampler = torch.utils.data.distributed.DistributedSampler(dataset)
+
+        return build_loader(
+            self.configer, dataset, sampler=sampler,
+            batch_size=self.configer.get('train', 'batch_size'), shuffle=(sampler is None),
+            num_workers=self.configer.get('data', 'workers'), pin_memory=True,
+            drop_last=self.configer.get('data', 'drop_last')
+        )
+
 
 
 if __name__ == "__main__":
@@ -23,28 +23,39 @@ class UIDataset(data.Dataset):
         self.img_transform = img_transform
         self.label_transform = label_transform
         self.img_list, self.label_list = self.__list_dirs(root_dir, dataset)
+        # 训练时每次解码产生的增强样本数，DataLoader按图片数计batch
+        self.crops_per_image = self.configer.get('train.crops_per_image', default=1) if dataset == 'train' else 1
 
     def __len__(self):
         return len(self.img_list)
 
     def __getitem__(self, index):
+        # 每个样本都会读取配置，使用只读的冻结配置避免pyhocon的查找开销
+        data_config = self.configer.frozen.data
         img = ImageHelper.read_image(self.img_list[index],
-                                     tool=self.configer.get('data', 'image_tool'),
-                                     mode=self.configer.get('data', 'input_mode'))
+                                     tool=data_config.image_tool,
+                                     mode=data_config.input_mode)
         img_size = ImageHelper.get_size(img)
         labelmap = ImageHelper.read_image(self.label_list[index],
-                                          tool=self.configer.get('data', 'image_tool'), mode='P')
+                                          tool=data_config.image_tool, mode='P')
         
         # 如果配置了标签列表，进行编码
-        if self.configer.get('data.label_list', default=None):
+        if getattr(data_config, 'label_list', None):
             labelmap = self._encode_label(labelmap)
 
         # 如果配置了减少零标签，进行处理
-        if self.configer.get('data.reduce_zero_label', default=None):
+        if getattr(data_config, 'reduce_zero_label', None):
             labelmap = self._reduce_zero_label(labelmap)
 
         ori_target = ImageHelper.to_np(labelmap)
+        if self.crops_per_image == 1:
+            return self._get_sample(img, labelmap, img_size, ori_target)
 
+        # 一次解码产生K个独立增强的样本，由collate展开
+        return [self._get_sample(self._copy(img), self._copy(labelmap), img_size, ori_target)
+                for _ in range(self.crops_per_image)]
+
+    def _get_sample(self, img, labelmap, img_size, ori_target):
         if self.aug_transform is not None:
             img, labelmap = self.aug_transform(img, labelmap=labelmap)
 
@@ -67,16 +78,21 @@ class UIDataset(data.Dataset):
             meta=DataContainer(meta, stack=False, cpu_only=True),
         )
 
+    @staticmethod
+    def _copy(inputs):
+        # cv2的部分增强会原地修改数组，PIL图像不可变无需拷贝
+        return inputs.copy() if isinstance(inputs, np.ndarray) else inputs
+
     def _reduce_zero_label(self, labelmap):
         """减少零标签：将0标签转换为255（忽略标签），其他标签减1"""
-        if not self.configer.get('data', 'reduce_zero_label'):
+        if not self.configer.frozen.data.reduce_zero_label:
             return labelmap
 
         labelmap = np.array(labelmap)
         labelmap[labelmap == 0] = 255
         labelmap = labelmap - 1
         labelmap[labelmap == 254] = 255
-        if self.configer.get('data', 'image_tool') == 'pil':
+        if self.configer.frozen.data.image_tool == 'pil':
             labelmap = ImageHelper.to_img(labelmap.astype(np.uint8))
 
         return labelmap
@@ -86,11 +102,12 @@ class UIDataset(data.Dataset):
         labelmap = np.array(labelmap)
         shape = labelmap.shape
         encoded_labelmap = np.ones(shape=(shape[0], shape[1]), dtype=np.float32) * 255
-        for i in range(len(self.configer.get('data', 'label_list'))):
-            class_id = self.configer.get('data', 'label_list')[i]
+        label_list = self.configer.frozen.data.label_list
+        for i in range(len(label_list)):
+            class_id = label_list[i]
             encoded_labelmap[labelmap == class_id] = i
 
-        if self.configer.get('data', 'image_tool') == 'pil':
+        if self.configer.frozen.data.image_tool == 'pil':
             encoded_labelmap = ImageHelper.to_img(encoded_labelmap.astype(np.uint8))
 
         return encoded_labelmap
@@ -4,11 +4,11 @@
 
 
 import torch
-from torch.utils import data
 
 import lib.data.pil_aug_transforms as pil_aug_trans
 import lib.data.cv2_aug_transforms as cv2_aug_trans
 from lib.data.collate import collate
+from lib.data.thread_loader import build_loader
 from lib.data.transforms import ToTensor, Normalize, Compose
 from lib.tools.util.logger import Logger as Log
 from data.test.datasets.default_dataset import DefaultDataset
@@ -70,8 +70,8 @@ class TestDataLoader(object):
             Log.error('{} test dataset is invalid.'.format(self.configer.get('test.dataset')))
             exit(1)
 
-        testloader = data.DataLoader(
-            dataset,
+        testloader = build_loader(
+            self.configer, dataset, split='test',
             batch_size=self.configer.get('test.batch_size', default=torch.cuda.device_count()), shuffle=False,
             num_workers=self.configer.get('data', 'workers'), pin_memory=True,
             collate_fn=lambda *args: collate(
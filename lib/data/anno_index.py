@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You (youansheng@gmail.com)
+# Consolidated annotation index. Compile per-image json files into contiguous arrays once.
+
+
+import os
+import numpy as np
+
+from lib.tools.util.logger import Logger as Log
+
+
+class AnnoIndex(object):
+    """Compiles the annotations of a split into one ``.npz`` file.
+
+    Every field returned by ``parse_fn`` is concatenated over all images into a single array
+    and sliced per image with ``<field>_offsets``. The index stores the path, size and mtime of
+    every source json and is rebuilt automatically when any of them changes.
+
+    Args:
+        json_list (list): the json files of the split, in dataset order.
+        index_file (str): the path of the ``.npz`` index file.
+        parse_fn (callable): json_file -> dict of numpy arrays, one row per object.
+    """
+    VERSION = 1
+
+    def __init__(self, json_list, index_file, parse_fn):
+        self.json_list = list(json_list)
+        self.index_file = index_file
+        self.parse_fn = parse_fn
+        self.arrays = self._load()
+        if self.arrays is None:
+            self.arrays = self._build()
+
+    def __len__(self):
+        return len(self.json_list)
+
+    def get(self, key, index):
+        offsets = self.arrays['{}_offsets'.format(key)]
+        # Augmentations modify bboxes & kpts in place, never hand out views of the index.
+        return self.arrays[key][offsets[index]:offsets[index + 1]].copy()
+
+    def _stat(self):
+        stats = np.zeros((len(self.json_list), 2), dtype=np.int64)
+        for i, json_file in enumerate(self.json_list):
+            st = os.stat(json_file)
+            stats[i] = [st.st_size, st.st_mtime_ns]
+
+        return stats
+
+    def _load(self):
+        if not os.path.exists(self.index_file):
+            return None
+
+        try:
+            with np.load(self.index_file, allow_pickle=False) as npz:
+                arrays = {key: npz[key] for key in npz.files}
+        except Exception as e:
+            Log.warn('Anno index {} is broken: {}'.format(self.index_file, e))
+            return None
+
+        if int(arrays.pop('__version__', -1)) != self.VERSION \
+                or arrays.pop('__sources__').tolist() != self.json_list \
+                or not np.array_equal(arrays.pop('__stats__'), self._stat()):
+            Log.info('Anno index {} is out of date.'.format(self.index_file))
+            return None
+
+        return arrays
+
+    def _build(self):
+        Log.info('Building anno index {} from {} files.'.format(self.index_file, len(self.json_list)))
+        fields = dict()
+        for json_file in self.json_list:
+            for key, value in self.parse_fn(json_file).items():
+                fields.setdefault(key, list()).append(np.asarray(value))
+
+        arrays = dict()
+        for key, value_list in fields.items():
+            # Objects-less images give arrays of shape (0,), borrow the row shape from the others.
+            rows = [value for value in value_list if value.size > 0]
+            row_shape = rows[0].shape[1:] if len(rows) > 0 else ()
+            dtype = rows[0].dtype if len(rows) > 0 else value_list[0].dtype
+            value_list = [value if value.size > 0 else np.zeros((0,) + row_shape, dtype=dtype)
+                          for value in value_list]
+            arrays[key] = np.concatenate(value_list, axis=0).astype(dtype)
+            arrays['{}_offsets'.format(key)] = np.cumsum([0] + [len(value) for value in value_list],
+                                                         dtype=np.int64)
+
+        self._save(arrays)
+        return arrays
+
+    def _save(self, arrays):
+        tmp_file = '{}.{}.tmp.npz'.format(self.index_file[:-len('.npz')], os.getpid())
+        try:
+            np.savez(tmp_file, __version__=np.array(self.VERSION), __sources__=np.array(self.json_list),
+                     __stats__=self._stat(), **arrays)
+            os.replace(tmp_file, self.index_file)
+        except OSError as e:
+            # Read-only data dirs still work, the index is just rebuilt every time.
+            Log.warn('Anno index {} could not be saved: {}'.format(self.index_file, e))
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You (youansheng@gmail.com)
+# Batch-level augmentations in torch, applied to the collated batch on the model device.
+
+
+import math
+import torch
+import torch.nn.functional as F
+
+from lib.tools.util.logger import Logger as Log
+
+
+def _sample_mask(ratio, batch_size, device):
+    return torch.rand(batch_size, device=device) < ratio
+
+
+def _uniform(lower, upper, batch_size, device):
+    return torch.empty(batch_size, device=device).uniform_(lower, upper)
+
+
+def _where(mask, x, y):
+    # Broadcast the per-sample mask over the remaining dims of x.
+    return torch.where(mask.view(-1, *([1] * (x.dim() - 1))), x, y)
+
+
+def rgb_to_hsv(img):
+    """(N, 3, H, W) RGB in [0, 1] -> HSV with hue in [0, 1)."""
+    r, g, b = img.unbind(1)
+    max_c, _ = img.max(dim=1)
+    min_c, _ = img.min(dim=1)
+    delta = max_c - min_c
+    safe_delta = torch.where(delta > 0, delta, torch.ones_like(delta))
+    hue = torch.where(max_c == r, ((g - b) / safe_delta) % 6,
+                      torch.where(max_c == g, (b - r) / safe_delta + 2, (r - g) / safe_delta + 4))
+    hue = torch.where(delta > 0, hue / 6.0, torch.zeros_like(hue))
+    sat = torch.where(max_c > 0, delta / torch.where(max_c > 0, max_c, torch.ones_like(max_c)),
+                      torch.zeros_like(max_c))
+    return torch.stack((hue, sat, max_c), dim=1)
+
+
+def hsv_to_rgb(img):
+    """Inverse of ``rgb_to_hsv``."""
+    hue, sat, val = img.unbind(1)
+    hue = hue * 6.0
+    k = torch.stack(((5.0 + hue) % 6, (3.0 + hue) % 6, (1.0 + hue) % 6), dim=1)
+    k = torch.min(k, 4.0 - k).clamp(0.0, 1.0)
+    return val.unsqueeze(1) - (val * sat).unsqueeze(1) * k
+
+
+class BatchRandomHFlip(object):
+    def __init__(self, swap_pair=None, ratio=0.5):
+        self.swap_pair = swap_pair if swap_pair is not None else []
+        self.ratio = ratio
+
+    def __call__(self, img, labelmap=None, maskmap=None, kpts=None, bboxes=None):
+        flip_mask = _sample_mask(self.ratio, img.size(0), img.device)
+        width = img.size(3)
+        img = _where(flip_mask, img.flip(-1), img)
+        if labelmap is not None:
+            flipped = labelmap.flip(-1)
+            for pair in self.swap_pair:
+                swapped = flipped.clone()
+                swapped[flipped == pair[0]] = pair[1]
+                swapped[flipped == pair[1]] = pair[0]
+                flipped = swapped
+
+            labelmap = _where(flip_mask, flipped, labelmap)
+
+        if maskmap is not None:
+            maskmap = _where(flip_mask, maskmap.flip(-1), maskmap)
+
+        # bboxes & kpts are ragged, lists of per-sample tensors.
+        flip_list = flip_mask.tolist() if bboxes is not None or kpts is not None else []
+        if bboxes is not None:
+            bboxes = [self._flip_bboxes(item, width) if flip else item for item, flip in zip(bboxes, flip_list)]
+
+        if kpts is not None:
+            flipped = [self._flip_kpts(item, width) if flip else item for item, flip in zip(kpts, flip_list)]
+            kpts = torch.stack(flipped) if isinstance(kpts, torch.Tensor) else flipped
+
+        return img, labelmap, maskmap, kpts, bboxes
+
+    @staticmethod
+    def _flip_bboxes(bboxes, width):
+        if bboxes.numel() == 0:
+            return bboxes
+
+        bboxes = bboxes.clone()
+        bboxes[:, [0, 2]] = width - 1 - bboxes[:, [2, 0]]
+        return bboxes
+
+    def _flip_kpts(self, kpts, width):
+        if kpts.numel() == 0:
+            return kpts
+
+        kpts = kpts.clone()
+        kpts[:, :, 0] = width - 1 - kpts[:, :, 0]
+        for pair in self.swap_pair:
+            kpts[:, [pair[0] - 1, pair[1] - 1]] = kpts[:, [pair[1] - 1, pair[0] - 1]]
+
+        return kpts
+
+
+class BatchRandomBrightness(object):
+    def __init__(self, shift_value=30, ratio=0.5):
+        self.shift_value = shift_value
+        self.ratio = ratio
+
+    def __call__(self, img, labelmap=None, maskmap=None, kpts=None, bboxes=None):
+        mask = _sample_mask(self.ratio, img.size(0), img.device)
+        shift = torch.randint(-self.shift_value, self.shift_value + 1, (img.size(0),), device=img.device)
+        img = _where(mask, (img + shift.view(-1, 1, 1, 1).type_as(img)).round().clamp(0, 255), img)
+        return img, labelmap, maskmap, kpts, bboxes
+
+
+class BatchRandomContrast(object):
+    def __init__(self, lower=0.5, upper=1.5, ratio=0.5):
+        self.lower = lower
+        self.upper = upper
+        self.ratio = ratio
+        assert self.upper >= self.lower, "contrast upper must be >= lower."
+        assert self.lower >= 0, "contrast lower must be non-negative."
+
+    def __call__(self, img, labelmap=None, maskmap=None, kpts=None, bboxes=None):
+        mask = _sample_mask(self.ratio, img.size(0), img.device)
+        factor = _uniform(self.lower, self.upper, img.size(0), img.device)
+        img = _where(mask, (img * factor.view(-1, 1, 1, 1)).clamp(0, 255), img)
+        return img, labelmap, maskmap, kpts, bboxes
+
+
+class BatchRandomSaturation(object):
+    def __init__(self, lower=0.5, upper=1.5, ratio=0.5):
+        self.lower = lower
+        self.upper = upper
+        self.ratio = ratio
+        assert self.upper >= self.lower, "saturation upper must be >= lower."
+        assert self.lower >= 0, "saturation lower must be non-negative."
+
+    def __call__(self, img, labelmap=None, maskmap=None, kpts=None, bboxes=None):
+        mask = _sample_mask(self.ratio, img.size(0), img.device)
+        if not bool(mask.any()):
+            return img, labelmap, maskmap, kpts, bboxes
+
+        factor = _uniform(self.lower, self.upper, img.size(0), img.device)
+        hsv = rgb_to_hsv(img / 255.0)
+        hsv = torch.cat((hsv[:, :1], (hsv[:, 1:2] * factor.view(-1, 1, 1, 1)).clamp(0, 1), hsv[:, 2:]), dim=1)
+        img = _where(mask, (hsv_to_rgb(hsv) * 255.0).clamp(0, 255), img)
+        return img, labelmap, maskmap, kpts, bboxes
+
+
+class BatchRandomHue(object):
+    def __init__(self, delta=18, ratio=0.5):
+        assert 0 <= delta <= 360
+        self.delta = delta
+        self.ratio = ratio
+
+    def __call__(self, img, labelmap=None, maskmap=None, kpts=None, bboxes=None):
+        mask = _sample_mask(self.ratio, img.size(0), img.device)
+        if not bool(mask.any()):
+            return img, labelmap, maskmap, kpts, bboxes
+
+        delta = _uniform(-self.delta, self.delta, img.size(0), img.device) / 360.0
+        hsv = rgb_to_hsv(img / 255.0)
+        hsv = torch.cat(((hsv[:, :1] + delta.view(-1, 1, 1, 1)) % 1.0, hsv[:, 1:]), dim=1)
+        img = _where(mask, (hsv_to_rgb(hsv) * 255.0).clamp(0, 255), img)
+        return img, labelmap, maskmap, kpts, bboxes
+
+
+class BatchRandomBlur(object):
+    """Gaussian blur with a per-sample sigma, as a separable depthwise convolution."""
+    def __init__(self, sigma_range=(0.0, 3.0), ratio=0.5):
+        self.sigma_range = sigma_range
+        self.ratio = ratio
+
+    def __call__(self, img, labelmap=None, maskmap=None, kpts=None, bboxes=None):
+        mask = _sample_mask(self.ratio, img.size(0), img.device)
+        if not bool(mask.any()):
+            return img, labelmap, maskmap, kpts, bboxes
+
+        n, c, h, w = img.size()
+        sigma = _uniform(self.sigma_range[0], self.sigma_range[1], n, img.device).clamp(min=1e-3)
+        radius = max(1, int(math.ceil(3 * self.sigma_range[1])))
+        radius = min(radius, (min(h, w) - 1) // 2)
+        if radius < 1:
+            return img, labelmap, maskmap, kpts, bboxes
+
+        coords = torch.arange(-radius, radius + 1, device=img.device, dtype=img.dtype)
+        kernel = torch.exp(-coords.view(1, -1) ** 2 / (2 * sigma.view(-1, 1).type_as(img) ** 2))
+        kernel = (kernel / kernel.sum(dim=1, keepdim=True)).repeat_interleave(c, dim=0)
+        blurred = img.reshape(1, n * c, h, w)
+        blurred = F.conv2d(F.pad(blurred, (radius, radius, 0, 0), mode='reflect'),
+                           kernel.view(n * c, 1, 1, -1), groups=n * c)
+        blurred = F.conv2d(F.pad(blurred, (0, 0, radius, radius), mode='reflect'),
+                           kernel.view(n * c, 1, -1, 1), groups=n * c)
+        img = _where(mask, blurred.view(n, c, h, w), img)
+        return img, labelmap, maskmap, kpts, bboxes
+
+
+class BatchRandomErase(object):
+    """Fills one random rectangle per sample with ``mean`` (RGB pixel values)."""
+    def __init__(self, ratio=0.5, erase_range=(0.02, 0.4), aspect=0.3, mean=(123, 117, 104)):
+        self.ratio = ratio
+        self.erase_range = erase_range
+        self.aspect = aspect
+        self.mean = mean
+
+    def __call__(self, img, labelmap=None, maskmap=None, kpts=None, bboxes=None):
+        n, _, height, width = img.size()
+        device = img.device
+        mask = _sample_mask(self.ratio, n, device)
+        area = _uniform(self.erase_range[0], self.erase_range[1], n, device) * height * width
+        aspect = torch.exp(_uniform(math.log(self.aspect), -math.log(self.aspect), n, device))
+        h = (area * aspect).sqrt().round().clamp(1, height)
+        w = (area / aspect).sqrt().round().clamp(1, width)
+        y1 = (torch.rand(n, device=device) * (height - h + 1)).floor()
+        x1 = (torch.rand(n, device=device) * (width - w + 1)).floor()
+        rows = torch.arange(height, device=device).view(1, -1)
+        cols = torch.arange(width, device=device).view(1, -1)
+        in_rows = (rows >= y1.view(-1, 1)) & (rows < (y1 + h).view(-1, 1))
+        in_cols = (cols >= x1.view(-1, 1)) & (cols < (x1 + w).view(-1, 1))
+        erase_mask = (in_rows.unsqueeze(2) & in_cols.unsqueeze(1)) & mask.view(-1, 1, 1)
+        fill = torch.tensor(self.mean, dtype=img.dtype, device=device).view(1, -1, 1, 1)
+        img = torch.where(erase_mask.unsqueeze(1), fill.expand_as(img), img)
+        return img, labelmap, maskmap, kpts, bboxes
+
+
+BATCH_AUGMENTATIONS_DICT = {
+    'random_hflip': BatchRandomHFlip,
+    'random_brightness': BatchRandomBrightness,
+    'random_contrast': BatchRandomContrast,
+    'random_saturation': BatchRandomSaturation,
+    'random_hue': BatchRandomHue,
+    'random_blur': BatchRandomBlur,
+    'random_erase': BatchRandomErase,
+}
+
+
+class BatchAugCompose(object):
+    """Augments a collated batch in place of the per-sample photometric transforms.
+
+    Configured by ``<split>.batch_aug_trans``, with the same ``trans_seq`` layout as
+    ``aug_trans``. The normalized ``img`` is mapped back to RGB pixel values, every transform
+    draws its randomness per sample, and the result is normalized again. Without the config
+    block the compose is a no-op.
+
+    Example:
+        >>> "batch_aug_trans": {
+        >>>     "trans_seq": ["random_hflip", "random_brightness", "random_hue"],
+        >>>     "random_hflip": {"ratio": 0.5, "swap_pair": []},
+        >>>     "random_brightness": {"ratio": 0.5, "shift_value": 30},
+        >>>     "random_hue": {"ratio": 0.5, "delta": 18}
+        >>> }
+    """
+    def __init__(self, configer, split='train'):
+        self.configer = configer
+        self.trans_dict = self.configer.get(split, 'batch_aug_trans', default=None)
+        self.trans_seq = [] if self.trans_dict is None else self.trans_dict['trans_seq']
+        self.transforms = dict()
+        for trans in self.trans_seq:
+            if trans not in BATCH_AUGMENTATIONS_DICT:
+                Log.error('Batch aug trans {} is invalid, valid: {}'.format(trans, list(BATCH_AUGMENTATIONS_DICT)))
+                exit(1)
+
+            self.transforms[trans] = BATCH_AUGMENTATIONS_DICT[trans](**self.trans_dict.get(trans, dict()))
+
+        self.normalize = self.configer.get('data.normalize', default=None)
+        self.is_bgr = self.configer.get('data.input_mode', default='BGR') == 'BGR'
+        self.warned = False
+
+    def __len__(self):
+        return len(self.trans_seq)
+
+    def _to_pixel(self, img):
+        if self.normalize is not None:
+            std = img.new_tensor(self.normalize['std']).view(1, -1, 1, 1)
+            mean = img.new_tensor(self.normalize['mean']).view(1, -1, 1, 1)
+            img = (img * std + mean) * self.normalize['div_value']
+
+        return img.flip(1) if self.is_bgr else img
+
+    def _from_pixel(self, img):
+        img = img.flip(1) if self.is_bgr else img
+        if self.normalize is not None:
+            std = img.new_tensor(self.normalize['std']).view(1, -1, 1, 1)
+            mean = img.new_tensor(self.normalize['mean']).view(1, -1, 1, 1)
+            img = (img / self.normalize['div_value'] - mean) / std
+
+        return img
+
+    def __call__(self, data_dict):
+        if len(self.trans_seq) == 0:
+            return data_dict
+
+        if not isinstance(data_dict['img'], torch.Tensor) or data_dict['img'].dim() != 4:
+            # Multi-gpu DataContainer batches are split per device, leave them to the workers.
+            if not self.warned:
+                Log.warn('Batch aug trans only supports stacked image tensors, skipped.')
+                self.warned = True
+
+            return data_dict
+
+        data_dict = dict(data_dict)
+        with torch.no_grad():
+            img = self._to_pixel(data_dict['img'].float())
+            labelmap, maskmap = data_dict.get('labelmap'), data_dict.get('maskmap')
+            kpts, bboxes = data_dict.get('kpts'), data_dict.get('bboxes')
+            for trans in self.trans_seq:
+                img, labelmap, maskmap, kpts, bboxes = self.transforms[trans](
+                    img, labelmap=labelmap, maskmap=maskmap, kpts=kpts, bboxes=bboxes
+                )
+
+            data_dict['img'] = self._from_pixel(img).type_as(data_dict['img'])
+
+        for key, value in zip(['labelmap', 'maskmap', 'kpts', 'bboxes'], [labelmap, maskmap, kpts, bboxes]):
+            if value is not None:
+                data_dict[key] = value
+
+        return data_dict
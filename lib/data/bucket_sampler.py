@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You (youansheng@gmail.com)
+# Batch sampler grouping images of similar aspect ratio & size, to cut the padding of max_size batches.
+
+
+import math
+import os
+import numpy as np
+import torch
+from PIL import Image
+
+from lib.data.anno_index import AnnoIndex
+from lib.tools.util.logger import Logger as Log
+
+
+def _read_size(img_path):
+    # PIL only parses the header here, the pixels are never decoded.
+    with Image.open(img_path) as img:
+        return dict(size=np.array([img.size], dtype=np.int64))
+
+
+def get_img_paths(dataset):
+    if hasattr(dataset, 'img_list'):
+        return list(dataset.img_list)
+
+    if hasattr(dataset, 'item_list'):
+        return [item[0] for item in dataset.item_list]
+
+    return None
+
+
+def read_image_sizes(img_paths, index_file):
+    """Returns the (w, h) of every image as an (N, 2) array, cached in ``index_file``."""
+    size_index = AnnoIndex(img_paths, index_file, _read_size)
+    return np.stack([size_index.get('size', i)[0] for i in range(len(img_paths))]) \
+        if len(img_paths) > 0 else np.zeros((0, 2), dtype=np.int64)
+
+
+def padding_stats(batches, sizes):
+    """Fill rate of max_size batches: image pixels / padded batch pixels."""
+    image_area, padded_area = 0, 0
+    for batch in batches:
+        batch_sizes = sizes[batch]
+        image_area += int((batch_sizes[:, 0] * batch_sizes[:, 1]).sum())
+        padded_area += len(batch) * int(batch_sizes[:, 0].max()) * int(batch_sizes[:, 1].max())
+
+    return image_area / max(padded_area, 1)
+
+
+class BucketBatchSampler(object):
+    """Yields batches of indices whose images share an aspect ratio & size bucket.
+
+    Buckets are ``round(log2(w / h) / aspect_step)`` x ``round(log2(w * h) / size_step)``, both
+    steps 0 groups identical sizes only, which also suits ``size_mode: none``. Batches are
+    formed inside the buckets and, with ``shuffle``, visited in random order. With several
+    replicas every replica takes its share of the batches, ``set_epoch`` seeds the shuffle.
+
+    Args:
+        sizes (np.ndarray): (N, 2) widths & heights of the dataset images.
+    """
+    def __init__(self, sizes, batch_size, shuffle=False, drop_last=False, aspect_step=0.25, size_step=0.5,
+                 num_replicas=1, rank=0, seed=0):
+        self.sizes = np.asarray(sizes, dtype=np.int64)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.seed = seed
+        self.epoch = 0
+        self.buckets = self._group(aspect_step, size_step)
+        batches = self._batches(torch.Generator().manual_seed(seed))
+        fill_rate = padding_stats(batches, self.sizes)
+        Log.info('Bucket sampler: {} images in {} buckets, {} batches, fill rate {:.1%} '
+                 '(padding waste {:.1%}), unbucketed fill rate {:.1%}.'.format(
+                     len(self.sizes), len(self.buckets), len(batches), fill_rate, 1 - fill_rate,
+                     self._unbucketed_fill_rate()))
+
+    def _group(self, aspect_step, size_step):
+        buckets = dict()
+        for index, (width, height) in enumerate(self.sizes.tolist()):
+            if aspect_step > 0 or size_step > 0:
+                key = (int(round(math.log2(width / height) / aspect_step)) if aspect_step > 0 else width / height,
+                       int(round(math.log2(width * height) / size_step)) if size_step > 0 else width * height)
+            else:
+                key = (width, height)
+
+            buckets.setdefault(key, list()).append(index)
+
+        return [buckets[key] for key in sorted(buckets)]
+
+    def _unbucketed_fill_rate(self):
+        order = torch.randperm(len(self.sizes), generator=torch.Generator().manual_seed(self.seed)).tolist() \
+            if self.shuffle else list(range(len(self.sizes)))
+        return padding_stats([order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)],
+                             self.sizes)
+
+    def _batches(self, generator):
+        batches = []
+        for bucket in self.buckets:
+            if self.shuffle:
+                bucket = [bucket[i] for i in torch.randperm(len(bucket), generator=generator).tolist()]
+
+            for i in range(0, len(bucket), self.batch_size):
+                if len(bucket[i:i + self.batch_size]) == self.batch_size or not self.drop_last:
+                    batches.append(bucket[i:i + self.batch_size])
+
+        if self.shuffle:
+            batches = [batches[i] for i in torch.randperm(len(batches), generator=generator).tolist()]
+
+        return batches
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __iter__(self):
+        if self.num_replicas > 1:
+            # Every replica must draw the same order.
+            generator = torch.Generator().manual_seed(self.seed + self.epoch)
+        else:
+            generator = torch.Generator().manual_seed(int(torch.empty((), dtype=torch.int64).random_().item()))
+
+        batches = self._batches(generator)
+        num_batches = len(self)
+        batches = (batches * int(math.ceil(num_batches * self.num_replicas / max(len(batches), 1))))
+        return iter(batches[self.rank:num_batches * self.num_replicas:self.num_replicas])
+
+    def __len__(self):
+        num_batches = sum(len(bucket) // self.batch_size if self.drop_last
+                          else int(math.ceil(len(bucket) / self.batch_size)) for bucket in self.buckets)
+        return int(math.ceil(num_batches / self.num_replicas))
+
+
+def build_batch_sampler(configer, dataset, split, batch_size, shuffle=False, drop_last=False, sampler=None):
+    """Returns a ``BucketBatchSampler`` when ``<split>.bucket_sampler`` is set, else None."""
+    bucket_dict = configer.get(split, 'bucket_sampler', default=None) if split is not None else None
+    if bucket_dict is None:
+        return None
+
+    img_paths = get_img_paths(dataset)
+    if img_paths is None:
+        Log.warn('{} has no image list, bucket sampler disabled.'.format(type(dataset).__name__))
+        return None
+
+    index_file = bucket_dict.get('index_file', None)
+    if index_file is None:
+        index_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(img_paths[0]))),
+                                  '{}_size_index.npz'.format(split)) if len(img_paths) > 0 else None
+
+    sizes = read_image_sizes(img_paths, index_file) if index_file is not None else np.zeros((0, 2))
+    return BucketBatchSampler(sizes, batch_size, shuffle=shuffle, drop_last=drop_last,
+                              aspect_step=bucket_dict.get('aspect_step', 0.25),
+                              size_step=bucket_dict.get('size_step', 0.5),
+                              num_replicas=getattr(sampler, 'num_replicas', 1),
+                              rank=getattr(sampler, 'rank', 0))
@@ -4,10 +4,11 @@
 # Adapted from https://github.com/open-mmlab/mmcv/blob/master/mmcv/parallel/collate.py
 
 
-import random
 import collections
+import numpy as np
 import torch
 import torch.nn.functional as F
+from torch.utils.data import get_worker_info
 from torch.utils.data.dataloader import default_collate
 try:
     from collections.abc import Mapping, Sequence
@@ -16,11 +17,65 @@ except ImportError:
 string_classes = (str, bytes)
 int_classes = int
 
+from lib.data.thread_random import random
 from lib.parallel.data_container import DataContainer
 from lib.tools.helper.tensor_helper import TensorHelper
 from lib.tools.util.logger import Logger as Log
 
 
+# Numpy arrays at least this large leave the workers through shared memory.
+SHARED_ARRAY_MIN_BYTES = 64 * 1024
+
+
+def _tensor_to_numpy(tensor):
+    return tensor.numpy()
+
+
+class SharedArray(object):
+    """Wraps a numpy array so that it is pickled as a torch tensor.
+
+    The DataLoader worker queue moves tensors into shared memory and only sends a handle,
+    unpickling on the main process gives back a numpy array viewing that memory.
+    """
+    def __init__(self, array):
+        # torch.from_numpy warns on read-only arrays (e.g. views of decoded buffers), those are copied.
+        self.tensor = torch.from_numpy(np.require(array, requirements=['C', 'W']))
+
+    def __reduce__(self):
+        return _tensor_to_numpy, (self.tensor,)
+
+
+def share_arrays(data, min_bytes=None):
+    """Replaces the large numpy arrays in nested dicts/lists/DataContainers by ``SharedArray``."""
+    min_bytes = SHARED_ARRAY_MIN_BYTES if min_bytes is None else min_bytes
+    if isinstance(data, np.ndarray):
+        if data.nbytes < min_bytes or data.dtype.hasobject:
+            return data
+
+        try:
+            return SharedArray(data)
+        except TypeError:
+            # dtypes torch can not hold, e.g. unicode strings.
+            return data
+
+    if isinstance(data, DataContainer):
+        data._data = share_arrays(data.data, min_bytes)
+        return data
+
+    if isinstance(data, Mapping):
+        return {key: share_arrays(value, min_bytes) for key, value in data.items()}
+
+    if isinstance(data, (list, tuple)):
+        return type(data)(share_arrays(item, min_bytes) for item in data)
+
+    return data
+
+
+def _share_in_worker(data_dict):
+    # Batches built in the main process are never pickled.
+    return share_arrays(data_dict) if get_worker_info() is not None else data_dict
+
+
 def stack(batch, data_key=None, device_ids=None):
     if isinstance(batch[0][data_key], DataContainer):
         if batch[0][data_key].stack:
@@ -66,10 +121,14 @@ def stack(batch, data_key=None, device_ids=None):
 
 
 def collate(batch, trans_dict, device_ids=None):
-    device_ids = list(range(torch.cuda.device_count())) if device_ids is None else device_ids
+    device_ids = list(range(max(torch.cuda.device_count(), 1))) if device_ids is None else device_ids
+    if isinstance(batch[0], (list, tuple)):
+        # Multi-crop datasets return a list of samples per index.
+        batch = [sample for samples in batch for sample in samples]
+
     data_keys = batch[0].keys()
     if trans_dict['size_mode'] == 'none':
-        return dict({key: stack(batch, data_key=key, device_ids=device_ids) for key in data_keys})
+        return _share_in_worker(dict({key: stack(batch, data_key=key, device_ids=device_ids) for key in data_keys}))
 
     samples_per_gpu = (len(batch) - 1 + len(device_ids)) // len(device_ids)
     samples_per_gpu = samples_per_gpu if batch[0]['img'].samples_per_gpu else len(batch)
@@ -196,4 +255,4 @@ def collate(batch, trans_dict, device_ids=None):
                     batch[i]['bboxes'].data[:, 0::2] += left_pad
                     batch[i]['bboxes'].data[:, 1::2] += up_pad
 
-    return dict({key: stack(batch, data_key=key, device_ids=device_ids) for key in data_keys})
+    return _share_in_worker(dict({key: stack(batch, data_key=key, device_ids=device_ids) for key in data_keys}))
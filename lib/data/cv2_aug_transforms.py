@@ -4,12 +4,16 @@
 # Image Augmentations implemented by OpenCV. Including RandomPad, RandomRotate, RandomResize etc.
 
 
-import collections
-import random
 import math
 import cv2
 import numpy as np
 import imgaug.augmenters as iaa
+try:
+    from collections.abc import Iterable
+except ImportError:
+    from collections import Iterable  # type: ignore
+
+from lib.data.thread_random import random
 
 
 class RandomBlur(object):
@@ -543,7 +547,19 @@ class RandomResize(object):
         else:
             raise NotImplementedError('Resize method {} undefined!'.format(self.method))
 
-    def __call__(self, img, labelmap=None, maskmap=None, kpts=None, bboxes=None, labels=None, polygons=None):
+    def get_scale_ratio(self, img_size, bboxes):
+        if random.random() < self.ratio:
+            scale_ratio = self.get_scale(img_size, bboxes)
+            aspect_ratio = random.uniform(*self.aspect_range)
+            w_scale_ratio = math.sqrt(aspect_ratio) * scale_ratio
+            h_scale_ratio = math.sqrt(1.0 / aspect_ratio) * scale_ratio
+        else:
+            w_scale_ratio, h_scale_ratio = 1.0, 1.0
+
+        return w_scale_ratio, h_scale_ratio
+
+    def __call__(self, img, labelmap=None, maskmap=None, kpts=None, bboxes=None, labels=None, polygons=None,
+                 scale_ratio=None):
         """
         Args:
             img     (Image):   Image to be resized.
@@ -561,13 +577,10 @@ class RandomResize(object):
         assert labelmap is None or isinstance(labelmap, np.ndarray)
         assert maskmap is None or isinstance(maskmap, np.ndarray)
         height, width, _ = img.shape if isinstance(img, np.ndarray) else img[0].shape
-        if random.random() < self.ratio:
-            scale_ratio = self.get_scale([width, height], bboxes)
-            aspect_ratio = random.uniform(*self.aspect_range)
-            w_scale_ratio = math.sqrt(aspect_ratio) * scale_ratio
-            h_scale_ratio = math.sqrt(1.0 / aspect_ratio) * scale_ratio
-        else:
-            w_scale_ratio, h_scale_ratio = 1.0, 1.0
+        if scale_ratio is None:
+            scale_ratio = self.get_scale_ratio([width, height], bboxes)
+
+        w_scale_ratio, h_scale_ratio = scale_ratio
 
         if kpts is not None and kpts.size > 0:
             kpts[:, :, 0] *= w_scale_ratio
@@ -713,7 +726,7 @@ class RandomCrop(object):
         self.allow_outside_center = allow_outside_center
         if isinstance(crop_size, float):
             self.size = (crop_size, crop_size)
-        elif isinstance(crop_size, collections.Iterable) and len(crop_size) == 2:
+        elif isinstance(crop_size, Iterable) and len(crop_size) == 2:
             self.size = crop_size
         else:
             raise TypeError('Got inappropriate size arg: {}'.format(crop_size))
@@ -823,7 +836,7 @@ class RandomFocusCrop(object):
         self.allow_outside_center = allow_outside_center
         if isinstance(crop_size, float):
             self.size = (crop_size, crop_size)
-        elif isinstance(crop_size, collections.Iterable) and len(crop_size) == 2:
+        elif isinstance(crop_size, Iterable) and len(crop_size) == 2:
             self.size = crop_size
         else:
             raise TypeError('Got inappropriate size arg: {}'.format(crop_size))
@@ -1190,6 +1203,48 @@ class CV2AugCompose(object):
             else:
                 self.transforms[trans] = CV2_AUGMENTATIONS_DICT[trans](**self.trans_dict[trans])
 
+        self.fuse_resize_crop = self.trans_dict.get('fuse_resize_crop', True)
+
+    def _can_fuse(self, trans_seq, i, img, kpts, bboxes, polygons):
+        return self.fuse_resize_crop and i + 1 < len(trans_seq) \
+               and type(self.transforms[trans_seq[i]]) is RandomResize \
+               and type(self.transforms[trans_seq[i + 1]]) is RandomCrop \
+               and isinstance(img, np.ndarray) and kpts is None and bboxes is None and polygons is None
+
+    @staticmethod
+    def resize_crop(resize_trans, crop_trans, img, labelmap=None, maskmap=None):
+        """RandomResize followed by RandomCrop, computing only the pixels inside the crop.
+
+        Draws the same random numbers as the two transforms applied in sequence and samples
+        the source at the same coordinates as cv2.resize, so the result matches the unfused
+        chain up to the fixed-point rounding of bilinear interpolation.
+        """
+        height, width, _ = img.shape
+        w_scale_ratio, h_scale_ratio = resize_trans.get_scale_ratio([width, height], None)
+        converted_size = (int(width * w_scale_ratio), int(height * h_scale_ratio))
+        if random.random() > crop_trans.ratio:
+            return resize_trans(img, labelmap, maskmap, scale_ratio=(w_scale_ratio, h_scale_ratio))[:3]
+
+        target_size = [min(crop_trans.size[0], converted_size[0]), min(crop_trans.size[1], converted_size[1])]
+        offset_left, offset_up = crop_trans.get_lefttop(target_size, converted_size)
+        # cv2.resize maps dst pixel u to src (u + 0.5) * scale - 0.5 (linear) and floor(u * scale) (nearest).
+        x_scale, y_scale = 1. / (converted_size[0] / width), 1. / (converted_size[1] / height)
+        affine_mat = np.array([[x_scale, 0., (offset_left + 0.5) * x_scale - 0.5],
+                               [0., y_scale, (offset_up + 0.5) * y_scale - 0.5]])
+        img = cv2.warpAffine(img, affine_mat, tuple(target_size), flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                             borderMode=cv2.BORDER_REPLICATE).astype(np.uint8)
+        rows = np.minimum(np.floor(np.arange(offset_up, offset_up + target_size[1]) * y_scale).astype(np.int64),
+                          height - 1)
+        cols = np.minimum(np.floor(np.arange(offset_left, offset_left + target_size[0]) * x_scale).astype(np.int64),
+                          width - 1)
+        if labelmap is not None:
+            labelmap = labelmap[rows[:, None], cols[None, :]]
+
+        if maskmap is not None:
+            maskmap = maskmap[rows[:, None], cols[None, :]]
+
+        return img, labelmap, maskmap
+
     def __call__(self, img, labelmap=None, maskmap=None, kpts=None, bboxes=None, labels=None, polygons=None):
         shuffle_trans_seq = []
         if 'shuffle_trans_seq' in self.trans_dict:
@@ -1197,18 +1252,29 @@ class CV2AugCompose(object):
                 shuffle_trans_seq_list = self.trans_dict['shuffle_trans_seq']
                 shuffle_trans_seq = shuffle_trans_seq_list[random.randint(0, len(shuffle_trans_seq_list))]
             else:
-                shuffle_trans_seq = self.trans_dict['shuffle_trans_seq']
+                # A copy, loader threads share the config list & would permute each other's order.
+                shuffle_trans_seq = list(self.trans_dict['shuffle_trans_seq'])
                 random.shuffle(shuffle_trans_seq)
 
-        for trans_key in (shuffle_trans_seq + self.trans_dict['trans_seq']):
+        trans_seq = shuffle_trans_seq + self.trans_dict['trans_seq']
+        i = 0
+        while i < len(trans_seq):
+            if self._can_fuse(trans_seq, i, img, kpts, bboxes, polygons):
+                img, labelmap, maskmap = self.resize_crop(self.transforms[trans_seq[i]],
+                                                          self.transforms[trans_seq[i + 1]], img, labelmap, maskmap)
+                i += 2
+                continue
+
             (img, labelmap, maskmap, kpts,
-             bboxes, labels, polygons) = self.transforms[trans_key](img, labelmap, maskmap,
-                                                                    kpts, bboxes, labels, polygons)
+             bboxes, labels, polygons) = self.transforms[trans_seq[i]](img, labelmap, maskmap,
+                                                                       kpts, bboxes, labels, polygons)
+            i += 1
 
-        if self.configer.get('data', 'input_mode') == 'RGB':
+        input_mode = self.configer.frozen.data.input_mode
+        if input_mode == 'RGB':
             img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
 
-        if self.configer.get('data', 'input_mode') == 'GRAY':
+        if input_mode == 'GRAY':
             img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
         out_list = [img]
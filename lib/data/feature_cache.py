@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You(youansheng@gmail.com)
+# Cached backbone features for head-only fine-tuning: fp16 memory-mapped shards.
+
+
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import torch
+from torch.utils import data
+
+from lib.tools.util.logger import Logger as Log
+
+
+class FeatureCache(object):
+    """Multi-scale features & labelmaps of a data set, stored as ``.npy`` shards.
+
+    Shard k holds ``shard<k>_feat<i>.npy`` ([n, C_i, H_i, W_i] in ``dtype``) for every feature and
+    ``shard<k>_label.npy`` ([n, H, W] int16), all readable with ``np.load(mmap_mode='r')``.
+    ``meta.json`` records the sample count of every shard and the settings the cache was built
+    with; a cache whose settings differ from the requested ones is rebuilt.
+    """
+    META_FILE = 'meta.json'
+
+    @staticmethod
+    def fingerprint(modules):
+        """A digest of the weights & buffers of modules, a changed backbone invalidates the cache."""
+        sha1 = hashlib.sha1()
+        for module in modules:
+            for key, value in module.state_dict().items():
+                value = value.detach().double()
+                sha1.update(key.encode('utf-8'))
+                sha1.update(np.array([value.sum().item(), value.abs().sum().item()]).tobytes())
+
+        return sha1.hexdigest()
+
+    @staticmethod
+    def is_valid(cache_dir, settings):
+        meta_file = os.path.join(cache_dir, FeatureCache.META_FILE)
+        if not os.path.exists(meta_file):
+            return False
+
+        with open(meta_file, 'r') as f:
+            meta = json.load(f)
+
+        return meta['settings'] == json.loads(json.dumps(settings))
+
+    @staticmethod
+    def build(cache_dir, extract_fn, loader, settings, passes=1, shard_size=256, dtype='float16'):
+        """Runs extract_fn(data_dict) -> [features] over passes epochs of loader into cache_dir."""
+        tmp_dir = '{}.tmp'.format(cache_dir)
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+
+        os.makedirs(tmp_dir)
+        num_samples = len(loader.dataset) * getattr(loader.dataset, 'crops_per_image', 1) * passes
+        shards, arrays, index = [], None, shard_size
+        for pass_id in range(passes):
+            for data_dict in loader:
+                feats = [feat.detach().cpu().to(getattr(torch, dtype)).numpy() for feat in extract_fn(data_dict)]
+                if not all(np.isfinite(feat).all() for feat in feats):
+                    Log.error('Features overflow {}, set train.feature_cache.dtype to float32.'.format(dtype))
+                    exit(1)
+
+                labelmap = data_dict['labelmap'].cpu().numpy().astype(np.int16)
+                for j in range(labelmap.shape[0]):
+                    if index == shard_size:
+                        # The last shard is sized for the samples left.
+                        size = max(min(shard_size, num_samples - sum(shards)), 1)
+                        arrays = [np.lib.format.open_memmap(
+                            os.path.join(tmp_dir, 'shard{}_feat{}.npy'.format(len(shards), i)), mode='w+',
+                            dtype=feat.dtype, shape=(size,) + feat.shape[1:]) for i, feat in enumerate(feats)]
+                        arrays.append(np.lib.format.open_memmap(
+                            os.path.join(tmp_dir, 'shard{}_label.npy'.format(len(shards))), mode='w+',
+                            dtype=np.int16, shape=(size,) + labelmap.shape[1:]))
+                        shards.append(0)
+                        index = 0
+
+                    for array, value in zip(arrays, feats + [labelmap]):
+                        array[index] = value[j]
+
+                    index += 1
+                    shards[-1] += 1
+                    if index == arrays[0].shape[0]:
+                        FeatureCache._flush(arrays)
+                        arrays, index = None, shard_size
+
+            Log.info('Feature cache pass {}/{}: {} samples.'.format(pass_id + 1, passes, sum(shards)))
+
+        if arrays is not None:
+            FeatureCache._flush(arrays)
+
+        with open(os.path.join(tmp_dir, FeatureCache.META_FILE), 'w') as f:
+            json.dump(dict(settings=settings, shards=shards, num_feats=len(feats)), f)
+
+        if os.path.exists(cache_dir):
+            shutil.rmtree(cache_dir)
+
+        os.rename(tmp_dir, cache_dir)
+        num_bytes = sum(os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir))
+        Log.info('Feature cache {}: {} samples, {:.1f} MB.'.format(cache_dir, sum(shards), num_bytes / 2 ** 20))
+
+    @staticmethod
+    def _flush(arrays):
+        for array in arrays:
+            array.flush()
+
+
+class FeatureCacheDataset(data.Dataset):
+    """The samples of a FeatureCache: dict(feats=[C_i x H_i x W_i tensors], labelmap=H x W LongTensor).
+
+    The shards are memory-mapped lazily in every loader worker, the page cache shares them.
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, FeatureCache.META_FILE), 'r') as f:
+            meta = json.load(f)
+
+        self.num_feats = meta['num_feats']
+        self.item_list = [(shard, j) for shard, count in enumerate(meta['shards']) for j in range(count)]
+        self.arrays = None
+
+    def __len__(self):
+        return len(self.item_list)
+
+    def __getstate__(self):
+        # Memory maps would be pickled as arrays, the workers open their own.
+        state = self.__dict__.copy()
+        state['arrays'] = None
+        return state
+
+    def _open(self):
+        num_shards = self.item_list[-1][0] + 1 if len(self.item_list) > 0 else 0
+        self.arrays = [[np.load(os.path.join(self.cache_dir, 'shard{}_feat{}.npy'.format(shard, i)), mmap_mode='r')
+                        for i in range(self.num_feats)]
+                       + [np.load(os.path.join(self.cache_dir, 'shard{}_label.npy'.format(shard)), mmap_mode='r')]
+                       for shard in range(num_shards)]
+
+    def __getitem__(self, index):
+        if self.arrays is None:
+            self._open()
+
+        shard, j = self.item_list[index]
+        arrays = self.arrays[shard]
+        feats = [torch.from_numpy(np.ascontiguousarray(array[j])) for array in arrays[:-1]]
+        labelmap = torch.from_numpy(arrays[-1][j].astype(np.int64))
+        return dict(feats=feats, labelmap=labelmap)
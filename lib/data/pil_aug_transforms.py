@@ -4,13 +4,17 @@
 # Image Augmentations implemented by PIL.Image. Including RandomPad, RandomRotate, RandomResize etc.
 
 
-import collections
-import random
 import math
 import cv2
 import matplotlib
 import numpy as np
 from PIL import Image, ImageFilter, ImageOps
+try:
+    from collections.abc import Iterable
+except ImportError:
+    from collections import Iterable  # type: ignore
+
+from lib.data.thread_random import random, np_random
 
 
 class RandomPad(object):
@@ -330,7 +334,7 @@ class RandomBrightness(object):
             return img, labelmap, maskmap, kpts, bboxes, labels, polygons
 
         img_mode = img.mode
-        shift = np.random.uniform(-self.shift_value, self.shift_value, size=1)
+        shift = np_random.uniform(-self.shift_value, self.shift_value, size=1)
         img = np.asarray(img).astype(np.float32)
         img[:, :, :] += shift
         img = np.around(img)
@@ -351,7 +355,7 @@ class RandomGaussBlur(object):
         if random.random() > self.ratio:
             return img, labelmap, maskmap, kpts, bboxes, labels, polygons
 
-        blur_value = np.random.uniform(0, self.max_blur)
+        blur_value = np_random.uniform(0, self.max_blur)
         img = img.filter(ImageFilter.GaussianBlur(radius=blur_value))
         return img, labelmap, maskmap, kpts, bboxes, labels, polygons
 
@@ -390,9 +394,9 @@ class RandomHSV(object):
         img = np.asarray(img)
         img_hsv = matplotlib.colors.rgb_to_hsv(img)
         img_h, img_s, img_v = img_hsv[:, :, 0], img_hsv[:, :, 1], img_hsv[:, :, 2]
-        h_random = np.random.uniform(min(self.h_range), max(self.h_range))
-        s_random = np.random.uniform(min(self.s_range), max(self.s_range))
-        v_random = np.random.uniform(min(self.v_range), max(self.v_range))
+        h_random = np_random.uniform(min(self.h_range), max(self.h_range))
+        s_random = np_random.uniform(min(self.s_range), max(self.s_range))
+        v_random = np_random.uniform(min(self.v_range), max(self.v_range))
         img_h = np.clip(img_h * h_random, 0, 1)
         img_s = np.clip(img_s * s_random, 0, 1)
         img_v = np.clip(img_v * v_random, 0, 255)
@@ -704,7 +708,7 @@ class RandomCrop(object):
         self.allow_outside_center = allow_outside_center
         if isinstance(crop_size, float):
             self.size = (crop_size, crop_size)
-        elif isinstance(crop_size, collections.Iterable) and len(crop_size) == 2:
+        elif isinstance(crop_size, Iterable) and len(crop_size) == 2:
             self.size = crop_size
         else:
             raise TypeError('Got inappropriate size arg: {}'.format(crop_size))
@@ -817,7 +821,7 @@ class RandomFocusCrop(object):
         self.allow_outside_center = allow_outside_center
         if isinstance(crop_size, float):
             self.size = (crop_size, crop_size)
-        elif isinstance(crop_size, collections.Iterable) and len(crop_size) == 2:
+        elif isinstance(crop_size, Iterable) and len(crop_size) == 2:
             self.size = crop_size
         else:
             raise TypeError('Got inappropriate size arg: {}'.format(crop_size))
@@ -1173,14 +1177,15 @@ class PILAugCompose(object):
                 self.transforms[trans] = PIL_AUGMENTATIONS_DICT[trans](**self.trans_dict[trans])
 
     def __call__(self, img, labelmap=None, maskmap=None, kpts=None, bboxes=None, labels=None, polygons=None):
-        assert self.configer.get('data', 'input_mode') == 'RGB'
+        assert self.configer.frozen.data.input_mode == 'RGB'
         shuffle_trans_seq = []
         if 'shuffle_trans_seq' in self.trans_dict:
             if isinstance(self.trans_dict['shuffle_trans_seq'][0], list):
                 shuffle_trans_seq_list = self.trans_dict['shuffle_trans_seq']
                 shuffle_trans_seq = shuffle_trans_seq_list[random.randint(0, len(shuffle_trans_seq_list))]
             else:
-                shuffle_trans_seq = self.trans_dict['shuffle_trans_seq']
+                # A copy, loader threads share the config list & would permute each other's order.
+                shuffle_trans_seq = list(self.trans_dict['shuffle_trans_seq'])
                 random.shuffle(shuffle_trans_seq)
 
         for trans_key in (shuffle_trans_seq + self.trans_dict['trans_seq']):
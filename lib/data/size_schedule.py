@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You(youansheng@gmail.com)
+# Progressive-resolution training: train crop & input sizes as a function of iters/epoch.
+
+
+import bisect
+from torch.optim import lr_scheduler
+
+from lib.tools.util.logger import Logger as Log
+
+
+class SizeSchedule(object):
+    """Reads ``train.size_schedule`` and rewrites the train sizes of the configer per stage.
+
+    Stage i covers ``milestones[i-1] <= runner_state[metric] < milestones[i]`` and trains at
+    ``sizes[i]`` (w, h): ``train.aug_trans.random_crop.crop_size`` and, for ``fix_size``,
+    ``train.data_transformer.input_size`` become that size, ``multi_size`` input sizes are scaled
+    by its ratio to the last size and rounded to ``fit_stride``. With ``scale_batch`` the batch
+    keeps the pixel count of the last stage, with ``scale_lr`` the lr follows the batch size.
+
+    Example:
+        >>> "size_schedule": {
+        >>>     "milestones": [20000, 40000],
+        >>>     "sizes": [[256, 256], [384, 384], [512, 512]],
+        >>>     "scale_batch": false,
+        >>>     "scale_lr": false
+        >>> }
+    """
+    def __init__(self, configer):
+        self.configer = configer
+        self.schedule = configer.get('train.size_schedule', default=None)
+        self.enabled = self.schedule is not None and len(self.schedule['sizes']) > 0
+        if not self.enabled:
+            return
+
+        self.metric = self.schedule.get('metric', configer.get('solver.lr.metric'))
+        self.milestones = list(self.schedule['milestones'])
+        self.sizes = [list(size) for size in self.schedule['sizes']]
+        if len(self.sizes) != len(self.milestones) + 1 or self.milestones != sorted(self.milestones):
+            Log.error('train.size_schedule needs ascending milestones & one more size than milestones.')
+            exit(1)
+
+        trans_dict = configer.get('train.data_transformer')
+        self.stride = trans_dict.get('fit_stride', 1)
+        for size in self.sizes:
+            if size[0] % self.stride != 0 or size[1] % self.stride != 0:
+                Log.error('Size schedule size {} is not a multiple of fit_stride {}.'.format(size, self.stride))
+                exit(1)
+
+        self.crops_per_image = configer.get('train.crops_per_image', default=1)
+        self.batch_size = configer.get('train.batch_size')
+        self.ms_input_size = trans_dict.get('ms_input_size', None)
+        self.base_lrs = None
+        self.lr_ratio = 1.0
+
+    def get_stage(self, runner_state):
+        return bisect.bisect_right(self.milestones, runner_state.get(self.metric, 0))
+
+    def get_batch_size(self, stage):
+        if not self.schedule.get('scale_batch', False):
+            return self.batch_size
+
+        width, height = self.sizes[stage]
+        last_width, last_height = self.sizes[-1]
+        batch_size = self.batch_size * (last_width * last_height) / (width * height)
+        # Multi-crop datasets need whole images per batch.
+        return max(int(round(batch_size / self.crops_per_image)), 1) * self.crops_per_image
+
+    def apply(self, stage):
+        """Writes the sizes of stage into the configer, the train loader must be built again."""
+        width, height = self.sizes[stage]
+        if 'random_crop' in self.configer.get('train.aug_trans'):
+            self.configer.update('train.aug_trans.random_crop.crop_size', [width, height])
+
+        size_mode = self.configer.get('train.data_transformer.size_mode')
+        if size_mode == 'fix_size':
+            self.configer.update('train.data_transformer.input_size', [width, height])
+
+        elif size_mode == 'multi_size' and self.ms_input_size is not None:
+            last_width, last_height = self.sizes[-1]
+            self.configer.update('train.data_transformer.ms_input_size', [
+                [max(int(round(w * width / last_width / self.stride)), 1) * self.stride,
+                 max(int(round(h * height / last_height / self.stride)), 1) * self.stride]
+                for w, h in self.ms_input_size])
+
+        batch_size = self.get_batch_size(stage)
+        self.configer.update('train.batch_size', batch_size)
+        Log.info('Size schedule stage {}: size {}, batch size {}.'.format(stage, [width, height], batch_size))
+
+    def scale_lr(self, scheduler, stage):
+        """Scales the lrs of scheduler linearly with the batch size of stage.
+
+        LambdaLR and the closed form of StepLR/MultiStepLR (``step(epoch)``) compute the lrs
+        from ``base_lrs``, the chainable ``step()`` & ReduceLROnPlateau from the current lrs of
+        the param groups, so both are scaled.
+        """
+        if not self.schedule.get('scale_lr', False):
+            return
+
+        ratio = self.get_batch_size(stage) / self.batch_size
+        if hasattr(scheduler, 'base_lrs'):
+            if self.base_lrs is None:
+                self.base_lrs = list(scheduler.base_lrs)
+
+            scheduler.base_lrs = [base_lr * ratio for base_lr in self.base_lrs]
+
+        if not isinstance(scheduler, lr_scheduler.LambdaLR):
+            for param_group in scheduler.optimizer.param_groups:
+                param_group['lr'] *= ratio / self.lr_ratio
+
+        self.lr_ratio = ratio
+        Log.info('Size schedule stage {}: lr x{:.3f}.'.format(stage, ratio))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You (youansheng@gmail.com)
+# Thread-pool data loader. Decode & cv2 augmentations release the GIL, so threads avoid the
+# process spawn, pickling and duplicated memory of the multi-process DataLoader.
+
+
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import torch
+from torch.utils import data
+from torch.utils.data._utils.pin_memory import pin_memory as pin_batch
+
+from lib.data.bucket_sampler import build_batch_sampler
+from lib.data.thread_random import seed_thread
+from lib.tools.util.logger import Logger as Log
+
+
+class ThreadDataLoader(object):
+    """A subset of ``torch.utils.data.DataLoader`` running ``__getitem__`` & ``collate_fn`` in threads.
+
+    Batches are yielded in sampler order with at most ``num_workers * prefetch_factor`` of them
+    in flight. The augmentations of every batch draw from generators seeded with
+    ``base_seed + batch index``, where ``base_seed`` comes from the torch RNG once per epoch,
+    so an epoch is reproducible under ``torch.manual_seed`` whatever the thread scheduling.
+    """
+    def __init__(self, dataset, batch_size=1, shuffle=False, sampler=None, batch_sampler=None,
+                 num_workers=0, collate_fn=None, pin_memory=False, drop_last=False, prefetch_factor=2):
+        self.dataset = dataset
+        self.num_workers = max(num_workers, 1)
+        self.collate_fn = collate_fn if collate_fn is not None else data.dataloader.default_collate
+        self.pin_memory = pin_memory and torch.cuda.is_available()
+        self.prefetch_factor = prefetch_factor
+        if batch_sampler is None:
+            if sampler is None:
+                sampler = data.RandomSampler(dataset) if shuffle else data.SequentialSampler(dataset)
+
+            batch_sampler = data.BatchSampler(sampler, batch_size, drop_last)
+
+        self.sampler = sampler
+        self.batch_sampler = batch_sampler
+
+    def __len__(self):
+        return len(self.batch_sampler)
+
+    def _load_batch(self, seed, indices):
+        seed_thread(seed)
+        batch = self.collate_fn([self.dataset[i] for i in indices])
+        return pin_batch(batch) if self.pin_memory else batch
+
+    def __iter__(self):
+        base_seed = int(torch.empty((), dtype=torch.int64).random_().item())
+        max_pending = self.num_workers * self.prefetch_factor
+        pending = collections.deque()
+        with ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix='loader') as executor:
+            try:
+                for i, indices in enumerate(self.batch_sampler):
+                    pending.append(executor.submit(self._load_batch, base_seed + i, indices))
+                    if len(pending) >= max_pending:
+                        yield pending.popleft().result()
+
+                while len(pending) > 0:
+                    yield pending.popleft().result()
+            finally:
+                # Stopped early (e.g. max_iters), drop the prefetched batches.
+                for future in pending:
+                    future.cancel()
+
+
+def build_loader(configer, dataset, split=None, **kwargs):
+    """Builds the loader selected by ``data.loader_backend``: processes (default) or threads.
+
+    With ``<split>.bucket_sampler`` set, batching is delegated to a ``BucketBatchSampler``.
+    """
+    batch_sampler = build_batch_sampler(configer, dataset, split, batch_size=kwargs.get('batch_size', 1),
+                                        shuffle=kwargs.get('shuffle') or getattr(kwargs.get('sampler'), 'shuffle', False),
+                                        drop_last=kwargs.get('drop_last', False), sampler=kwargs.get('sampler'))
+    if batch_sampler is not None:
+        for key in ['batch_size', 'shuffle', 'drop_last', 'sampler']:
+            kwargs.pop(key, None)
+
+        kwargs['batch_sampler'] = batch_sampler
+
+    backend = configer.get('data.loader_backend', default='processes')
+    if backend == 'processes':
+        return data.DataLoader(dataset, **kwargs)
+
+    if backend == 'threads':
+        return ThreadDataLoader(dataset, **kwargs)
+
+    Log.error('Loader backend {} is invalid.'.format(backend))
+    exit(1)
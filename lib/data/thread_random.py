@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You (youansheng@gmail.com)
+# Per-thread random generators for the augmentations, used by the threads loader backend.
+
+
+import random as _random
+import threading
+import numpy as np
+
+
+class ThreadRandom(object):
+    """Stands in for the ``random`` module (or ``np.random``) inside the augmentations.
+
+    Draws from the module-level generator unless the calling thread has been seeded with
+    ``seed_thread``, so the process loader backend and the main process behave as before
+    while loader threads get independent, reproducible streams.
+    """
+    def __init__(self, default_module, generator_cls):
+        self._default_module = default_module
+        self._generator_cls = generator_cls
+        self._local = threading.local()
+
+    def seed_thread(self, seed):
+        self._local.generator = self._generator_cls(seed)
+
+    def __getattr__(self, name):
+        return getattr(getattr(self._local, 'generator', self._default_module), name)
+
+
+random = ThreadRandom(_random, _random.Random)
+np_random = ThreadRandom(np.random, lambda seed: np.random.RandomState(seed % (2 ** 32)))
+
+
+def seed_thread(seed):
+    random.seed_thread(seed)
+    np_random.seed_thread(seed)
@@ -6,6 +6,8 @@
 import os
 import torch
 import torch.nn as nn
+from torch.nn.modules.batchnorm import _BatchNorm
+from torch.utils.checkpoint import checkpoint as torch_checkpoint
 
 try:
     from urllib import urlretrieve
@@ -112,6 +114,35 @@ class ModuleHelper(object):
             Log.error('Not support BN type: {}.'.format(norm_type))
             exit(1)
 
+    @staticmethod
+    def checkpoint(module, *inputs):
+        """Runs module with activation checkpointing while training, plainly otherwise.
+
+        The activations inside module are dropped after the forward pass & recomputed in backward.
+        The recomputation normalizes with the same batch statistics, the BatchNorm running stats
+        are restored afterwards so that every batch is only counted once.
+        """
+        if not (module.training and torch.is_grad_enabled()):
+            return module(*inputs)
+
+        state = dict(recompute=False)
+
+        def run(*args):
+            if not state['recompute']:
+                state['recompute'] = True
+                return module(*args)
+
+            bn_buffers = [(buf, buf.clone()) for m in module.modules()
+                          if isinstance(m, _BatchNorm) and m.track_running_stats for buf in m.buffers()]
+            try:
+                return module(*args)
+            finally:
+                # Also on the early stop of the recomputation, which torch signals by raising.
+                for buf, saved_buf in bn_buffers:
+                    buf.copy_(saved_buf)
+
+        return torch_checkpoint(run, *inputs, use_reentrant=False)
+
     @staticmethod
     def load_model(model, pretrained=None, all_match=True, map_location='cpu'):
         if pretrained is None:
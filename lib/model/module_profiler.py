@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You(youansheng@gmail.com)
+# Per-module forward latency, activation bytes, parameters & FLOPs of any ModelManager model.
+#   python -m lib.model.module_profiler --config_file configs/seg/sfnet_res101_ui.conf \
+#       --input_size 512 512 --iters 10 --depth 3 --csv sfnet_profile.csv
+
+
+import argparse
+import csv
+import re
+import time
+import torch
+import torch.nn as nn
+from torch.nn.modules.batchnorm import _BatchNorm
+
+from lib.tools.util.configer import Configer
+from lib.tools.util.logger import Logger as Log
+
+
+COLUMNS = ['module', 'type', 'depth', 'calls', 'total_ms', 'self_ms', 'share', 'out_mb', 'params_m', 'gflops']
+
+
+class ModuleProfiler(object):
+    """Times the forward of every module of net with forward (pre-)hooks.
+
+    ``total_ms`` is the inclusive time of a module per forward (all its calls), ``self_ms`` the
+    part not spent in its child modules, e.g. the torch.cat & interpolate calls of its forward.
+    ``out_mb`` sums the bytes of the output tensors (activation memory, for every call),
+    ``params_m`` counts the parameters of the module & its children. ``gflops`` counts 2 FLOPs
+    per multiply-add of Conv/Linear layers and one per output element of norm, activation &
+    pooling layers, summed over the children; functional ops in a forward are not counted.
+    On CUDA every hook synchronizes, the sum of the modules is slower than a plain forward.
+    """
+    def __init__(self, net):
+        self.net = net
+        self.names = {module: name for name, module in net.named_modules()}
+        self.stats = None
+        self.starts = dict()
+        self.child_time = dict()
+        self.stack = []
+        self.handles = []
+        self.iters = 0
+
+    @staticmethod
+    def _bytes(value):
+        if isinstance(value, torch.Tensor):
+            return value.numel() * value.element_size()
+
+        if isinstance(value, dict):
+            return sum(ModuleProfiler._bytes(item) for item in value.values())
+
+        if isinstance(value, (list, tuple)):
+            return sum(ModuleProfiler._bytes(item) for item in value)
+
+        return 0
+
+    @staticmethod
+    def _first_tensor(value):
+        if isinstance(value, torch.Tensor):
+            return value
+
+        items = value.values() if isinstance(value, dict) else value if isinstance(value, (list, tuple)) else []
+        for item in items:
+            tensor = ModuleProfiler._first_tensor(item)
+            if tensor is not None:
+                return tensor
+
+        return None
+
+    @staticmethod
+    def _flops(module, output):
+        """The FLOPs of a leaf module call."""
+        out = ModuleProfiler._first_tensor(output)
+        if out is None:
+            return 0
+
+        if isinstance(module, nn.modules.conv._ConvNd):
+            kernel_ops = module.in_channels // module.groups
+            for kernel_size in module.kernel_size:
+                kernel_ops *= kernel_size
+
+            return 2 * out.numel() * kernel_ops
+
+        if isinstance(module, nn.Linear):
+            return 2 * out.numel() * module.in_features
+
+        if isinstance(module, (_BatchNorm, nn.GroupNorm, nn.InstanceNorm2d, nn.LayerNorm, nn.ReLU, nn.ReLU6,
+                               nn.LeakyReLU, nn.PReLU, nn.Sigmoid, nn.Tanh, nn.modules.pooling._MaxPoolNd,
+                               nn.modules.pooling._AvgPoolNd, nn.modules.pooling._AdaptiveAvgPoolNd)):
+            return out.numel()
+
+        return 0
+
+    @staticmethod
+    def _synchronize():
+        if torch.cuda.is_available() and torch.cuda.is_initialized():
+            torch.cuda.synchronize()
+
+    def _pre_hook(self, module, inputs):
+        self._synchronize()
+        self.stack.append(module)
+        self.child_time[module] = 0.
+        self.starts[module] = time.perf_counter()
+
+    def _hook(self, module, inputs, output):
+        self._synchronize()
+        elapsed = time.perf_counter() - self.starts[module]
+        self.stack.pop()
+        stat = self.stats[self.names[module]]
+        stat['calls'] += 1
+        stat['total'] += elapsed
+        stat['self'] += elapsed - self.child_time[module]
+        stat['out_bytes'] += self._bytes(output)
+        if len(list(module.children())) == 0:
+            stat['flops'] += self._flops(module, output)
+
+        if len(self.stack) > 0:
+            self.child_time[self.stack[-1]] += elapsed
+
+    def attach(self):
+        self.stats = {name: dict(calls=0, total=0., self=0., out_bytes=0, flops=0) for name in self.names.values()}
+        self.stack = []
+        self.iters = 0
+        for module in self.names:
+            self.handles.append(module.register_forward_pre_hook(self._pre_hook))
+            self.handles.append(module.register_forward_hook(self._hook))
+
+    def detach(self):
+        for handle in self.handles:
+            handle.remove()
+
+        self.handles = []
+
+    def run(self, data_dict, iters=10, warmup=2):
+        """Averages iters hooked forwards of data_dict after warmup plain ones."""
+        self.net.eval()
+        with torch.no_grad():
+            for _ in range(warmup):
+                self.net(data_dict)
+
+            self.attach()
+            try:
+                for _ in range(iters):
+                    self.net(data_dict)
+                    self.iters += 1
+            finally:
+                self.detach()
+
+        return self.rows()
+
+    def rows(self, depth=None, match=None):
+        """One dict per called module (COLUMNS), slowest first; FLOPs are summed over the children."""
+        flops = dict()
+        for name, stat in self.stats.items():
+            prefix = name
+            while True:
+                flops[prefix] = flops.get(prefix, 0) + stat['flops']
+                if prefix == '':
+                    break
+
+                prefix = prefix.rsplit('.', 1)[0] if '.' in prefix else ''
+
+        root_total = max(self.stats[''].get('total', 0.), 1e-12)
+        modules = {name: module for module, name in self.names.items()}
+        rows = []
+        for name, stat in self.stats.items():
+            module_depth = 0 if name == '' else name.count('.') + 1
+            if stat['calls'] == 0 or (depth is not None and module_depth > depth) \
+                    or (match is not None and re.search(match, name) is None):
+                continue
+
+            iters = max(self.iters, 1)
+            rows.append(dict(module=name or '(model)', type=type(modules[name]).__name__, depth=module_depth,
+                             calls=stat['calls'] // iters, total_ms=stat['total'] * 1e3 / iters,
+                             self_ms=stat['self'] * 1e3 / iters, share=stat['total'] / root_total,
+                             out_mb=stat['out_bytes'] / iters / 2 ** 20,
+                             params_m=sum(param.numel() for param in modules[name].parameters()) / 1e6,
+                             gflops=flops[name] / iters / 1e9))
+
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    @staticmethod
+    def to_csv(rows, csv_path):
+        with open(csv_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+
+    @staticmethod
+    def table(rows):
+        width = max([len(row['module']) for row in rows] + [len('module')])
+        lines = ['{:<{}}  {:<16}  {:>5}  {:>9}  {:>9}  {:>6}  {:>8}  {:>8}  {:>8}'.format(
+            'module', width, 'type', 'calls', 'total ms', 'self ms', 'share', 'out MB', 'params M', 'GFLOPs')]
+        for row in rows:
+            lines.append('{:<{}}  {:<16}  {:>5d}  {:>9.2f}  {:>9.2f}  {:>5.1f}%  {:>8.2f}  {:>8.2f}  {:>8.2f}'.format(
+                row['module'], width, row['type'][:16], row['calls'], row['total_ms'], row['self_ms'],
+                100. * row['share'], row['out_mb'], row['params_m'], row['gflops']))
+
+        return '\n'.join(lines)
+
+
+def build_model(configer):
+    """The model of the task of configer, built by the ModelManager of the task."""
+    task = configer.get('task')
+    if task == 'seg':
+        from model.seg.model_manager import ModelManager
+        return ModelManager(configer).get_seg_model()
+
+    if task == 'det':
+        from model.det.model_manager import ModelManager
+        return ModelManager(configer).object_detector()
+
+    if task == 'pose':
+        from model.pose.model_manager import ModelManager
+        return ModelManager(configer).get_multi_pose_model()
+
+    if task == 'cls':
+        from model.cls.model_manager import ModelManager
+        return ModelManager(configer).get_cls_model()
+
+    Log.error('Task: {} is not supported by the profiler.'.format(task))
+    exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Profiles the forward of a ModelManager model per module.')
+    parser.add_argument('--config_file', required=True, type=str, help='The config of the model.')
+    parser.add_argument('--backbone', default=None, type=str, help='Overrides network.backbone.')
+    parser.add_argument('--input_size', default=[512, 512], nargs=2, type=int, help='The input width & height.')
+    parser.add_argument('--batch_size', default=1, type=int, help='The batch size.')
+    parser.add_argument('--iters', default=10, type=int, help='The timed forwards.')
+    parser.add_argument('--warmup', default=2, type=int, help='The forwards before timing.')
+    parser.add_argument('--depth', default=3, type=int, help='Hide modules nested deeper than this, -1 for all.')
+    parser.add_argument('--match', default=None, type=str, help='Only the modules whose name matches the regex.')
+    parser.add_argument('--top', default=None, type=int, help='Only the top N slowest modules.')
+    parser.add_argument('--sort', default='total_ms', type=str, choices=COLUMNS[3:], help='The sort column.')
+    parser.add_argument('--csv', default=None, type=str, help='Writes all rows to this CSV file.')
+    parser.add_argument('--gpu', default=-1, type=int, help='The gpu, -1 for CPU.')
+    args = parser.parse_args()
+
+    Log.init(log_level='info')
+    configer = Configer(config_file=args.config_file)
+    settings = [('phase', 'test'), ('gpu', None if args.gpu < 0 else [args.gpu]), ('network.pretrained', None)]
+    if args.backbone is not None:
+        settings.append(('network.backbone', args.backbone))
+
+    for key, value in settings:
+        if key in configer.params_root:
+            configer.update(key, value)
+        else:
+            configer.add(key, value)
+
+    device = torch.device('cpu' if args.gpu < 0 else 'cuda:{}'.format(args.gpu))
+    net = build_model(configer).to(device)
+    img = torch.randn(args.batch_size, 3, args.input_size[1], args.input_size[0], device=device)
+    profiler = ModuleProfiler(net)
+    profiler.run(dict(img=img, testing=True), iters=args.iters, warmup=args.warmup)
+    if args.csv is not None:
+        ModuleProfiler.to_csv(profiler.rows(), args.csv)
+        Log.info('Profile of {} modules written to {}.'.format(len(profiler.rows()), args.csv))
+
+    rows = sorted(profiler.rows(depth=None if args.depth < 0 else args.depth, match=args.match),
+                  key=lambda row: row[args.sort], reverse=True)
+    Log.info('{} {}x{}x{}, {} iters:\n{}'.format(
+        configer.get('network', 'model_name'), args.batch_size, args.input_size[0], args.input_size[1],
+        args.iters, ModuleProfiler.table(rows[:args.top])))
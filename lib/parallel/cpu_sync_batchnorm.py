@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You(youansheng@gmail.com)
+# Synchronized BatchNorm for CPU (gloo) process groups, nn.SyncBatchNorm only supports GPU inputs.
+
+
+import torch
+import torch.distributed as dist
+from torch.nn.modules.batchnorm import _BatchNorm
+
+
+class _AllReduceSum(torch.autograd.Function):
+    """Differentiable sum all-reduce: every rank gets the sum, and the gradient of the sum again."""
+
+    @staticmethod
+    def forward(ctx, tensor):
+        tensor = tensor.clone()
+        dist.all_reduce(tensor)
+        return tensor
+
+    @staticmethod
+    def backward(ctx, grad_output):
+        grad_output = grad_output.clone()
+        dist.all_reduce(grad_output)
+        return grad_output
+
+
+class CPUSyncBatchNorm(_BatchNorm):
+    """BatchNorm normalizing with the statistics of the whole distributed batch.
+
+    Per-channel sums, squared sums & counts are all-reduced with a differentiable all_reduce,
+    so the gradients flow through the global statistics like in ``nn.SyncBatchNorm``. Outside training or a process group it is a plain BatchNorm.
+    """
+    def _check_input_dim(self, input):
+        if input.dim() < 2:
+            raise ValueError('expected at least 2D input (got {}D input)'.format(input.dim()))
+
+    def forward(self, input):
+        if not (self.training and dist.is_available() and dist.is_initialized() and dist.get_world_size() > 1):
+            return super(CPUSyncBatchNorm, self).forward(input)
+
+        num_channels = input.size(1)
+        dims = [0] + list(range(2, input.dim()))
+        count = input.new_full((1,), input.numel() // num_channels)
+        stats = _AllReduceSum.apply(torch.cat([input.sum(dims), (input * input).sum(dims), count]))
+        total = stats[-1]
+        mean = stats[:num_channels] / total
+        var = (stats[num_channels:2 * num_channels] / total - mean * mean).clamp(min=0.0)
+        if self.track_running_stats:
+            with torch.no_grad():
+                self.num_batches_tracked.add_(1)
+                momentum = self.momentum if self.momentum is not None else 1.0 / float(self.num_batches_tracked)
+                self.running_mean.mul_(1 - momentum).add_(mean.detach() * momentum)
+                unbiased_var = var.detach() * total / (total - 1).clamp(min=1)
+                self.running_var.mul_(1 - momentum).add_(unbiased_var * momentum)
+
+        shape = [1, num_channels] + [1] * (input.dim() - 2)
+        out = (input - mean.view(shape)) * torch.rsqrt(var.view(shape) + self.eps)
+        if self.affine:
+            out = out * self.weight.view(shape) + self.bias.view(shape)
+
+        return out
+
+    @classmethod
+    def convert_sync_batchnorm(cls, module):
+        """Replaces the BatchNorm layers of module, like ``nn.SyncBatchNorm.convert_sync_batchnorm``."""
+        module_output = module
+        if isinstance(module, _BatchNorm) and not isinstance(module, cls):
+            module_output = cls(module.num_features, module.eps, module.momentum,
+                                module.affine, module.track_running_stats)
+            if module.affine:
+                with torch.no_grad():
+                    module_output.weight = module.weight
+                    module_output.bias = module.bias
+
+            module_output.running_mean = module.running_mean
+            module_output.running_var = module.running_var
+            module_output.num_batches_tracked = module.num_batches_tracked
+            module_output.training = module.training
+
+        for name, child in module.named_children():
+            module_output.add_module(name, cls.convert_sync_batchnorm(child))
+
+        del module
+        return module_output
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You(youansheng@gmail.com)
+# Mixed precision training: autocast & GradScaler driven by solver.amp.
+
+
+import torch
+
+from lib.tools.util.logger import Logger as Log
+
+
+AMP_DTYPE_DICT = dict(
+    bfloat16=torch.bfloat16,
+    float16=torch.float16
+)
+
+
+class AmpHelper(object):
+    """Autocast & loss scaling of a runner, a no-op without ``solver.amp``.
+
+    ``solver.amp``: ``{"enable": true, "dtype": "bfloat16"}``. The dtype defaults to float16 on
+    GPU and bfloat16 on CPU. float16 gradients are scaled by a ``GradScaler``, whose state is
+    saved with the checkpoints. The losses compute in fp32 whatever the dtype.
+    """
+    def __init__(self, configer):
+        amp_dict = configer.get('solver.amp', default=None)
+        self.device_type = 'cpu' if configer.get('gpu') is None else 'cuda'
+        self.enabled = amp_dict is not None and amp_dict.get('enable', True)
+        self.dtype = None
+        self.scaler = None
+        if not self.enabled:
+            return
+
+        dtype = amp_dict.get('dtype', 'float16' if self.device_type == 'cuda' else 'bfloat16')
+        if dtype not in AMP_DTYPE_DICT:
+            Log.error('Amp dtype {} is invalid.'.format(dtype))
+            exit(1)
+
+        self.dtype = AMP_DTYPE_DICT[dtype]
+        if self.dtype == torch.float16:
+            self.scaler = torch.amp.GradScaler(self.device_type, init_scale=amp_dict.get('init_scale', 2.0 ** 16))
+
+        Log.info('Mixed precision training with {} on {}.'.format(dtype, self.device_type))
+
+    def autocast(self):
+        return torch.autocast(device_type=self.device_type, dtype=self.dtype, enabled=self.enabled)
+
+    def backward(self, loss):
+        (self.scaler.scale(loss) if self.scaler is not None else loss).backward()
+
+    def unscale(self, optimizer):
+        # Before clipping, the gradients must be at their real scale.
+        if self.scaler is not None:
+            self.scaler.unscale_(optimizer)
+
+    def step(self, optimizer):
+        if self.scaler is None:
+            optimizer.step()
+            return
+
+        self.scaler.step(optimizer)
+        self.scaler.update()
+
+    def state_dict(self):
+        return self.scaler.state_dict() if self.scaler is not None else None
+
+    def load_state_dict(self, state_dict):
+        if self.scaler is not None and state_dict is not None:
+            self.scaler.load_state_dict(state_dict)
+
+    @staticmethod
+    def fp32(params):
+        """Casts the floating point tensors of loss params back to fp32."""
+        return [p.float() if isinstance(p, torch.Tensor) and p.is_floating_point() else p for p in params]
+
+    @staticmethod
+    def disable_autocast(params):
+        device = next((p.device for p in params if isinstance(p, torch.Tensor)), torch.device('cpu'))
+        return torch.autocast(device_type=device.type, enabled=False)
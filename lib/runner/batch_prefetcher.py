@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You(youansheng@gmail.com)
+# Background batch preparation: moves the next batch to the device while the current step runs.
+
+
+import queue
+import threading
+import torch
+
+from lib.tools.util.logger import Logger as Log
+
+
+class BatchPrefetcher(object):
+    """Iterates a data loader on a background thread and yields device-ready batches.
+
+    For every batch the thread walks the nested dicts/lists like ``RunnerHelper.to_device``,
+    casts floating point tensors to ``float_dtype`` if given, pins host memory and copies to
+    ``device``. On CUDA the copies run on a side stream and the consumer waits on an event, so
+    they overlap with the compute of the previous step. With ``device`` None batches are only
+    fetched ahead, for runners that hand CPU batches to their parallel wrappers.
+
+    Args:
+        loader: any iterable of batches.
+        device (torch.device): the target device, None to leave the tensors where they are.
+        depth (int): the number of batches prepared ahead.
+    """
+    def __init__(self, loader, device=None, depth=2, float_dtype=None):
+        self.loader = loader
+        self.device = device
+        self.depth = max(depth, 1)
+        self.float_dtype = float_dtype
+        self.use_stream = device is not None and device.type == 'cuda' and torch.cuda.is_available()
+        if self.use_stream and device.index is None:
+            # Resolved on the caller thread, the prefetch thread starts on cuda:0 whatever the rank.
+            self.device = torch.device('cuda', torch.cuda.current_device())
+
+    def __len__(self):
+        return len(self.loader)
+
+    def _prepare(self, in_data):
+        if isinstance(in_data, (list, tuple)):
+            return [self._prepare(item) for item in in_data]
+
+        if isinstance(in_data, dict):
+            return {k: self._prepare(v) for k, v in in_data.items()}
+
+        if not isinstance(in_data, torch.Tensor):
+            return in_data
+
+        if self.float_dtype is not None and in_data.is_floating_point():
+            in_data = in_data.to(self.float_dtype)
+
+        if self.device is None:
+            return in_data
+
+        if self.use_stream and in_data.device.type == 'cpu' and not in_data.is_pinned():
+            in_data = in_data.pin_memory()
+
+        return in_data.to(self.device, non_blocking=self.use_stream)
+
+    @staticmethod
+    def _record_stream(in_data, stream):
+        # The side stream allocated the memory, tell the allocator the main stream uses it now.
+        if isinstance(in_data, (list, tuple)):
+            for item in in_data:
+                BatchPrefetcher._record_stream(item, stream)
+
+        elif isinstance(in_data, dict):
+            for item in in_data.values():
+                BatchPrefetcher._record_stream(item, stream)
+
+        elif isinstance(in_data, torch.Tensor) and in_data.is_cuda:
+            in_data.record_stream(stream)
+
+    def _worker(self, out_queue, stop_event):
+        if self.use_stream:
+            torch.cuda.set_device(self.device)
+
+        stream = torch.cuda.Stream(device=self.device) if self.use_stream else None
+        try:
+            for batch in self.loader:
+                if stream is not None:
+                    with torch.cuda.stream(stream):
+                        batch = self._prepare(batch)
+                        event = torch.cuda.Event()
+                        event.record(stream)
+                else:
+                    batch, event = self._prepare(batch), None
+
+                while not stop_event.is_set():
+                    try:
+                        out_queue.put(('batch', batch, event), timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+
+                if stop_event.is_set():
+                    return
+
+            out_queue.put(('end', None, None))
+        except Exception as e:
+            Log.error('Batch prefetcher failed: {}'.format(e))
+            out_queue.put(('error', e, None))
+
+    def __iter__(self):
+        out_queue = queue.Queue(maxsize=self.depth)
+        stop_event = threading.Event()
+        thread = threading.Thread(target=self._worker, args=(out_queue, stop_event), daemon=True)
+        thread.start()
+        try:
+            while True:
+                kind, batch, event = out_queue.get()
+                if kind == 'end':
+                    break
+
+                if kind == 'error':
+                    raise batch
+
+                if event is not None:
+                    torch.cuda.current_stream(self.device).wait_event(event)
+                    self._record_stream(batch, torch.cuda.current_stream(self.device))
+
+                yield batch
+        finally:
+            # The consumer may stop early (max_iters), let the thread drop what it holds.
+            stop_event.set()
+            while thread.is_alive():
+                try:
+                    out_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+            thread.join()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You(youansheng@gmail.com)
+# Background checkpoint writer: one serialization per save, aliases are links of that file.
+
+
+import os
+import re
+import shutil
+import threading
+import torch
+from collections import OrderedDict
+
+from lib.tools.util.logger import Logger as Log
+
+
+class CheckpointWriter(object):
+    """Writes checkpoints on a background thread.
+
+    ``submit`` snapshots the state to CPU memory on the calling thread, so training may go on
+    changing the weights, then the thread serializes it once into a temporary file and renames
+    it to the first name. The other names are hardlinks of that file (copies where the file
+    system has no links), each published with an atomic rename, so readers never see half a
+    checkpoint. Only one write is in flight: ``submit`` blocks until the previous one is done.
+
+    Args:
+        keep_checkpoints (int): how many ``*_iters*``/``*_epoch*`` files of each kind to keep,
+            0 keeps them all.
+        async_save (bool): False writes on the calling thread.
+    """
+    ROTATE_PATTERN = r'^{}_(iters|epoch)(\d+)\.pth$'
+
+    def __init__(self, keep_checkpoints=0, async_save=True):
+        self.keep_checkpoints = keep_checkpoints
+        self.async_save = async_save
+        self.thread = None
+        self.error = None
+
+    @staticmethod
+    def snapshot(in_data):
+        if isinstance(in_data, torch.Tensor):
+            return in_data.detach().to('cpu', copy=True)
+
+        if isinstance(in_data, dict):
+            out_data = OrderedDict() if isinstance(in_data, OrderedDict) else dict()
+            for key, value in in_data.items():
+                out_data[key] = CheckpointWriter.snapshot(value)
+
+            # state_dict versions live in the _metadata attribute, load_state_dict reads them.
+            if hasattr(in_data, '_metadata'):
+                out_data._metadata = in_data._metadata
+
+            return out_data
+
+        if isinstance(in_data, (list, tuple)):
+            return type(in_data)(CheckpointWriter.snapshot(item) for item in in_data)
+
+        return in_data
+
+    @staticmethod
+    def link(src_path, dst_path):
+        """Atomically makes dst_path a hardlink of src_path, or a copy without link support."""
+        tmp_path = '{}.tmp'.format(dst_path)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        try:
+            os.link(src_path, tmp_path)
+        except OSError:
+            shutil.copyfile(src_path, tmp_path)
+
+        os.replace(tmp_path, dst_path)
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+        if self.error is not None:
+            error, self.error = self.error, None
+            Log.error('Checkpoint writing failed: {}'.format(error))
+            raise error
+
+    def submit(self, state, checkpoints_dir, file_names, rotate_name=None):
+        """Saves state as every name in file_names, the first one is the file actually written."""
+        self.wait()
+        state = self.snapshot(state)
+        if not self.async_save:
+            self._write(state, checkpoints_dir, file_names, rotate_name)
+            return
+
+        self.thread = threading.Thread(target=self._run, args=(state, checkpoints_dir, file_names, rotate_name))
+        self.thread.start()
+
+    def _run(self, state, checkpoints_dir, file_names, rotate_name):
+        try:
+            self._write(state, checkpoints_dir, file_names, rotate_name)
+        except Exception as e:
+            self.error = e
+
+    def _write(self, state, checkpoints_dir, file_names, rotate_name):
+        main_path = os.path.join(checkpoints_dir, file_names[0])
+        tmp_path = '{}.tmp'.format(main_path)
+        with open(tmp_path, 'wb') as f:
+            torch.save(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, main_path)
+        for file_name in file_names[1:]:
+            self.link(main_path, os.path.join(checkpoints_dir, file_name))
+
+        if rotate_name is not None and self.keep_checkpoints > 0:
+            self._rotate(checkpoints_dir, rotate_name)
+
+    def _rotate(self, checkpoints_dir, rotate_name):
+        pattern = re.compile(self.ROTATE_PATTERN.format(re.escape(rotate_name)))
+        kind_dict = dict()
+        for file_name in os.listdir(checkpoints_dir):
+            matched = pattern.match(file_name)
+            if matched is not None:
+                kind_dict.setdefault(matched.group(1), []).append((int(matched.group(2)), file_name))
+
+        for file_list in kind_dict.values():
+            for _, file_name in sorted(file_list)[:-self.keep_checkpoints]:
+                # The aliases are separate links, removing the name keeps them intact.
+                os.remove(os.path.join(checkpoints_dir, file_name))
@@ -6,8 +6,10 @@
 
 import os
 
+from lib.runner.runner_helper import RunnerHelper
 from lib.tools.helper.file_helper import FileHelper
 from lib.tools.util.logger import Logger as Log
+from lib.tools.util.tracer import Tracer
 
 
 class Controller(object):
@@ -23,6 +25,13 @@ class Controller(object):
         runner.runner_state['max_performance'] = 0
         runner.runner_state['min_val_loss'] = 0
 
+    @staticmethod
+    def _set_epoch(runner):
+        # Bucketed loaders shard & shuffle in the batch sampler.
+        for sampler in [runner.train_loader.sampler, getattr(runner.train_loader, 'batch_sampler', None)]:
+            if hasattr(sampler, 'set_epoch'):
+                sampler.set_epoch(runner.runner_state['epoch'])
+
     @staticmethod
     def train(runner):
         Log.info('Training start...')
@@ -32,7 +41,7 @@ class Controller(object):
         if runner.configer.get('solver', 'lr')['metric'] == 'epoch':
             while runner.runner_state['epoch'] < runner.configer.get('solver', 'max_epoch'):
                 if runner.configer.get('network.distributed'):
-                    runner.train_loader.sampler.set_epoch(runner.runner_state['epoch'])
+                    Controller._set_epoch(runner)
 
                 runner.train()
                 if runner.runner_state['epoch'] == runner.configer.get('solver', 'max_epoch'):
@@ -41,13 +50,18 @@ class Controller(object):
         else:
             while runner.runner_state['iters'] < runner.configer.get('solver', 'max_iters'):
                 if runner.configer.get('network.distributed'):
-                    runner.train_loader.sampler.set_epoch(runner.runner_state['epoch'])
+                    Controller._set_epoch(runner)
 
                 runner.train()
                 if runner.runner_state['iters'] == runner.configer.get('solver', 'max_iters'):
                     runner.val()
                     break
 
+        if getattr(runner, 'val_worker', None) is not None:
+            runner.val_worker.close(runner)
+
+        RunnerHelper.wait_checkpoint(runner)
+        RunnerHelper.close_telemetry(runner)
         Log.info('Training end...')
 
     @staticmethod
@@ -76,6 +90,13 @@ class Controller(object):
             Log.error('test_dir not given!!!')
             exit(1)
 
+        trace_path = runner.configer.get('test.trace', default=None)
+        if trace_path is not None:
+            Tracer.enable()
+
         runner.test(test_dir, out_dir)
+        if trace_path is not None:
+            Tracer.export(trace_path)
+            Log.info('Trace: {}\n{}'.format(trace_path, Tracer.summary()))
 
         Log.info('Testing end...')
@@ -11,8 +11,11 @@ import torch
 import torch.nn as nn
 from torch.nn.parallel.scatter_gather import gather as torch_gather
 
+from lib.runner.batch_prefetcher import BatchPrefetcher
+from lib.runner.checkpoint_writer import CheckpointWriter
 from lib.tools.helper.dist_helper import DistHelper
 from lib.tools.util.logger import Logger as Log
+from lib.tools.util.telemetry import Telemetry
 
 
 class RunnerHelper(object):
@@ -28,15 +31,54 @@ class RunnerHelper(object):
 
         return in_data.to(device) if isinstance(in_data, torch.Tensor) else in_data
 
+    @staticmethod
+    def iter_batches(runner, loader, to_device=True):
+        """Iterates the batches of loader, moved to the runner device if to_device.
+
+        With data.prefetch_depth > 0 the next batches are prepared on a background thread, so the
+        data time of the runners only counts the steps that really wait for data.
+        """
+        device = None
+        if to_device:
+            # The current device of the caller is the local_rank GPU under DDP.
+            device = torch.device('cpu') if runner.configer.get('gpu') is None \
+                else torch.device('cuda', torch.cuda.current_device())
+
+        depth = runner.configer.get('data.prefetch_depth', default=0)
+        if depth > 0:
+            float_dtype = runner.configer.get('data.prefetch_dtype', default=None)
+            return BatchPrefetcher(loader, device=device, depth=depth,
+                                   float_dtype=getattr(torch, float_dtype) if float_dtype is not None else None)
+
+        if not to_device:
+            return loader
+
+        return (RunnerHelper.to_device(runner, data_dict) for data_dict in loader)
+
     @staticmethod
     def _make_parallel(runner, net):
         if runner.configer.get('network.distributed', default=False):
+            # --gpu -1 trains on CPU processes over gloo, else every process drives its local_rank GPU.
             local_rank = runner.configer.get('local_rank')
-            torch.cuda.set_device(local_rank)
-            torch.distributed.init_process_group(backend='nccl', init_method='env://')
+            use_cuda = runner.configer.get('gpu') is not None
+            if use_cuda:
+                torch.cuda.set_device(local_rank)
+
+            if not torch.distributed.is_initialized():
+                backend = runner.configer.get('network.dist_backend', default='nccl' if use_cuda else 'gloo')
+                torch.distributed.init_process_group(backend=backend, init_method='env://')
+                Log.info('Process group: {} ranks over {}.'.format(torch.distributed.get_world_size(), backend))
+
             if runner.configer.get('network.syncbn', default=False):
                 Log.info('Converting syncbn model...')
-                net = nn.SyncBatchNorm.convert_sync_batchnorm(net)
+                if use_cuda:
+                    net = nn.SyncBatchNorm.convert_sync_batchnorm(net)
+                else:
+                    from lib.parallel.cpu_sync_batchnorm import CPUSyncBatchNorm
+                    net = CPUSyncBatchNorm.convert_sync_batchnorm(net)
+
+            if not use_cuda:
+                return nn.parallel.DistributedDataParallel(net, find_unused_parameters=True)
 
             net = nn.parallel.DistributedDataParallel(net.cuda(), find_unused_parameters=True,
                                                       device_ids=[local_rank], output_device=local_rank)
@@ -58,7 +100,8 @@ class RunnerHelper(object):
             resume_path = runner.configer.get('network', 'resume')
             resume_path = model_path if model_path is not None else resume_path
             Log.info('Resuming from {}'.format(resume_path))
-            resume_dict = torch.load(resume_path, map_location=map_location)
+            # Checkpoints also hold the config & runner state, torch >= 2.6 loads weights only by default.
+            resume_dict = torch.load(resume_path, map_location=map_location, weights_only=False)
             if 'state_dict' in resume_dict:
                 checkpoint_dict = resume_dict['state_dict']
 
@@ -82,6 +125,8 @@ class RunnerHelper(object):
             if runner.configer.get('network', 'resume_continue'):
                 # runner.configer.resume(resume_dict['config_dict'])
                 runner.runner_state = resume_dict['runner_state']
+                if hasattr(runner, 'amp'):
+                    runner.amp.load_state_dict(resume_dict.get('amp_scaler', None))
 
         net = RunnerHelper._make_parallel(runner, net)
         return net
@@ -142,44 +187,90 @@ class RunnerHelper(object):
             else:
                 Log.warn(err_msg)
 
+    @staticmethod
+    def get_checkpoints_dir(configer):
+        if configer.get('network', 'checkpoints_root') is None:
+            return os.path.join(configer.get('project_dir'), configer.get('network', 'checkpoints_dir'))
+
+        return os.path.join(configer.get('network', 'checkpoints_root'), configer.get('network', 'checkpoints_dir'))
+
     @staticmethod
     def save_net(runner, net, performance=None, val_loss=None, iters=None, epoch=None):
+        if DistHelper.get_rank() != 0:
+            # The replicas hold the same weights, only rank 0 writes.
+            return
+
         state = {
             'config_dict': runner.configer.to_dict(),
             'state_dict': net.state_dict(),
             'runner_state': runner.runner_state
         }
-        if runner.configer.get('network', 'checkpoints_root') is None:
-            checkpoints_dir = os.path.join(runner.configer.get('project_dir'),
-                                           runner.configer.get('network', 'checkpoints_dir'))
-        else:
-            checkpoints_dir = os.path.join(runner.configer.get('network', 'checkpoints_root'),
-                                           runner.configer.get('network', 'checkpoints_dir'))
+        if hasattr(runner, 'amp') and runner.amp.state_dict() is not None:
+            state['amp_scaler'] = runner.amp.state_dict()
 
+        checkpoints_dir = RunnerHelper.get_checkpoints_dir(runner.configer)
         if not os.path.exists(checkpoints_dir):
             os.makedirs(checkpoints_dir)
 
-        latest_name = '{}_latest.pth'.format(runner.configer.get('network', 'checkpoints_name'))
-        torch.save(state, os.path.join(checkpoints_dir, latest_name))
+        # Every name is one write: the first is serialized, the others link to it.
+        checkpoints_name = runner.configer.get('network', 'checkpoints_name')
+        file_names = []
+        if iters is not None:
+            file_names.append('{}_iters{}.pth'.format(checkpoints_name, iters))
+
+        if epoch is not None:
+            file_names.append('{}_epoch{}.pth'.format(checkpoints_name, epoch))
+
+        file_names.append('{}_latest.pth'.format(checkpoints_name))
         if performance is not None:
             if performance > runner.runner_state['max_performance']:
-                latest_name = '{}_max_performance.pth'.format(runner.configer.get('network', 'checkpoints_name'))
-                torch.save(state, os.path.join(checkpoints_dir, latest_name))
-                runner.runner_state['max_performance'] = performance
+                file_names.append('{}_max_performance.pth'.format(checkpoints_name))
 
         if val_loss is not None:
             if val_loss < runner.runner_state['min_val_loss']:
-                latest_name = '{}_min_loss.pth'.format(runner.configer.get('network', 'checkpoints_name'))
-                torch.save(state, os.path.join(checkpoints_dir, latest_name))
-                runner.runner_state['min_val_loss'] = val_loss
+                file_names.append('{}_min_loss.pth'.format(checkpoints_name))
 
-        if iters is not None:
-            latest_name = '{}_iters{}.pth'.format(runner.configer.get('network', 'checkpoints_name'), iters)
-            torch.save(state, os.path.join(checkpoints_dir, latest_name))
+        if not hasattr(runner, 'checkpoint_writer'):
+            runner.checkpoint_writer = CheckpointWriter(
+                keep_checkpoints=runner.configer.get('network.keep_checkpoints', default=0),
+                async_save=runner.configer.get('network.async_save', default=True))
 
-        if epoch is not None:
-            latest_name = '{}_epoch{}.pth'.format(runner.configer.get('network', 'checkpoints_name'), epoch)
-            torch.save(state, os.path.join(checkpoints_dir, latest_name))
+        runner.checkpoint_writer.submit(state, checkpoints_dir, file_names, rotate_name=checkpoints_name)
+        if performance is not None and performance > runner.runner_state['max_performance']:
+            runner.runner_state['max_performance'] = performance
+
+        if val_loss is not None and val_loss < runner.runner_state['min_val_loss']:
+            runner.runner_state['min_val_loss'] = val_loss
+
+    @staticmethod
+    def wait_checkpoint(runner):
+        """Blocks until the last checkpoint is on disk."""
+        if hasattr(runner, 'checkpoint_writer'):
+            runner.checkpoint_writer.wait()
+
+    @staticmethod
+    def record_step(runner, batch_size, loss_dict, lr=None):
+        """Hands the step just timed by runner.batch_time & runner.data_time to the telemetry sink."""
+        if not hasattr(runner, 'telemetry'):
+            rank = DistHelper.get_rank()
+            runner.telemetry = Telemetry.from_configer(
+                runner.configer, 'train' if rank == 0 else 'train_rank{}'.format(rank),
+                os.path.join(RunnerHelper.get_checkpoints_dir(runner.configer), 'telemetry'),
+                labels=dict(task=runner.configer.get('task'), method=runner.configer.get('method'), rank=rank))
+
+        if runner.telemetry is None:
+            return
+
+        runner.telemetry.record(step_time=runner.batch_time.val, data_time=runner.data_time.val,
+                                batch_size=batch_size, iters=runner.runner_state['iters'],
+                                epoch=runner.runner_state['epoch'],
+                                lr=RunnerHelper.get_lr(runner.optimizer) if lr is None else lr,
+                                loss=loss_dict if isinstance(loss_dict, dict) else dict(loss=loss_dict))
+
+    @staticmethod
+    def close_telemetry(runner):
+        if getattr(runner, 'telemetry', None) is not None:
+            runner.telemetry.close()
 
     @staticmethod
     def freeze_bn(net, norm_type=None):
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You(youansheng@gmail.com)
+# Out-of-process validation: the trainer queues weight snapshots, a worker evaluates them.
+#   python -m lib.runner.val_worker --queue_dir checkpoints/seg/ui/val_queue --gpu -1
+
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import torch
+
+from lib.runner.checkpoint_writer import CheckpointWriter
+from lib.runner.runner_helper import RunnerHelper
+from lib.tools.util.configer import Configer
+from lib.tools.util.logger import Logger as Log
+
+
+JOB_PATTERN = r'^val_(\d+)\.pth$'
+RESULT_PATTERN = r'^val_(\d+)\.json$'
+STOP_FILE = 'STOP'
+
+
+class ValWorkerClient(object):
+    """The trainer side of the val worker, configured by ``val.worker``.
+
+    ``submit`` writes the current weights as ``val_<iters>.pth`` into the queue directory (a
+    checkpoint file, written in the background by a CheckpointWriter) and returns. ``collect``
+    reads the ``val_<iters>.json`` results of the worker into ``runner_state`` & the logs. With
+    ``spawn`` a local worker process is started, else a worker on another host is expected to
+    poll the same (shared) queue directory. At most ``max_pending`` snapshots wait for results,
+    later test intervals are skipped until the worker catches up. At the end of training ``close``
+    waits at most ``close_timeout`` seconds for the pending results.
+    """
+    def __init__(self, runner):
+        self.configer = runner.configer
+        checkpoints_dir = RunnerHelper.get_checkpoints_dir(self.configer)
+        self.queue_dir = self.configer.get('val.worker.queue_dir', default=None)
+        if self.queue_dir is None:
+            self.queue_dir = os.path.join(checkpoints_dir, 'val_queue')
+
+        if not os.path.exists(self.queue_dir):
+            os.makedirs(self.queue_dir)
+
+        self.max_pending = self.configer.get('val.worker.max_pending', default=2)
+        self.writer = CheckpointWriter()
+        self.pending = set()
+        self.timed_out = False
+        self.process = None
+        if self.configer.get('val.worker.spawn', default=True):
+            gpu = self.configer.get('val.worker.gpu', default=None)
+            command = [sys.executable, '-m', 'lib.runner.val_worker', '--queue_dir', self.queue_dir,
+                       '--checkpoints_dir', checkpoints_dir, '--parent_pid', str(os.getpid()),
+                       '--gpu'] + ([str(gpu_id) for gpu_id in gpu] if gpu is not None else ['-1'])
+            project_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            self.process = subprocess.Popen(command, cwd=project_dir)
+            Log.info('Val worker started, pid {}, queue {}.'.format(self.process.pid, self.queue_dir))
+
+    def submit(self, runner, net):
+        self.collect(runner)
+        iters = runner.runner_state['iters']
+        if len(self.pending) >= self.max_pending:
+            Log.warn('Val worker is {} snapshots behind, skip the val of iters {}.'.format(len(self.pending), iters))
+            return
+
+        state = {
+            'config_dict': runner.configer.to_dict(),
+            'state_dict': net.state_dict(),
+            'runner_state': runner.runner_state
+        }
+        self.writer.submit(state, self.queue_dir, ['val_{:08d}.pth'.format(iters)])
+        self.pending.add(iters)
+
+    def collect(self, runner, wait=False, timeout=None):
+        """Reads the results in the queue, with wait until none is pending or for at most timeout seconds."""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            for file_name in sorted(os.listdir(self.queue_dir)):
+                if re.match(RESULT_PATTERN, file_name) is None:
+                    continue
+
+                result_path = os.path.join(self.queue_dir, file_name)
+                with open(result_path, 'r') as f:
+                    result = json.load(f)
+
+                os.remove(result_path)
+                self.pending.discard(result['iters'])
+                if 'error' in result:
+                    Log.error('Val worker failed on iters {}: {}'.format(result['iters'], result['error']))
+                    continue
+
+                runner.runner_state['performance'] = result['performance']
+                runner.runner_state['val_loss'] = result['val_loss']
+                runner.runner_state['max_performance'] = max(runner.runner_state['max_performance'],
+                                                             result['performance'])
+                runner.runner_state['min_val_loss'] = min(runner.runner_state['min_val_loss'], result['val_loss'])
+                Log.info('Val worker, iters {}: Test Time {:.3f}s\tLoss = {}'.format(
+                    result['iters'], result['time'], result['loss_info']))
+                Log.info('Mean IOU: {}\n'.format(result['performance']))
+                Log.info('Pixel ACC: {}\n'.format(result['pixel_acc']))
+
+            if not wait or len(self.pending) == 0:
+                return
+
+            if self.process is not None and self.process.poll() is not None:
+                Log.error('Val worker exited with code {}, {} results lost.'.format(
+                    self.process.returncode, len(self.pending)))
+                self.pending.clear()
+                return
+
+            if deadline is not None and time.time() >= deadline:
+                Log.warn('Val worker gave no result in {}s, iters {} still pending.'.format(
+                    timeout, sorted(self.pending)))
+                self.timed_out = True
+                return
+
+            time.sleep(1.0)
+
+    def close(self, runner):
+        """Waits for the queued snapshots (``val.worker.close_timeout`` seconds, null for no limit)
+        & stops the spawned worker."""
+        self.writer.wait()
+        # The final val already waited for the same results.
+        timeout = 0 if self.timed_out else self.configer.get('val.worker.close_timeout', default=600)
+        self.collect(runner, wait=True, timeout=timeout)
+        if self.process is not None:
+            if len(self.pending) > 0:
+                # The worker only reads the STOP file on an empty queue.
+                self.process.terminate()
+            else:
+                open(os.path.join(self.queue_dir, STOP_FILE), 'w').close()
+
+            self.process.wait()
+            if os.path.exists(os.path.join(self.queue_dir, STOP_FILE)):
+                os.remove(os.path.join(self.queue_dir, STOP_FILE))
+
+            self.process = None
+
+        self.pending.clear()
+
+
+class ValWorker(object):
+    """Evaluates the snapshots of a queue directory with the val() code of FCNSegmentor.
+
+    The runner is built once from the config of the first snapshot, on the worker's own devices
+    and data_dir. A snapshot better than the best known mIoU (or loss) becomes the
+    ``<checkpoints_name>_max_performance.pth`` (``_min_loss.pth``) of ``checkpoints_dir`` by a link.
+    """
+    def __init__(self, args):
+        self.args = args
+        self.checkpoints_dir = args.checkpoints_dir or os.path.dirname(os.path.abspath(args.queue_dir))
+        self.runner = None
+        self.max_performance = None
+        self.min_val_loss = None
+
+    @staticmethod
+    def _set_key(configer, key, value):
+        if key in configer.params_root:
+            configer.update(key, value)
+        else:
+            configer.add(key, value)
+
+    def _build_runner(self, config_dict):
+        from runner.seg.fcn_segmentor import FCNSegmentor
+        configer = Configer(config_dict=config_dict)
+        gpu = None if self.args.gpu is None or min(self.args.gpu) < 0 else self.args.gpu
+        if gpu is not None:
+            os.environ['CUDA_VISIBLE_DEVICES'] = ','.join(str(gpu_id) for gpu_id in gpu)
+
+        for key, value in [('phase', 'val'), ('gpu', gpu), ('local_rank', 0), ('network.distributed', False),
+                           ('network.gather', True), ('network.resume', None), ('network.pretrained', None),
+                           ('val.worker.enable', False)]:
+            self._set_key(configer, key, value)
+
+        if self.args.data_dir is not None:
+            self._set_key(configer, 'data.data_dir', self.args.data_dir)
+
+        return FCNSegmentor(configer)
+
+    def _publish(self, job_path, job, performance, val_loss):
+        runner_state = job['runner_state']
+        checkpoints_name = job['config_dict']['network']['checkpoints_name']
+        if self.max_performance is None or runner_state['max_performance'] > self.max_performance:
+            self.max_performance = runner_state['max_performance']
+
+        if self.min_val_loss is None or runner_state['min_val_loss'] < self.min_val_loss:
+            self.min_val_loss = runner_state['min_val_loss']
+
+        if performance > self.max_performance:
+            CheckpointWriter.link(job_path, os.path.join(
+                self.checkpoints_dir, '{}_max_performance.pth'.format(checkpoints_name)))
+            self.max_performance = performance
+
+        if val_loss < self.min_val_loss:
+            CheckpointWriter.link(job_path, os.path.join(
+                self.checkpoints_dir, '{}_min_loss.pth'.format(checkpoints_name)))
+            self.min_val_loss = val_loss
+
+    def _eval(self, job_path, iters):
+        job = torch.load(job_path, map_location='cpu', weights_only=False)
+        if self.runner is None:
+            self.runner = self._build_runner(job['config_dict'])
+
+        net = self.runner.seg_net
+        RunnerHelper.load_state_dict(net.module if hasattr(net, 'module') else net, job['state_dict'], strict=True)
+        result = self.runner.evaluate()
+        self._publish(job_path, job, result['performance'], result['val_loss'])
+        result['iters'] = iters
+        return result
+
+    def _parent_alive(self):
+        if self.args.parent_pid is None:
+            return True
+
+        try:
+            os.kill(self.args.parent_pid, 0)
+        except OSError:
+            return False
+
+        return True
+
+    def run(self):
+        Log.info('Val worker polling {}.'.format(self.args.queue_dir))
+        while True:
+            jobs = sorted(file_name for file_name in os.listdir(self.args.queue_dir)
+                          if re.match(JOB_PATTERN, file_name) is not None)
+            if len(jobs) == 0:
+                if os.path.exists(os.path.join(self.args.queue_dir, STOP_FILE)) or not self._parent_alive():
+                    break
+
+                time.sleep(self.args.poll_interval)
+                continue
+
+            job_path = os.path.join(self.args.queue_dir, jobs[0])
+            iters = int(re.match(JOB_PATTERN, jobs[0]).group(1))
+            try:
+                result = self._eval(job_path, iters)
+            except Exception as e:
+                Log.error('Val of {} failed: {}'.format(jobs[0], e))
+                result = dict(iters=iters, error=str(e))
+
+            result_path = os.path.join(self.args.queue_dir, 'val_{:08d}.json'.format(iters))
+            with open('{}.tmp'.format(result_path), 'w') as f:
+                json.dump(result, f)
+
+            os.replace('{}.tmp'.format(result_path), result_path)
+            os.remove(job_path)
+
+        Log.info('Val worker stopped.')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Evaluates the weight snapshots queued by the trainer.')
+    parser.add_argument('--queue_dir', required=True, type=str, help='The val.worker.queue_dir of the trainer.')
+    parser.add_argument('--checkpoints_dir', default=None, type=str,
+                        help='Where the best checkpoints go, the parent of queue_dir by default.')
+    parser.add_argument('--gpu', default=None, nargs='+', type=int, help='The gpus, -1 for CPU.')
+    parser.add_argument('--data_dir', default=None, type=str, help='Overrides the data_dir of the trainer.')
+    parser.add_argument('--parent_pid', default=None, type=int, help='Stop when this process is gone.')
+    parser.add_argument('--poll_interval', default=2.0, type=float, help='Seconds between queue polls.')
+    parser.add_argument('--log_level', default='info', type=str, help='The log level.')
+    args = parser.parse_args()
+
+    Log.init(log_level=args.log_level)
+    ValWorker(args).run()
@@ -61,14 +61,17 @@ class DistHelper(object):
         if world_size == 1:
             return [data]
 
+        # gloo gathers CPU tensors, nccl CUDA tensors.
+        device = "cuda" if dist.get_backend() == "nccl" else "cpu"
+
         # serialized to a Tensor
         buffer = pickle.dumps(data)
         storage = torch.ByteStorage.from_buffer(buffer)
-        tensor = torch.ByteTensor(storage).to("cuda")
+        tensor = torch.ByteTensor(storage).to(device)
 
         # obtain Tensor size of each rank
-        local_size = torch.LongTensor([tensor.numel()]).to("cuda")
-        size_list = [torch.LongTensor([0]).to("cuda") for _ in range(world_size)]
+        local_size = torch.LongTensor([tensor.numel()]).to(device)
+        size_list = [torch.LongTensor([0]).to(device) for _ in range(world_size)]
         dist.all_gather(size_list, local_size)
         size_list = [int(size.item()) for size in size_list]
         max_size = max(size_list)
@@ -78,9 +81,9 @@ class DistHelper(object):
         # gathering tensors of different shapes
         tensor_list = []
         for _ in size_list:
-            tensor_list.append(torch.ByteTensor(size=(max_size,)).to("cuda"))
+            tensor_list.append(torch.ByteTensor(size=(max_size,)).to(device))
         if local_size != max_size:
-            padding = torch.ByteTensor(size=(max_size - local_size,)).to("cuda")
+            padding = torch.ByteTensor(size=(max_size - local_size,)).to(device)
             tensor = torch.cat((tensor, padding), dim=0)
         dist.all_gather(tensor_list, tensor)
 
@@ -58,8 +58,8 @@ class SegParser(object):
     def colorize(self, label_map, image_canvas=None):
         height, width = label_map.shape
         color_dst = np.zeros((height, width, 3), dtype=np.uint8)
-        color_list = self.configer.get('details', 'color_list')
-        for i in range(self.configer.get('data', 'num_classes')):
+        color_list = self.configer.frozen.details.color_list
+        for i in range(self.configer.frozen.data.num_classes):
             color_dst[label_map == i] = color_list[i % len(color_list)]
 
         color_img_rgb = np.array(color_dst, dtype=np.uint8)
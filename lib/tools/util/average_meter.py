@@ -4,6 +4,9 @@
 # Utils to store the average and current value.
 
 
+import torch
+
+
 class AverageMeter(object):
     """ Computes ans stores the average and current value"""
     def __init__(self):
@@ -23,30 +26,46 @@ class AverageMeter(object):
 
 
 class DictAverageMeter(object):
-    """ Computes ans stores the average and current value"""
+    """ Computes ans stores the average and current value
+
+    Tensor values are summed detached on their device, they are only read back when ``avg``
+    or ``val`` is accessed (e.g. at display time), so ``update`` never syncs the device.
+    """
     def __init__(self):
         self.key_list = None
 
     def reset(self):
-        self.val = {key:0. for key in self.key_list}
-        self.avg = {key:0. for key in self.key_list}
+        self._val = {key:0. for key in self.key_list}
         self.sum = {key:0. for key in self.key_list}
         self.count = {key:0 for key in self.key_list}
 
+    @staticmethod
+    def _to_float(value):
+        return value.item() if isinstance(value, torch.Tensor) else value
+
+    @property
+    def val(self):
+        return {k: self._to_float(v) for k, v in self._val.items()}
+
+    @property
+    def avg(self):
+        return {k: self._to_float(self.sum[k]) / self.count[k] if self.count[k] > 0 else 0.
+                for k in self.key_list}
+
     def update(self, val_dict, n_dict=None):
         if self.key_list is None:
-            self.key_list = val_dict.keys()
+            self.key_list = list(val_dict.keys())
             self.reset()
 
         if isinstance(n_dict, (int, float)):
             new_n_dict = {k: n_dict for k in val_dict.keys()}
             n_dict = new_n_dict
 
-        self.val = val_dict
+        val_dict = {k: v.detach() if isinstance(v, torch.Tensor) else v for k, v in val_dict.items()}
+        self._val = val_dict
         for k in val_dict.keys():
-            self.sum[k] += val_dict[k] * n_dict[k]
+            self.sum[k] = self.sum[k] + val_dict[k] * n_dict[k]
             self.count[k] += n_dict[k]
-            self.avg[k] = self.sum[k] / self.count[k]
 
     def info(self):
         str = '{'
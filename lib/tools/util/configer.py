@@ -4,20 +4,73 @@
 # Configer class for all hyper parameters.
 
 
+import re
 import sys
 import json
 import os
 import argparse
+import hashlib
+import collections
 
 from pyhocon import ConfigFactory
 
 from lib.tools.util.logger import Logger as Log
 
 
+_MISSING = object()
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        node_cls = collections.namedtuple('ConfigNode', list(value.keys()), rename=True)
+        return node_cls(*[_freeze(item) for item in value.values()])
+
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+
+    return value
+
+
+def _flatten(value, prefix, flat):
+    for key, item in value.items():
+        flat[prefix + key] = _freeze(item)
+        if isinstance(item, dict):
+            _flatten(item, prefix + key + '.', flat)
+
+    return flat
+
+
+class FrozenConfig(object):
+    """Read-only snapshot of the config for hot paths, built by ``Configer.frozen``.
+
+    The instance is a namedtuple of the top-level sections, sub-sections are nested namedtuples
+    (``frozen.data.input_mode``) and lists become tuples. ``get`` resolves dotted keys with a
+    single dict lookup.
+    """
+    __slots__ = ()
+    _flat = dict()
+
+    def get(self, *key, **kwargs):
+        value = self._flat.get('.'.join(key), kwargs.get('default', _MISSING))
+        if value is _MISSING:
+            Log.error('FrozenConfig KeyError: {}.'.format('.'.join(key)))
+            exit(1)
+
+        return value
+
+    @staticmethod
+    def build(config_dict):
+        base_cls = collections.namedtuple('FrozenConfigBase', list(config_dict.keys()), rename=True)
+        frozen_cls = type('FrozenConfig', (FrozenConfig, base_cls),
+                          dict(__slots__=(), _flat=_flatten(config_dict, '', dict())))
+        return frozen_cls(*[_freeze(value) for value in config_dict.values()])
+
+
 class Configer(object):
 
     def __init__(self, args_parser=None, config_file=None, config_dict=None, valid_flag=None):
         self.params_root = None
+        self._frozen = None
         if config_dict is not None:
             assert config_file is None
             self.params_root = ConfigFactory.from_dict(config_dict)
@@ -27,14 +80,14 @@ class Configer(object):
                 Log.error('Json Path:{} not exists!'.format(config_file))
                 exit(1)
 
-            self.params_root = ConfigFactory.parse_file(config_file)
+            self.params_root = self._parse_file(config_file)
 
         elif 'config_file' in args_parser and args_parser.config_file is not None:
             if not os.path.exists(args_parser.config_file):
                 Log.error('Json Path:{} not exists!'.format(args_parser.config_file))
                 exit(1)
 
-            self.params_root = ConfigFactory.parse_file(args_parser.config_file)
+            self.params_root = self._parse_file(args_parser.config_file)
 
         else:
             Log.warn('Base settings not set!')
@@ -50,6 +103,54 @@ class Configer(object):
                 elif value is not None:
                     self.update(key, value)
 
+    @staticmethod
+    def _parse_file(config_file):
+        """Parses a HOCON file, reusing the result cached by the last run if the file is unchanged."""
+        with open(config_file, 'r') as f:
+            content = f.read()
+
+        # Included files are not tracked by the cache key.
+        if re.search(r'^\s*include\s', content, re.M):
+            return ConfigFactory.parse_string(content, basedir=os.path.dirname(os.path.abspath(config_file)))
+
+        cache_dir = os.environ.get('CONFIG_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'torchcv_configs'))
+        cache_file = os.path.join(cache_dir, '{}.json'.format(hashlib.md5(content.encode('utf-8')).hexdigest()))
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'r') as f:
+                    return ConfigFactory.from_dict(json.load(f, object_pairs_hook=collections.OrderedDict))
+            except ValueError:
+                Log.warn('Config cache {} is broken.'.format(cache_file))
+
+        params_root = ConfigFactory.parse_string(content, basedir=os.path.dirname(os.path.abspath(config_file)))
+        try:
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+
+            tmp_file = '{}.{}.tmp'.format(cache_file, os.getpid())
+            with open(tmp_file, 'w') as f:
+                json.dump(params_root.as_plain_ordered_dict(), f)
+
+            os.replace(tmp_file, cache_file)
+        except (OSError, TypeError) as e:
+            Log.warn('Config cache {} could not be saved: {}'.format(cache_file, e))
+
+        return params_root
+
+    def __getstate__(self):
+        # The frozen classes are built at runtime and can not be pickled, workers rebuild them.
+        state = self.__dict__.copy()
+        state['_frozen'] = None
+        return state
+
+    @property
+    def frozen(self):
+        """The ``FrozenConfig`` of the current params, rebuilt after add/update/resume."""
+        if self._frozen is None:
+            self._frozen = FrozenConfig.build(self.params_root.as_plain_ordered_dict())
+
+        return self._frozen
+
     def _get_caller(self):
         filename = os.path.basename(sys._getframe().f_back.f_back.f_code.co_filename)
         lineno = sys._getframe().f_back.f_back.f_lineno
@@ -71,6 +172,7 @@ class Configer(object):
             exit(1)
 
         self.params_root.put(key, value)
+        self._frozen = None
 
     def update(self, key, value, append=False):
         if key not in self.params_root:
@@ -78,9 +180,11 @@ class Configer(object):
             exit(1)
 
         self.params_root.put(key, value, append)
+        self._frozen = None
 
     def resume(self, config_dict):
         self.params_root = ConfigFactory.from_dict(config_dict)
+        self._frozen = None
 
     def to_dict(self):
         return self.params_root
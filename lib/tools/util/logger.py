@@ -37,7 +37,9 @@ class Logger(object):
         assert Logger.logger is None
         Logger.logger = logging.getLogger()
         if distributed_rank > 0:
-            return
+            # The other ranks only report problems, tagged with their rank.
+            log_level = 'warning'
+            log_format = '[rank {}] {}'.format(distributed_rank, log_format)
 
         if log_level not in LOG_LEVEL_DICT:
             print('Invalid logging level: {}'.format(log_level))
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You(youansheng@gmail.com)
+# Parallel & incremental runner shared by the dataset preprocess scripts.
+
+
+import os
+import json
+import time
+import hashlib
+from multiprocessing import Pool
+
+from lib.tools.util.logger import Logger as Log
+
+
+def _file_stat(file_path):
+    st = os.stat(file_path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _task_hash(task):
+    md5o = hashlib.md5()
+    md5o.update(json.dumps(task.get('params'), sort_keys=True).encode('utf-8'))
+    for file_path in task.get('inputs', []):
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                md5o.update(chunk)
+
+    return md5o.hexdigest()
+
+
+def _run_task(args):
+    process_fn, task, record = args
+    try:
+        stats = [_file_stat(file_path) for file_path in task.get('inputs', [])]
+        outputs_ok = all(os.path.exists(file_path) for file_path in task.get('outputs', []))
+        params = json.dumps(task.get('params'), sort_keys=True)
+        if record is not None and outputs_ok and record['stats'] == stats and record['params'] == params:
+            return task['key'], 'skipped', record
+
+        task_hash = _task_hash(task)
+        if record is not None and outputs_ok and record['hash'] == task_hash:
+            return task['key'], 'skipped', dict(record, stats=stats, params=params)
+
+        result = process_fn(task)
+        return task['key'], 'processed', dict(hash=task_hash, stats=stats, params=params, result=result)
+
+    except Exception as e:
+        return task['key'], 'failed', '{}: {}'.format(type(e).__name__, e)
+
+
+class PreprocessRunner(object):
+    """Runs independent preprocess tasks in a process pool, redoing only the changed ones.
+
+    A task is a dict with a unique ``key``, the ``inputs`` files it reads, the json-able
+    ``params`` it depends on and the ``outputs`` files it writes. ``process_fn(task)`` must be
+    a module level function and may return a json-able result. The md5 of params & inputs is
+    kept in ``manifest_file``, tasks with unchanged inputs and existing outputs are skipped and
+    return the result recorded last time.
+
+    Args:
+        manifest_file (str): the json manifest, None to disable incremental runs.
+        workers (int): the number of processes, 0 to run in the calling process.
+        display_iter (int): log the progress every display_iter finished tasks.
+    """
+    def __init__(self, manifest_file=None, workers=None, display_iter=1000, name='Preprocess'):
+        self.manifest_file = manifest_file
+        self.workers = os.cpu_count() if workers is None else workers
+        self.display_iter = display_iter
+        self.name = name
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        if self.manifest_file is None or not os.path.exists(self.manifest_file):
+            return dict()
+
+        try:
+            with open(self.manifest_file, 'r') as f:
+                return json.load(f)
+        except ValueError:
+            Log.warn('Manifest {} is broken, processing everything.'.format(self.manifest_file))
+            return dict()
+
+    def _save_manifest(self):
+        if self.manifest_file is None:
+            return
+
+        dir_name = os.path.dirname(os.path.abspath(self.manifest_file))
+        if not os.path.exists(dir_name):
+            os.makedirs(dir_name)
+
+        tmp_file = '{}.tmp'.format(self.manifest_file)
+        with open(tmp_file, 'w') as f:
+            json.dump(self.manifest, f)
+
+        os.replace(tmp_file, self.manifest_file)
+
+    def run(self, tasks, process_fn):
+        """Returns the results of all tasks in task order, None for failed tasks."""
+        keys = [task['key'] for task in tasks]
+        assert len(set(keys)) == len(keys), 'Task keys must be unique.'
+        job_list = [(process_fn, task, self.manifest.get(task['key'])) for task in tasks]
+        results = dict()
+        counts = dict(processed=0, skipped=0, failed=0)
+        start_time = time.time()
+        Log.info('{}: {} tasks with {} workers.'.format(self.name, len(tasks), self.workers))
+        pool = Pool(self.workers) if self.workers > 0 and len(tasks) > 1 else None
+        try:
+            iterator = map(_run_task, job_list) if pool is None \
+                else pool.imap_unordered(_run_task, job_list, chunksize=max(1, min(64, len(tasks) // (self.workers * 8))))
+            for i, (key, status, record) in enumerate(iterator):
+                counts[status] += 1
+                if status == 'failed':
+                    Log.warn('{}: task {} failed, {}'.format(self.name, key, record))
+                    self.manifest.pop(key, None)
+                    results[key] = None
+                else:
+                    self.manifest[key] = record
+                    results[key] = record['result']
+
+                if (i + 1) % self.display_iter == 0 or i + 1 == len(tasks):
+                    elapsed = time.time() - start_time
+                    Log.info('{}: {}/{} done, {:.1f}s elapsed, ETA {:.1f}s'.format(
+                        self.name, i + 1, len(tasks), elapsed, elapsed / (i + 1) * (len(tasks) - i - 1)))
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+            self._save_manifest()
+
+        elapsed = time.time() - start_time
+        Log.info('{0} summary: processed {processed}, skipped {skipped}, failed {failed} '
+                 'in {1:.1f}s ({2:.1f} tasks/s).'.format(self.name, elapsed, len(tasks) / max(elapsed, 1e-6),
+                                                         **counts))
+        return [results.get(key) for key in keys]
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You(youansheng@gmail.com)
+# Structured metrics of train & inference runs: rotating JSONL records and a Prometheus text file.
+
+
+import json
+import os
+import re
+import time
+import torch
+
+try:
+    import resource
+except ImportError:
+    # Windows has no resource module, the peak RSS is not reported there.
+    resource = None
+
+
+PROM_PREFIX = 'torchcv'
+
+
+class Telemetry(object):
+    """Buffers one record per step and writes them every ``flush_iters`` steps.
+
+    Records go as JSON lines to ``<out_dir>/<job>.jsonl``, which is rotated to ``<job>.jsonl.1`` ..
+    ``<job>.jsonl.<backup_count>`` past ``max_mb``. The gauges of the last flush window (mean
+    step & data-wait time, samples/s, data-stall ratio, the mean of every loss, lr, peak memory)
+    and the total counters are rewritten atomically to ``<out_dir>/<job>.prom`` in the Prometheus
+    text format, for the textfile collector of node_exporter or any local scraper. Tensor values
+    of a record are only read back at flush time, so ``record`` never syncs the device.
+    """
+    def __init__(self, out_dir, job, flush_iters=20, max_mb=10, backup_count=5, labels=None):
+        if not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+
+        self.out_dir = out_dir
+        self.job = job
+        self.flush_iters = max(flush_iters, 1)
+        self.max_bytes = int(max_mb * 2 ** 20)
+        self.backup_count = backup_count
+        self.labels = dict(job=job, **(labels or dict()))
+        self.jsonl_path = os.path.join(out_dir, '{}.jsonl'.format(job))
+        self.prom_path = os.path.join(out_dir, '{}.prom'.format(job))
+        self.buffer = []
+        self.totals = dict(steps=0, samples=0, step_seconds=0., data_wait_seconds=0.)
+
+    @staticmethod
+    def from_configer(configer, job, default_dir, labels=None):
+        """The Telemetry of the ``telemetry`` config, None if it is not enabled."""
+        if not configer.get('telemetry.enable', default=False):
+            return None
+
+        out_dir = configer.get('telemetry.dir', default=None)
+        return Telemetry(default_dir if out_dir is None else out_dir, job,
+                         flush_iters=configer.get('telemetry.flush_iters', default=20),
+                         max_mb=configer.get('telemetry.max_mb', default=10),
+                         backup_count=configer.get('telemetry.backup_count', default=5), labels=labels)
+
+    @staticmethod
+    def peak_memory():
+        """The peak RSS of the process & the peak CUDA allocation of the current device in bytes."""
+        memory = dict()
+        if resource is not None:
+            # ru_maxrss is in KB on Linux.
+            memory['peak_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+        if torch.cuda.is_available() and torch.cuda.is_initialized():
+            memory['cuda_peak_bytes'] = torch.cuda.max_memory_allocated()
+
+        return memory
+
+    @staticmethod
+    def _map(fn, value):
+        if isinstance(value, torch.Tensor):
+            return fn(value)
+
+        if isinstance(value, dict):
+            return {key: Telemetry._map(fn, item) for key, item in value.items()}
+
+        if isinstance(value, (list, tuple)):
+            return [Telemetry._map(fn, item) for item in value]
+
+        return value
+
+    def record(self, step_time=None, data_time=None, batch_size=None, **kwargs):
+        """Adds the record of a step, kwargs (losses, lr, iters ...) may hold tensors."""
+        # Buffered losses must not keep their graphs alive.
+        record = dict(time=time.time(), **self._map(lambda tensor: tensor.detach(), kwargs))
+        if step_time is not None:
+            record['step_time'] = step_time
+            self.totals['steps'] += 1
+            self.totals['step_seconds'] += step_time
+
+        if data_time is not None:
+            record['data_time'] = data_time
+            self.totals['data_wait_seconds'] += data_time
+
+        if batch_size is not None:
+            record['batch_size'] = batch_size
+            self.totals['samples'] += batch_size
+            if step_time:
+                record['samples_per_sec'] = batch_size / step_time
+
+        record.update(self.peak_memory())
+        self.buffer.append(record)
+        if len(self.buffer) >= self.flush_iters:
+            self.flush()
+
+    def flush(self):
+        if len(self.buffer) == 0:
+            return
+
+        records = [self._map(lambda tensor: tensor.item(), record) for record in self.buffer]
+        self.buffer = []
+        self._rotate()
+        with open(self.jsonl_path, 'a') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+
+        self._write_prom(records)
+
+    def _rotate(self):
+        if not os.path.exists(self.jsonl_path) or os.path.getsize(self.jsonl_path) < self.max_bytes:
+            return
+
+        if self.backup_count <= 0:
+            os.remove(self.jsonl_path)
+            return
+
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists('{}.{}'.format(self.jsonl_path, i)):
+                os.replace('{}.{}'.format(self.jsonl_path, i), '{}.{}'.format(self.jsonl_path, i + 1))
+
+        os.replace(self.jsonl_path, '{}.1'.format(self.jsonl_path))
+
+    def _gauges(self, records):
+        """(name, help, labels, value) of the window of records."""
+        def mean(key):
+            values = [record[key] for record in records if record.get(key) is not None]
+            return sum(values) / len(values) if len(values) > 0 else None
+
+        gauges = []
+        step_time, data_time = mean('step_time'), mean('data_time')
+        samples = sum(record.get('batch_size', 0) for record in records)
+        step_seconds = sum(record.get('step_time', 0.) for record in records)
+        gauges.append(('step_seconds', 'Mean step time of the last window.', None, step_time))
+        gauges.append(('data_wait_seconds', 'Mean time waiting for data of the last window.', None, data_time))
+        if step_seconds > 0:
+            gauges.append(('samples_per_second', 'Samples per second of the last window.', None,
+                           samples / step_seconds))
+
+        if step_time and data_time is not None:
+            gauges.append(('data_stall_ratio', 'Share of the step time spent waiting for data.', None,
+                           data_time / step_time))
+
+        # The mean of every other numeric field, per key for dicts & per index for lists.
+        last_keys = ['iters', 'epoch', 'peak_rss_bytes', 'cuda_peak_bytes']
+        skip_keys = {'time', 'step_time', 'data_time', 'batch_size', 'samples_per_sec'} | set(last_keys)
+        fields = dict()
+        for record in records:
+            for key, value in record.items():
+                if key in skip_keys:
+                    continue
+
+                if isinstance(value, dict):
+                    items = [(dict(name=name), item) for name, item in value.items()]
+                elif isinstance(value, (list, tuple)):
+                    items = [(dict(index=str(i)), item) for i, item in enumerate(value)]
+                else:
+                    items = [(None, value)]
+
+                for labels, item in items:
+                    if isinstance(item, (int, float)) and not isinstance(item, bool):
+                        fields.setdefault((key, json.dumps(labels, sort_keys=True)), []).append(item)
+
+        for (key, labels), values in sorted(fields.items()):
+            gauges.append((key, 'Mean {} of the last window.'.format(key), json.loads(labels),
+                           sum(values) / len(values)))
+
+        for key in last_keys:
+            if isinstance(records[-1].get(key), (int, float)):
+                gauges.append((key, 'Last {} recorded.'.format(key), None, records[-1][key]))
+
+        return gauges
+
+    def _write_prom(self, records):
+        lines, helped = [], set()
+
+        def add(name, help_str, metric_type, labels, value):
+            if value is None:
+                return
+
+            name = '{}_{}'.format(PROM_PREFIX, re.sub(r'[^a-zA-Z0-9_]', '_', name))
+            if name not in helped:
+                lines.append('# HELP {} {}'.format(name, help_str))
+                lines.append('# TYPE {} {}'.format(name, metric_type))
+                helped.add(name)
+
+            all_labels = dict(self.labels, **(labels or dict()))
+            label_str = ','.join('{}="{}"'.format(key, str(value).replace('"', '\\"'))
+                                 for key, value in sorted(all_labels.items()))
+            lines.append('{}{{{}}} {}'.format(name, label_str, repr(float(value))))
+
+        for name, help_str, labels, value in self._gauges(records):
+            add(name, help_str, 'gauge', labels, value)
+
+        add('steps_total', 'Steps recorded.', 'counter', None, self.totals['steps'])
+        add('samples_total', 'Samples processed.', 'counter', None, self.totals['samples'])
+        add('step_seconds_total', 'Time spent in steps.', 'counter', None, self.totals['step_seconds'])
+        add('data_wait_seconds_total', 'Time spent waiting for data.', 'counter', None,
+            self.totals['data_wait_seconds'])
+        add('last_flush_timestamp_seconds', 'Unix time of the last flush.', 'gauge', None, time.time())
+        with open('{}.tmp'.format(self.prom_path), 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+        os.replace('{}.tmp'.format(self.prom_path), self.prom_path)
+
+    def close(self):
+        self.flush()
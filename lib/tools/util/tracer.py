@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You(youansheng@gmail.com)
+# Span timeline of a run, exported as a Chrome trace (chrome://tracing, ui.perfetto.dev).
+
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+import torch
+
+
+class _NullSpan(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+
+    def __init__(self, name, sync, args):
+        self.name = name
+        self.sync = sync
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        if self.sync:
+            Tracer.synchronize()
+
+        Tracer.depth += 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.sync:
+            Tracer.synchronize()
+
+        Tracer.depth -= 1
+        Tracer.add(self.name, self.start, time.perf_counter(), depth=Tracer.depth, **self.args)
+        return False
+
+
+class Tracer(object):
+    """
+    Process-wide span recorder, disabled (and close to free) until ``enable`` is called.
+
+    Example:
+        >>> Tracer.enable()
+        >>> with Tracer.span('forward', sync=True, size=[640, 360]):
+        >>>     out = net(data_dict)
+        >>> for data_dict in Tracer.iterate('decode', loader):
+        >>>     ...
+        >>> Tracer.export('trace.json')
+        >>> Log.info(Tracer.summary())
+
+    ``sync`` waits for CUDA before & after the span so that asynchronous kernels are counted in it.
+    """
+    events = None
+    origin = 0.
+    depth = 0
+
+    @staticmethod
+    def enable():
+        Tracer.events = []
+        Tracer.origin = time.perf_counter()
+        Tracer.depth = 0
+
+    @staticmethod
+    def disable():
+        Tracer.events = None
+
+    @staticmethod
+    def is_enabled():
+        return Tracer.events is not None
+
+    @staticmethod
+    def synchronize():
+        if torch.cuda.is_available() and torch.cuda.is_initialized():
+            torch.cuda.synchronize()
+
+    @staticmethod
+    def span(name, sync=False, **args):
+        if Tracer.events is None:
+            return NULL_SPAN
+
+        return _Span(name, sync, args)
+
+    @staticmethod
+    def iterate(name, iterable):
+        """Yields from iterable, every next() is a span (e.g. the decode time of a loader)."""
+        if Tracer.events is None:
+            return iterable
+
+        return Tracer._iterate(name, iterable)
+
+    @staticmethod
+    def _iterate(name, iterable):
+        iterator = iter(iterable)
+        while True:
+            with Tracer.span(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+
+            yield item
+
+    @staticmethod
+    def add(name, start, end, depth=0, **args):
+        """Records a span from two time.perf_counter() values."""
+        if Tracer.events is None:
+            return
+
+        Tracer.events.append(dict(name=name, start=start, end=end, depth=depth,
+                                  tid=threading.get_ident(), args=args))
+
+    @staticmethod
+    def totals():
+        """The total seconds of every span name, in the order of first occurrence."""
+        totals = OrderedDict()
+        for event in sorted(Tracer.events or [], key=lambda event: event['start']):
+            totals[event['name']] = totals.get(event['name'], 0.) + event['end'] - event['start']
+
+        return totals
+
+    @staticmethod
+    def export(path):
+        """Writes the spans as Chrome trace-event JSON ("X" events, microseconds since enable)."""
+        pid = os.getpid()
+        trace_events = [dict(name='process_name', ph='M', pid=pid, tid=0, args=dict(name='torchcv'))]
+        for event in Tracer.events or []:
+            trace_events.append(dict(name=event['name'], cat='torchcv', ph='X', pid=pid, tid=event['tid'],
+                                     ts=(event['start'] - Tracer.origin) * 1e6,
+                                     dur=(event['end'] - event['start']) * 1e6,
+                                     args={key: value if isinstance(value, (int, float, bool)) else str(value)
+                                           for key, value in event['args'].items()}))
+
+        out_dir = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+
+        with open(path, 'w') as f:
+            json.dump(dict(traceEvents=trace_events, displayTimeUnit='ms'), f)
+
+    @staticmethod
+    def summary():
+        """A table of count, total, mean, max & share of the traced wall time per span name."""
+        events = sorted(Tracer.events or [], key=lambda event: event['start'])
+        if len(events) == 0:
+            return 'No spans recorded.'
+
+        wall = max(event['end'] for event in events) - min(event['start'] for event in events)
+        stats = OrderedDict()
+        for event in events:
+            duration = event['end'] - event['start']
+            stat = stats.setdefault(event['name'], dict(depth=event['depth'], count=0, total=0., max=0.))
+            stat['count'] += 1
+            stat['total'] += duration
+            stat['max'] = max(stat['max'], duration)
+
+        width = max(len(name) + 2 * stat['depth'] for name, stat in stats.items())
+        lines = ['{:<{}}  {:>6}  {:>10}  {:>10}  {:>10}  {:>6}'.format(
+            'span', width, 'count', 'total ms', 'mean ms', 'max ms', 'wall%')]
+        for name, stat in stats.items():
+            lines.append('{:<{}}  {:>6d}  {:>10.2f}  {:>10.2f}  {:>10.2f}  {:>5.1f}%'.format(
+                '  ' * stat['depth'] + name, width, stat['count'], stat['total'] * 1e3,
+                stat['total'] * 1e3 / stat['count'], stat['max'] * 1e3, 100. * stat['total'] / max(wall, 1e-9)))
+
+        return '\n'.join(lines)
@@ -125,11 +125,14 @@ if __name__ == "__main__":
                         dest='test.test_dir', help='The test directory of images.')
     parser.add_argument('--out_dir', default='none', type=str,
                         dest='test.out_dir', help='The test out directory of images.')
+    parser.add_argument('--trace', default=None, type=str,
+                        dest='test.trace', help='Writes the spans of the test run as a Chrome trace json.')
 
     # ***********  Params for env.  **********
     parser.add_argument('--seed', default=None, type=int, help='manual seed')
     parser.add_argument('--cudnn', type=str2bool, nargs='?', default=True, help='Use CUDNN.')
-    parser.add_argument("--local_rank", default=0, type=int)
+    parser.add_argument("--local_rank", "--local-rank", default=int(os.environ.get('LOCAL_RANK', 0)), type=int,
+                        dest='local_rank', help='The local rank, set by the distributed launchers.')
 
     args = parser.parse_args()
     configer = Configer(args_parser=args)
@@ -144,6 +147,10 @@ if __name__ == "__main__":
     abs_data_dir = os.path.expanduser(configer.get('data', 'data_dir'))
     configer.update('data.data_dir', abs_data_dir)
 
+    if configer.get('gpu') is not None and min(configer.get('gpu')) < 0:
+        # --gpu -1 runs on CPU, distributed runs use gloo.
+        configer.update('gpu', None)
+
     if configer.get('gpu') is not None and not configer.get('network.distributed', default=False):
         os.environ["CUDA_VISIBLE_DEVICES"] = ','.join(str(gpu_id) for gpu_id in configer.get('gpu'))
 
@@ -158,7 +165,7 @@ if __name__ == "__main__":
 
     Log.init(log_level=configer.get('logging', 'log_level'),
              log_format=configer.get('logging', 'log_format'),
-             distributed_rank=configer.get('local_rank'))
+             distributed_rank=int(os.environ.get('RANK', configer.get('local_rank'))))
 
     Log.info('BN Type is {}.'.format(configer.get('network', 'norm_type')))
     Log.info('Config Dict: {}'.format(json.dumps(configer.to_dict(), indent=2)))
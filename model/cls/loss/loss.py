@@ -6,6 +6,7 @@
 
 import torch.nn as nn
 
+from lib.runner.amp_helper import AmpHelper
 from model.cls.loss import KLLoss, CELoss, HardTripletLoss, LiftedStructureLoss, SoftCELoss, MixupCELoss, MixupSoftCELoss
 
 
@@ -34,7 +35,11 @@ class Loss(nn.Module):
         out_dict = dict()
         weight_dict = dict()
         for key, item in loss_dict.items():
-            out_dict[key] = self.func_list[int(item['type'].float().mean().item())](*item['params'])
+            func = self.func_list[int(item['type'].float().mean().item())]
+            # The losses (distill KL included) run in fp32 under mixed precision.
+            with AmpHelper.disable_autocast(item['params']):
+                out_dict[key] = func(*AmpHelper.fp32(item['params']))
+
             weight_dict[key] = item['weight'].mean().item()
 
         loss = 0.0
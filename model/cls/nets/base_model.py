@@ -37,8 +37,8 @@ class BaseModel(nn.Module):
         if 'ce_loss' in self.valid_loss_dict:
             loss_dict['ce_loss'] = dict(
                 params=[out, data_dict['label'][:, 0]],
-                type=torch.cuda.LongTensor([BASE_LOSS_DICT['ce_loss']]),
-                weight=torch.cuda.FloatTensor([self.valid_loss_dict['ce_loss']])
+                type=torch.tensor([BASE_LOSS_DICT['ce_loss']], device=out.device),
+                weight=torch.tensor([self.valid_loss_dict['ce_loss']], dtype=torch.float, device=out.device)
             )
 
         return out_dict, label_dict, loss_dict
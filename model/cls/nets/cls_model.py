@@ -85,28 +85,28 @@ class ClsModel(nn.Module):
         if 'ce_loss' in self.valid_loss_dict:
             loss_dict['{}ce_loss'.format(self.flag)] = dict(
                 params=[out, data_dict['label']],
-                type=torch.cuda.LongTensor([BASE_LOSS_DICT['ce_loss']]),
-                weight=torch.cuda.FloatTensor([self.valid_loss_dict['ce_loss']])
+                type=torch.tensor([BASE_LOSS_DICT['ce_loss']], device=out.device),
+                weight=torch.tensor([self.valid_loss_dict['ce_loss']], dtype=torch.float, device=out.device)
             )
         if 'soft_ce_loss' in self.valid_loss_dict:
             loss_dict['{}soft_ce_loss'.format(self.flag)] = dict(
                 params=[out, data_dict['label'], self.configer.get('data.num_classes')],
-                type=torch.cuda.LongTensor([BASE_LOSS_DICT['soft_ce_loss']]),
-                weight=torch.cuda.FloatTensor([self.valid_loss_dict['soft_ce_loss']])
+                type=torch.tensor([BASE_LOSS_DICT['soft_ce_loss']], device=out.device),
+                weight=torch.tensor([self.valid_loss_dict['soft_ce_loss']], dtype=torch.float, device=out.device)
             )
         if 'mixup_ce_loss' in self.valid_loss_dict:
             assert 'label_a' in data_dict and 'label_b' in data_dict
             loss_dict['{}mixup_ce_loss'.format(self.flag)] = dict(
                 params=[out, data_dict['label_a'], data_dict['label_b'], lam],
-                type=torch.cuda.LongTensor([BASE_LOSS_DICT['mixup_ce_loss']]),
-                weight=torch.cuda.FloatTensor([self.valid_loss_dict['mixup_ce_loss']])
+                type=torch.tensor([BASE_LOSS_DICT['mixup_ce_loss']], device=out.device),
+                weight=torch.tensor([self.valid_loss_dict['mixup_ce_loss']], dtype=torch.float, device=out.device)
             )
         if 'mixup_soft_ce_loss' in self.valid_loss_dict:
             assert 'label_a' in data_dict and 'label_b' in data_dict
             loss_dict['{}mixup_soft_ce_loss'.format(self.flag)] = dict(
                 params=[out, data_dict['label_a'], data_dict['label_b'], self.configer.get('data.num_classes'), lam],
-                type=torch.cuda.LongTensor([BASE_LOSS_DICT['mixup_soft_ce_loss']]),
-                weight=torch.cuda.FloatTensor([self.valid_loss_dict['mixup_soft_ce_loss']])
+                type=torch.tensor([BASE_LOSS_DICT['mixup_soft_ce_loss']], device=out.device),
+                weight=torch.tensor([self.valid_loss_dict['mixup_soft_ce_loss']], dtype=torch.float, device=out.device)
             )
 
         feat = self.embed(x) if self.embed else x
@@ -114,14 +114,14 @@ class ClsModel(nn.Module):
             if 'tri_loss' in self.valid_loss_dict:
                 loss_dict['{}tri_loss'.format(self.flag)] = dict(
                     params=[feat, data_dict['label']],
-                    type=torch.cuda.LongTensor([BASE_LOSS_DICT['hard_triplet_loss']]),
-                    weight=torch.cuda.FloatTensor([self.valid_loss_dict['tri_loss']])
+                    type=torch.tensor([BASE_LOSS_DICT['hard_triplet_loss']], device=out.device),
+                    weight=torch.tensor([self.valid_loss_dict['tri_loss']], dtype=torch.float, device=out.device)
                 )
             if 'ls_loss' in self.valid_loss_dict:
                 loss_dict['{}ls_loss'.format(self.flag)] = dict(
                     params=[feat, data_dict['label']],
-                    type=torch.cuda.LongTensor([BASE_LOSS_DICT['lifted_structure_loss']]),
-                    weight=torch.cuda.FloatTensor([self.valid_loss_dict['ls_loss']])
+                    type=torch.tensor([BASE_LOSS_DICT['lifted_structure_loss']], device=out.device),
+                    weight=torch.tensor([self.valid_loss_dict['ls_loss']], dtype=torch.float, device=out.device)
                 )
 
         return out_dict, label_dict, loss_dict
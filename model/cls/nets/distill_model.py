@@ -34,19 +34,22 @@ class DistillModel(nn.Module):
         label_dict = {**main_label_dict, **peer_label_dict}
         loss_dict = {**main_loss_dict, **peer_loss_dict}
         if 'img' in data_dict:
+            device = data_dict['img'].device
             for i in range(len(self.configer.get('data', 'num_classes_list'))):
                 if 'main_kl_loss{}'.format(i) in self.valid_loss_dict:
                     loss_dict['main_kl_loss{}'.format(i)] = dict(
                         params=[out_dict['main_out{}'.format(i)], out_dict['peer_out{}'.format(i)].detach()],
-                        type=torch.cuda.LongTensor([BASE_LOSS_DICT['kl_loss']]),
-                        weight=torch.cuda.FloatTensor([self.valid_loss_dict['main_kl_loss{}'.format(i)]])
+                        type=torch.tensor([BASE_LOSS_DICT['kl_loss']], device=device),
+                        weight=torch.tensor([self.valid_loss_dict['main_kl_loss{}'.format(i)]],
+                                            dtype=torch.float, device=device)
                     )
                 if 'peer_kl_loss{}'.format(i) in self.valid_loss_dict:
                     loss_dict['peer_kl_loss{}'.format(i)] = dict(
                         params=[out_dict['peer_out{}'.format(i)].div(self.temperature),
                                 out_dict['main_out{}'.format(i)].div(self.temperature).detach()],
-                        type=torch.cuda.LongTensor([BASE_LOSS_DICT['kl_loss']]),
-                        weight=torch.cuda.FloatTensor([self.valid_loss_dict['peer_kl_loss{}'.format(i)]])
+                        type=torch.tensor([BASE_LOSS_DICT['kl_loss']], device=device),
+                        weight=torch.tensor([self.valid_loss_dict['peer_kl_loss{}'.format(i)]],
+                                            dtype=torch.float, device=device)
                     )
 
         return out_dict, label_dict, loss_dict
@@ -8,25 +8,25 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
+from model.seg.loss.scaled_target import scale_target
+
 
 class CELoss(nn.Module):
-    def __init__(self, configer=None):
+    def __init__(self, configer=None, target_cache=None):
         super(CELoss, self).__init__()
         self.configer = configer
+        self.target_cache = target_cache
         weight = self.configer.get('loss.params.ce_loss.weight', default=None)
         self.weight = torch.FloatTensor(weight) if weight is not None else weight
         self.reduction = self.configer.get('loss.params.ce_loss.reduction', default='mean')
         self.ignore_index = self.configer.get('loss.params.ce_loss.ignore_index', default=-100)
 
     def forward(self, input, target):
-        target = self._scale_target(target, (input.size(2), input.size(3)))
+        scaled_size = (input.size(2), input.size(3))
+        target = self.target_cache.get(target, scaled_size, self.ignore_index) if self.target_cache is not None \
+            else scale_target(target, scaled_size)
         loss = F.cross_entropy(input, target,
                                weight=self.weight.to(input.device) if self.weight is not None else None,
                                ignore_index=self.ignore_index, reduction=self.reduction)
         return loss
 
-    @staticmethod
-    def _scale_target(targets_, scaled_size):
-        targets = targets_.clone().unsqueeze(1).float()
-        targets = F.interpolate(targets, size=scaled_size, mode='nearest')
-        return targets.squeeze(1).long()
@@ -25,7 +25,7 @@ class EncodeLoss(nn.Module):
 
         targets = self._scale_target(targets, (preds.size(2), preds.size(3)))
         se_target = self._get_batch_label_vector(targets,
-                                                 self.configer.get('data', 'num_classes'),
+                                                 self.configer.frozen.data.num_classes,
                                                  self.grid_size).type_as(preds)
         return self.bce_loss(F.sigmoid(preds), se_target)
 
@@ -4,6 +4,7 @@
 # Loss function for Image Classification.
 
 
+import re
 import torch.nn as nn
 
 from model.seg.loss.ce_loss import CELoss
@@ -11,6 +12,9 @@ from model.seg.loss.embed_loss import EmbedLoss
 from model.seg.loss.ohem_ce_loss import OhemCELoss
 from model.seg.loss.focal_ce_loss import FocalCELoss
 from model.seg.loss.encode_loss import EncodeLoss
+from model.seg.loss.scaled_target import ScaledTargetCache
+from lib.runner.amp_helper import AmpHelper
+from lib.tools.util.logger import Logger as Log
 
 
 BASE_LOSS_DICT = dict(
@@ -22,25 +26,55 @@ BASE_LOSS_DICT = dict(
 )
 
 
+def get_base_loss(key):
+    """Maps a key of loss.loss_weights to its base loss, e.g. fpn_ohem_ce_loss0 -> ohem_ce_loss."""
+    name = re.sub(r'\d+$', '', key)
+    matches = [base for base in BASE_LOSS_DICT if name == base or name.endswith('_' + base)]
+    return max(matches, key=len) if len(matches) > 0 else None
+
+
 class Loss(nn.Module):
+    """Weighted sum of the losses in ``loss.loss_weights.<loss_type>``.
+
+    The loss function & weight of every key are resolved here once, the nets only hand over
+    ``loss_dict[key] = dict(params=[...])``, so no tag tensors are built or read back per step.
+    """
     def __init__(self, configer):
         super(Loss, self).__init__()
         self.configer = configer
-        self.func_list = [CELoss(self.configer), OhemCELoss(self.configer),
+        # The heads share one label map, CE & OHEM scale it once per size & call.
+        self.target_cache = ScaledTargetCache(
+            ignore_mixed=self.configer.get('loss.native_res_heads', default=False)
+            or self.configer.get('loss.native_res_main', default=False))
+        self.func_list = [CELoss(self.configer, self.target_cache), OhemCELoss(self.configer, self.target_cache),
                           FocalCELoss(self.configer), EmbedLoss(self.configer),
                           EncodeLoss(self.configer)]
+        self.loss_list = []
+        loss_weights = self.configer.get('loss', 'loss_weights', self.configer.get('loss.loss_type'))
+        for key, weight in loss_weights.items():
+            base_loss = get_base_loss(key)
+            if base_loss is None:
+                Log.error('Loss {} is invalid.'.format(key))
+                exit(1)
+
+            self.loss_list.append((key, self.func_list[BASE_LOSS_DICT[base_loss]], float(weight)))
 
     def forward(self, out_list):
         loss_dict = out_list[-1]
         out_dict = dict()
-        weight_dict = dict()
-        for key, item in loss_dict.items():
-            out_dict[key] = self.func_list[int(item['type'].float().mean().item())](*item['params'])
-            weight_dict[key] = item['weight'].mean().item()
-
         loss = 0.0
-        for key in out_dict:
-            loss += out_dict[key] * weight_dict[key]
+        self.target_cache.reset()
+        for key, func, weight in self.loss_list:
+            if key not in loss_dict:
+                continue
+
+            # The losses (OHEM softmax included) run in fp32 under mixed precision.
+            params = loss_dict[key]['params']
+            with AmpHelper.disable_autocast(params):
+                out_dict[key] = func(*AmpHelper.fp32(params))
+
+            loss = loss + out_dict[key] * weight
 
+        self.target_cache.reset()
         out_dict['loss'] = loss
         return out_dict
@@ -8,11 +8,21 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
+from model.seg.loss.scaled_target import scale_target
+
 
 class OhemCELoss(nn.Module):
-    def __init__(self, configer):
+    """Cross entropy over the pixels whose target probability is below ``max(thresh, p_k)``.
+
+    ``p_k`` is the (batch * minkeep)-th smallest target probability, found with a partial
+    ``topk`` selection instead of a full sort. The target probability is ``exp(-nll)`` of the
+    log-softmax gather the loss needs anyway, and the selection is a mask, so the forward pass
+    has no host sync.
+    """
+    def __init__(self, configer, target_cache=None):
         super(OhemCELoss, self).__init__()
         self.configer = configer
+        self.target_cache = target_cache
         weight = self.configer.get('loss.params.ohem_ce_loss.weight', default=None)
         self.weight = torch.FloatTensor(weight) if weight is not None else weight
         self.reduction = self.configer.get('loss.params.ohem_ce_loss.reduction', default='mean')
@@ -28,31 +38,25 @@ class OhemCELoss(nn.Module):
                 weight (Tensor, optional): a manual rescaling weight given to each class.
                                            If given, has to be a Tensor of size "nclasses"
         """
-        batch_kept = self.min_kept * target.size(0)
-        target = self._scale_target(target, (predict.size(2), predict.size(3)))
-        prob_out = F.softmax(predict, dim=1)
-        tmp_target = target.clone()
-        tmp_target[tmp_target == self.ignore_index] = 0
-        prob = prob_out.gather(1, tmp_target.unsqueeze(1))
-        mask = target.contiguous().view(-1, ) != self.ignore_index
-        sort_prob, sort_indices = prob.contiguous().view(-1, )[mask].contiguous().sort()
-        min_threshold = sort_prob[min(batch_kept, sort_prob.numel() - 1)] if sort_prob.numel() > 0 else 0.0
-        threshold = max(min_threshold, self.thresh)
-        loss_matrix = F.cross_entropy(predict, target,
-                                      weight=self.weight.to(predict.device) if self.weight is not None else None,
-                                      ignore_index=self.ignore_index, reduction='none')
-        loss_matirx = loss_matrix.contiguous().view(-1, )
-        sort_loss_matirx = loss_matirx[mask][sort_indices]
-        select_loss_matrix = sort_loss_matirx[sort_prob < threshold]
-        if self.reduction == 'sum' or select_loss_matrix.numel() == 0:
-            return select_loss_matrix.sum()
-        elif self.reduction == 'mean':
-            return select_loss_matrix.mean()
-        else:
+        if self.reduction not in ('mean', 'sum'):
             raise NotImplementedError('Reduction Error!')
 
-    @staticmethod
-    def _scale_target(targets_, scaled_size):
-        targets = targets_.clone().unsqueeze(1).float()
-        targets = F.interpolate(targets, size=scaled_size, mode='nearest')
-        return targets.squeeze(1).long()
+        batch_kept = self.min_kept * target.size(0)
+        scaled_size = (predict.size(2), predict.size(3))
+        target = self.target_cache.get(target, scaled_size, self.ignore_index) if self.target_cache is not None \
+            else scale_target(target, scaled_size)
+        mask = target != self.ignore_index
+        tmp_target = target.masked_fill(~mask, 0)
+        nll = -F.log_softmax(predict, dim=1).gather(1, tmp_target.unsqueeze(1)).squeeze(1)
+        prob = torch.exp(-nll.detach()).masked_fill(~mask, float('inf')).view(-1)
+        # The (batch_kept + 1) smallest probs are enough to read the original sort_prob[min(batch_kept, n - 1)].
+        sort_prob = torch.topk(prob, min(batch_kept + 1, prob.numel()), largest=False, sorted=True)[0]
+        kept_index = (mask.sum() - 1).clamp(0, sort_prob.numel() - 1).view(1)
+        threshold = sort_prob.gather(0, kept_index).clamp(min=self.thresh)
+        select = (mask & (prob.view_as(mask) < threshold)).to(nll.dtype)
+        loss_matrix = nll * self.weight.to(predict.device)[tmp_target] if self.weight is not None else nll
+        loss = (loss_matrix * select).sum()
+        if self.reduction == 'sum':
+            return loss
+
+        return loss / select.sum().clamp(min=1.0)
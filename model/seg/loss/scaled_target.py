@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Author: Donny You(youansheng@gmail.com)
+# Label maps scaled to the prediction size, shared by the losses of all heads.
+
+
+import torch.nn.functional as F
+
+
+def scale_target(target, scaled_size):
+    """Nearest-scales an (n, h, w) label map, returned as is when the size already matches."""
+    if tuple(target.size()[-2:]) == tuple(scaled_size):
+        return target
+
+    target = F.interpolate(target.unsqueeze(1).float(), size=scaled_size, mode='nearest')
+    return target.squeeze(1).long()
+
+
+def pool_target(target, scaled_size, ignore_index):
+    """Downscales an (n, h, w) label map by cells: a cell keeps its label when all of its pixels
+    agree, cells mixing labels (class borders, ignored pixels) become ``ignore_index``."""
+    if tuple(target.size()[-2:]) == tuple(scaled_size):
+        return target
+
+    target = target.unsqueeze(1).float()
+    max_label = F.adaptive_max_pool2d(target, scaled_size)
+    min_label = -F.adaptive_max_pool2d(-target, scaled_size)
+    return max_label.masked_fill(max_label != min_label, ignore_index).squeeze(1).long()
+
+
+class ScaledTargetCache(object):
+    """Scales every label map once per size within a ``Loss`` call.
+
+    The deep-supervision heads all compare against the same label map, so the scaled copies
+    are kept until ``reset``. Entries hold the source tensor and match on identity, so a new
+    label map allocated at the same address never hits a stale entry. With ``ignore_mixed``
+    label maps are downscaled by ``pool_target``, for heads supervised at feature resolution.
+    """
+    def __init__(self, ignore_mixed=False):
+        self.ignore_mixed = ignore_mixed
+        self.entries = []
+
+    def reset(self):
+        self.entries = []
+
+    def get(self, target, scaled_size, ignore_index=-100):
+        key = (tuple(scaled_size), ignore_index if self.ignore_mixed else None)
+        for src_target, src_key, scaled_target in self.entries:
+            if src_target is target and src_key == key:
+                return scaled_target
+
+        downscale = scaled_size[0] < target.size(-2) and scaled_size[1] < target.size(-1)
+        scaled_target = pool_target(target, scaled_size, ignore_index) if self.ignore_mixed and downscale \
+            else scale_target(target, scaled_size)
+        self.entries.append((target, key, scaled_target))
+        return scaled_target
@@ -5,7 +5,6 @@ import torch.nn.functional as F
 from lib.model.module_helper import ModuleHelper
 from model.seg.utils.apnb import APNB
 from model.seg.utils.afnb import AFNB
-from model.seg.loss.loss import BASE_LOSS_DICT
 
 
 class asymmetric_non_local_network(nn.Sequential):
@@ -50,23 +49,11 @@ class asymmetric_non_local_network(nn.Sequential):
 
         loss_dict = dict()
         if 'dsn_ce_loss' in self.valid_loss_dict:
-            loss_dict['dsn_ce_loss'] = dict(
-                params=[x_dsn, data_dict['labelmap']],
-                type=torch.cuda.LongTensor([BASE_LOSS_DICT['ce_loss']]),
-                weight=torch.cuda.FloatTensor([self.valid_loss_dict['dsn_ce_loss']])
-            )
+            loss_dict['dsn_ce_loss'] = dict(params=[x_dsn, data_dict['labelmap']])
 
         if 'ce_loss' in self.valid_loss_dict:
-            loss_dict['ce_loss'] = dict(
-                params=[x, data_dict['labelmap']],
-                type=torch.cuda.LongTensor([BASE_LOSS_DICT['ce_loss']]),
-                weight=torch.cuda.FloatTensor([self.valid_loss_dict['ce_loss']])
-            )
+            loss_dict['ce_loss'] = dict(params=[x, data_dict['labelmap']])
 
         if 'ohem_ce_loss' in self.valid_loss_dict:
-            loss_dict['ohem_ce_loss'] = dict(
-                params=[x, data_dict['labelmap']],
-                type=torch.cuda.LongTensor([BASE_LOSS_DICT['ohem_ce_loss']]),
-                weight=torch.cuda.FloatTensor([self.valid_loss_dict['ohem_ce_loss']])
-            )
+            loss_dict['ohem_ce_loss'] = dict(params=[x, data_dict['labelmap']])
         return out_dict, loss_dict
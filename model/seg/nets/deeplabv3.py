@@ -9,7 +9,6 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 from lib.model.module_helper import ModuleHelper
-from model.seg.loss.loss import BASE_LOSS_DICT
 
 
 class ASPPModule(nn.Module):
@@ -84,12 +83,20 @@ class DeepLabV3(nn.Module):
             nn.Conv2d(512, self.num_classes, kernel_size=1, stride=1, padding=0, bias=True)
         )
         self.valid_loss_dict = configer.get('loss', 'loss_weights', configer.get('loss.loss_type'))
+        # Names of the blocks trained with activation checkpointing: stage1, stage2, head.
+        self.checkpoint_stages = set(self.configer.get('network.checkpoint_stages', default=[]))
+
+    def _run_stage(self, name, x):
+        if name in self.checkpoint_stages:
+            return ModuleHelper.checkpoint(getattr(self, name), x)
+
+        return getattr(self, name)(x)
 
     def forward(self, data_dict):
-        x = self.stage1(data_dict['img'])
+        x = self._run_stage('stage1', data_dict['img'])
         x_dsn = self.dsn(x)
-        x = self.stage2(x)
-        x = self.head(x)
+        x = self._run_stage('stage2', x)
+        x = self._run_stage('head', x)
         x_dsn = F.interpolate(x_dsn, size=(data_dict['img'].size(2), data_dict['img'].size(3)),
                               mode="bilinear", align_corners=False)
         x = F.interpolate(x, size=(data_dict['img'].size(2), data_dict['img'].size(3)),
@@ -100,25 +107,13 @@ class DeepLabV3(nn.Module):
 
         loss_dict = dict()
         if 'dsn_ce_loss' in self.valid_loss_dict:
-            loss_dict['dsn_ce_loss'] = dict(
-                params=[x_dsn, data_dict['labelmap']],
-                type=torch.cuda.LongTensor([BASE_LOSS_DICT['ce_loss']]),
-                weight=torch.cuda.FloatTensor([self.valid_loss_dict['dsn_ce_loss']])
-            )
+            loss_dict['dsn_ce_loss'] = dict(params=[x_dsn, data_dict['labelmap']])
 
         if 'ce_loss' in self.valid_loss_dict:
-            loss_dict['ce_loss'] = dict(
-                params=[x, data_dict['labelmap']],
-                type=torch.cuda.LongTensor([BASE_LOSS_DICT['ce_loss']]),
-                weight=torch.cuda.FloatTensor([self.valid_loss_dict['ce_loss']])
-            )
+            loss_dict['ce_loss'] = dict(params=[x, data_dict['labelmap']])
 
         if 'ohem_ce_loss' in self.valid_loss_dict:
-            loss_dict['ohem_ce_loss'] = dict(
-                params=[x, data_dict['labelmap']],
-                type=torch.cuda.LongTensor([BASE_LOSS_DICT['ohem_ce_loss']]),
-                weight=torch.cuda.FloatTensor([self.valid_loss_dict['ohem_ce_loss']])
-            )
+            loss_dict['ohem_ce_loss'] = dict(params=[x, data_dict['labelmap']])
         return out_dict, loss_dict
 
 
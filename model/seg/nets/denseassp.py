@@ -9,7 +9,6 @@ from torch import nn
 import torch.nn.functional as F
 
 from lib.model.module_helper import ModuleHelper
-from model.seg.loss.loss import BASE_LOSS_DICT
 
 
 MODEL_CONFIG = {
@@ -103,18 +102,10 @@ class DenseASPP(nn.Module):
 
         loss_dict = dict()
         if 'ce_loss' in self.valid_loss_dict:
-            loss_dict['ce_loss'] = dict(
-                params=[x, data_dict['labelmap']],
-                type=torch.cuda.LongTensor([BASE_LOSS_DICT['ce_loss']]),
-                weight=torch.cuda.FloatTensor([self.valid_loss_dict['ce_loss']])
-            )
+            loss_dict['ce_loss'] = dict(params=[x, data_dict['labelmap']])
 
         if 'ohem_ce_loss' in self.valid_loss_dict:
-            loss_dict['ohem_ce_loss'] = dict(
-                params=[x, data_dict['labelmap']],
-                type=torch.cuda.LongTensor([BASE_LOSS_DICT['ohem_ce_loss']]),
-                weight=torch.cuda.FloatTensor([self.valid_loss_dict['ohem_ce_loss']])
-            )
+            loss_dict['ohem_ce_loss'] = dict(params=[x, data_dict['labelmap']])
         return out_dict, loss_dict
 
 
@@ -10,7 +10,6 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 from lib.model.module_helper import ModuleHelper
-from model.seg.loss.loss import BASE_LOSS_DICT
 
 
 class _ConvBatchNormReluBlock(nn.Module):
@@ -87,12 +86,20 @@ class PSPNet(nn.Sequential):
             nn.Conv2d(512, self.num_classes, kernel_size=1)
         )
         self.valid_loss_dict = configer.get('loss', 'loss_weights', configer.get('loss.loss_type'))
+        # Names of the blocks trained with activation checkpointing: stage1, stage2, ppm.
+        self.checkpoint_stages = set(self.configer.get('network.checkpoint_stages', default=[]))
+
+    def _run_stage(self, name, x):
+        if name in self.checkpoint_stages:
+            return ModuleHelper.checkpoint(getattr(self, name), x)
+
+        return getattr(self, name)(x)
 
     def forward(self, data_dict):
-        x = self.stage1(data_dict['img'])
+        x = self._run_stage('stage1', data_dict['img'])
         aux_x = self.dsn(x)
-        x = self.stage2(x)
-        x = self.ppm(x)
+        x = self._run_stage('stage2', x)
+        x = self._run_stage('ppm', x)
         x = self.cls(x)
         x_dsn = F.interpolate(aux_x, size=(data_dict['img'].size(2), data_dict['img'].size(3)),
                               mode="bilinear", align_corners=False)
@@ -104,25 +111,13 @@ class PSPNet(nn.Sequential):
 
         loss_dict = dict()
         if 'dsn_ce_loss' in self.valid_loss_dict:
-            loss_dict['dsn_ce_loss'] = dict(
-                params=[x_dsn, data_dict['labelmap']],
-                type=torch.cuda.LongTensor([BASE_LOSS_DICT['ce_loss']]),
-                weight=torch.cuda.FloatTensor([self.valid_loss_dict['dsn_ce_loss']])
-            )
+            loss_dict['dsn_ce_loss'] = dict(params=[x_dsn, data_dict['labelmap']])
 
         if 'ce_loss' in self.valid_loss_dict:
-            loss_dict['ce_loss'] = dict(
-                params=[x, data_dict['labelmap']],
-                type=torch.cuda.LongTensor([BASE_LOSS_DICT['ce_loss']]),
-                weight=torch.cuda.FloatTensor([self.valid_loss_dict['ce_loss']])
-            )
+            loss_dict['ce_loss'] = dict(params=[x, data_dict['labelmap']])
 
         if 'ohem_ce_loss' in self.valid_loss_dict:
-            loss_dict['ohem_ce_loss'] = dict(
-                params=[x, data_dict['labelmap']],
-                type=torch.cuda.LongTensor([BASE_LOSS_DICT['ohem_ce_loss']]),
-                weight=torch.cuda.FloatTensor([self.valid_loss_dict['ohem_ce_loss']])
-            )
+            loss_dict['ohem_ce_loss'] = dict(params=[x, data_dict['labelmap']])
         return out_dict, loss_dict
 
 
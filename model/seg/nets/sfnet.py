@@ -8,7 +8,6 @@ import torch
 import torch.nn.functional as F
 
 from lib.model.module_helper import ModuleHelper
-from model.seg.loss.loss import BASE_LOSS_DICT
 
 
 def conv3x3_bn_relu(in_planes, out_planes, stride=1, norm_type="batchnorm"):
@@ -82,9 +81,25 @@ class AlignModule(nn.Module):
         return output
 
 
+class FPNFusion(nn.Module):
+    """Upsamples the FPN features [P2 - P5] to the size of P2 and concatenates them."""
+    def forward(self, fpn_feature_list):
+        output_size = fpn_feature_list[0].size()[2:]
+        fusion_list = [fpn_feature_list[0]]
+
+        for i in range(1, len(fpn_feature_list)):
+            fusion_list.append(nn.functional.interpolate(
+                fpn_feature_list[i],
+                output_size,
+                mode='bilinear', align_corners=False))
+
+        return torch.cat(fusion_list, 1)
+
+
 class AlignHead(nn.Module):
-    def __init__(self, inplanes, norm_type="batchnorm", fpn_dim=256):
+    def __init__(self, inplanes, norm_type="batchnorm", fpn_dim=256, checkpoint=False):
         super(AlignHead, self).__init__()
+        self.checkpoint = checkpoint
         self.ppm = PSPModule(inplanes, norm_type=norm_type, out_features=fpn_dim)
         fpn_inplanes = [inplanes // 8, inplanes// 4, inplanes // 2, inplanes]
         self.fpn_in = nn.ModuleList()
@@ -106,31 +121,28 @@ class AlignHead(nn.Module):
                 AlignModule(inplane=fpn_dim, outplane=fpn_dim//2)
             )
 
+        # No parameters, a module so that forward hooks (e.g. the ModuleProfiler) see the fusion.
+        self.fusion = FPNFusion()
+
+    def _run(self, module, *inputs):
+        return ModuleHelper.checkpoint(module, *inputs) if self.checkpoint else module(*inputs)
+
     def forward(self, conv_out):
-        psp_out = self.ppm(conv_out[-1])
+        psp_out = self._run(self.ppm, conv_out[-1])
 
         f = psp_out
         fpn_feature_list = [psp_out]
         out = []
         for i in reversed(range(len(conv_out) - 1)):
             conv_x = conv_out[i]
-            conv_x = self.fpn_in[i](conv_x)  # lateral branch
-            f = self.fpn_out_align[i]([conv_x, f])
+            conv_x = self._run(self.fpn_in[i], conv_x)  # lateral branch
+            f = self._run(self.fpn_out_align[i], [conv_x, f])
             f = conv_x + f
-            fpn_feature_list.append(self.fpn_out[i](f))
+            fpn_feature_list.append(self._run(self.fpn_out[i], f))
             out.append(f)
 
         fpn_feature_list.reverse()  # [P2 - P5]
-        output_size = fpn_feature_list[0].size()[2:]
-        fusion_list = [fpn_feature_list[0]]
-
-        for i in range(1, len(fpn_feature_list)):
-            fusion_list.append(nn.functional.interpolate(
-                fpn_feature_list[i],
-                output_size,
-                mode='bilinear', align_corners=False))
-
-        fusion_out = torch.cat(fusion_list, 1)
+        fusion_out = self.fusion(fpn_feature_list)
         return fusion_out, out
 
 
@@ -155,7 +167,11 @@ class ResSFNet(nn.Module):
         self.stage4 = base.layer4
         num_features = 512 if 'resnet18' in self.configer.get('network.backbone') else 2048
         fpn_dim = max(num_features // 8, 128)
-        self.head = AlignHead(num_features, fpn_dim=fpn_dim)
+        # Names of the blocks trained with activation checkpointing: stage1..stage4, head.
+        self.checkpoint_stages = set(self.configer.get('network.checkpoint_stages', default=[]))
+        # The modules of backbone_features, frozen when training from the feature cache.
+        self.feature_stages = ['stage1', 'stage2', 'stage3', 'stage4']
+        self.head = AlignHead(num_features, fpn_dim=fpn_dim, checkpoint='head' in self.checkpoint_stages)
         self.dsn = nn.Sequential(
             nn.Conv2d(num_features // 2, max(num_features // 4, 256), kernel_size=3, stride=1, padding=1),
             ModuleHelper.BNReLU(max(num_features // 4, 256), norm_type="batchnorm"),
@@ -178,68 +194,70 @@ class ResSFNet(nn.Module):
             )
 
         self.valid_loss_dict = configer.get('loss', 'loss_weights', configer.get('loss.loss_type'))
+        # Supervise the dsn & fpn heads (and optionally the main head) at their own stride.
+        self.native_res_heads = configer.get('loss.native_res_heads', default=False)
+        self.native_res_main = configer.get('loss.native_res_main', default=False)
+
+    def _run_stage(self, name, x):
+        if name in self.checkpoint_stages:
+            return ModuleHelper.checkpoint(getattr(self, name), x)
+
+        return getattr(self, name)(x)
+
+    def backbone_features(self, img):
+        x1 = self._run_stage('stage1', img)
+        x2 = self._run_stage('stage2', x1)
+        x3 = self._run_stage('stage3', x2)
+        x4 = self._run_stage('stage4', x3)
+        return [x1, x2, x3, x4]
 
     def forward(self, data_dict):
-        target_size = (data_dict['img'].size(2), data_dict['img'].size(3))
-        x1 = self.stage1(data_dict['img'])
-        x2 = self.stage2(x1)
-        x3 = self.stage3(x2)
-        x4 = self.stage4(x3)
-        x_ = [x1, x2, x3, x4]
+        if 'feats' in data_dict:
+            # Backbone features cached by train.feature_cache, the stages are frozen.
+            target_size = tuple(data_dict['labelmap'].size()[-2:])
+            x_ = [feat.float() for feat in data_dict['feats']]
+        else:
+            target_size = (data_dict['img'].size(2), data_dict['img'].size(3))
+            x_ = self.backbone_features(data_dict['img'])
+
         x, fpn_dsn = self.head(x_)
         x = self.conv_last(x)
-        x = F.interpolate(x, size=target_size, mode="bilinear", align_corners=False)
-        out_dict = dict(out=x)
+        if self.configer.get('phase') == 'test' or not self.native_res_main:
+            x = F.interpolate(x, size=target_size, mode="bilinear", align_corners=False)
+            out_dict = dict(out=x)
+        else:
+            # The loss takes the stride 4 logits, the full size output needs no graph.
+            out_dict = dict(out=F.interpolate(x.detach(), size=target_size, mode="bilinear", align_corners=False))
+
         if self.configer.get('phase') == 'test':
             return out_dict
 
         x_dsn = self.dsn(x_[-2])
-        x_dsn = F.interpolate(x_dsn, size=target_size, mode="bilinear", align_corners=False)
+        if not self.native_res_heads:
+            x_dsn = F.interpolate(x_dsn, size=target_size, mode="bilinear", align_corners=False)
+
         loss_dict = dict()
         for i in range(len(self.fpn_dsn)):
             fpn_out = self.fpn_dsn[i](fpn_dsn[i])
-            fpn_out = F.interpolate(fpn_out, size=target_size, mode="bilinear", align_corners=False)
+            if not self.native_res_heads:
+                fpn_out = F.interpolate(fpn_out, size=target_size, mode="bilinear", align_corners=False)
 
             if 'fpn_ce_loss{}'.format(i) in self.valid_loss_dict:
-                loss_dict['fpn_ce_loss{}'.format(i)] = dict(
-                    params=[fpn_out, data_dict['labelmap']],
-                    type=torch.cuda.LongTensor([BASE_LOSS_DICT['ce_loss']]),
-                    weight=torch.cuda.FloatTensor([self.valid_loss_dict['fpn_ce_loss{}'.format(i)]])
-                )
+                loss_dict['fpn_ce_loss{}'.format(i)] = dict(params=[fpn_out, data_dict['labelmap']])
 
             if 'fpn_ohem_ce_loss{}'.format(i) in self.valid_loss_dict:
-                loss_dict['fpn_ohem_ce_loss{}'.format(i)] = dict(
-                    params=[fpn_out, data_dict['labelmap']],
-                    type=torch.cuda.LongTensor([BASE_LOSS_DICT['ohem_ce_loss']]),
-                    weight=torch.cuda.FloatTensor([self.valid_loss_dict['fpn_ohem_ce_loss{}'.format(i)]])
-                )
+                loss_dict['fpn_ohem_ce_loss{}'.format(i)] = dict(params=[fpn_out, data_dict['labelmap']])
 
         if 'dsn_ce_loss' in self.valid_loss_dict:
-            loss_dict['dsn_ce_loss'] = dict(
-                params=[x_dsn, data_dict['labelmap']],
-                type=torch.cuda.LongTensor([BASE_LOSS_DICT['ce_loss']]),
-                weight=torch.cuda.FloatTensor([self.valid_loss_dict['dsn_ce_loss']])
-            )
+            loss_dict['dsn_ce_loss'] = dict(params=[x_dsn, data_dict['labelmap']])
 
         if 'dsn_ohem_ce_loss' in self.valid_loss_dict:
-            loss_dict['dsn_ohem_ce_loss'] = dict(
-                params=[x_dsn, data_dict['labelmap']],
-                type=torch.cuda.LongTensor([BASE_LOSS_DICT['ohem_ce_loss']]),
-                weight=torch.cuda.FloatTensor([self.valid_loss_dict['dsn_ohem_ce_loss']])
-            )
+            loss_dict['dsn_ohem_ce_loss'] = dict(params=[x_dsn, data_dict['labelmap']])
 
         if 'ce_loss' in self.valid_loss_dict:
-            loss_dict['ce_loss'] = dict(
-                params=[x, data_dict['labelmap']],
-                type=torch.cuda.LongTensor([BASE_LOSS_DICT['ce_loss']]),
-                weight=torch.cuda.FloatTensor([self.valid_loss_dict['ce_loss']])
-            )
+            loss_dict['ce_loss'] = dict(params=[x, data_dict['labelmap']])
 
         if 'ohem_ce_loss' in self.valid_loss_dict:
-            loss_dict['ohem_ce_loss'] = dict(
-                params=[x, data_dict['labelmap']],
-                type=torch.cuda.LongTensor([BASE_LOSS_DICT['ohem_ce_loss']]),
-                weight=torch.cuda.FloatTensor([self.valid_loss_dict['ohem_ce_loss']])
-            )
+            loss_dict['ohem_ce_loss'] = dict(params=[x, data_dict['labelmap']])
 
         return out_dict, loss_dict
@@ -7,6 +7,8 @@
 import time
 import torch
 
+from lib.data.batch_aug_transforms import BatchAugCompose
+from lib.runner.amp_helper import AmpHelper
 from lib.runner.runner_helper import RunnerHelper
 from lib.runner.trainer import Trainer
 from lib.tools.util.average_meter import AverageMeter, DictAverageMeter
@@ -30,7 +32,9 @@ class ImageClassifier(object):
         self.val_losses = DictAverageMeter()
         self.cls_model_manager = ModelManager(configer)
         self.cls_data_loader = DataLoader(configer)
+        self.batch_aug_transform = BatchAugCompose(configer, split='train')
         self.running_score = ClsRunningScore(configer)
+        self.amp = AmpHelper(configer)
 
         self.cls_net = self.cls_model_manager.get_cls_model()
         self.solver_dict = self.configer.get('solver')
@@ -101,31 +105,34 @@ class ImageClassifier(object):
         start_time = time.time()
         # Adjust the learning rate after every epoch.
         self.runner_state['epoch'] += 1
-        for i, data_dict in enumerate(self.train_loader):
+        for i, data_dict in enumerate(RunnerHelper.iter_batches(self, self.train_loader)):
             Trainer.update(self, warm_list=(0, 1),
                            warm_lr_list=(self.solver_dict['lr']['base_lr']*self.configer.get('solver.lr.bb_lr_scale'),
                                          self.solver_dict['lr']['base_lr']),
                            solver_dict=self.solver_dict)
             self.data_time.update(time.time() - start_time)
-            data_dict = RunnerHelper.to_device(self, data_dict)
+            data_dict = self.batch_aug_transform(data_dict)
             # Forward pass.
-            out = self.cls_net(data_dict)
-            loss_dict = self.loss(out)
-            # Compute the loss of the train batch & backward.
+            with self.amp.autocast():
+                out = self.cls_net(data_dict)
+                loss_dict = self.loss(out)
 
+            # Compute the loss of the train batch & backward.
             loss = loss_dict['loss']
-            self.train_losses.update({key: loss.item() for key, loss in loss_dict.items()}, data_dict['img'].size(0))
+            self.train_losses.update(loss_dict, data_dict['img'].size(0))
             self.optimizer.zero_grad()
-            loss.backward()
+            self.amp.backward(loss)
             if self.configer.get('network', 'clip_grad', default=False):
+                self.amp.unscale(self.optimizer)
                 RunnerHelper.clip_grad(self.cls_net, 10.)
 
-            self.optimizer.step()
+            self.amp.step(self.optimizer)
 
             # Update the vars of the train phase.
             self.batch_time.update(time.time() - start_time)
             start_time = time.time()
             self.runner_state['iters'] += 1
+            RunnerHelper.record_step(self, data_dict['img'].size(0), loss_dict)
 
             # Print the log info & reset the states.
             if self.runner_state['iters'] % self.solver_dict['display_iter'] == 0:
@@ -159,14 +166,13 @@ class ImageClassifier(object):
         self.cls_net.eval()
         start_time = time.time()
         with torch.no_grad():
-            for j, data_dict in enumerate(self.val_loader):
+            for j, data_dict in enumerate(RunnerHelper.iter_batches(self, self.val_loader)):
                 # Forward pass.
-                data_dict = RunnerHelper.to_device(self, data_dict)
                 out = self.cls_net(data_dict)
                 loss_dict = self.loss(out)
                 out_dict, label_dict, _ = RunnerHelper.gather(self, out)
                 self.running_score.update(out_dict, label_dict)
-                self.val_losses.update({key: loss.item() for key, loss in loss_dict.items()}, data_dict['img'].size(0))
+                self.val_losses.update(loss_dict, data_dict['img'].size(0))
 
                 # Update the vars of the val phase.
                 self.batch_time.update(time.time() - start_time)
@@ -9,6 +9,7 @@ import torch
 
 from data.det.data_loader import DataLoader
 from runner.det.faster_rcnn_test import FastRCNNTest
+from lib.data.batch_aug_transforms import BatchAugCompose
 from lib.runner.runner_helper import RunnerHelper
 from lib.runner.trainer import Trainer
 from model.det.model_manager import ModelManager
@@ -33,6 +34,7 @@ class FasterRCNN(object):
         self.det_visualizer = DetVisualizer(configer)
         self.det_model_manager = ModelManager(configer)
         self.det_data_loader = DataLoader(configer)
+        self.batch_aug_transform = BatchAugCompose(configer, split='train')
         self.fr_priorbox_layer = FRPriorBoxLayer(configer)
         self.det_running_score = DetRunningScore(configer)
 
@@ -79,11 +81,11 @@ class FasterRCNN(object):
         # Adjust the learning rate after every epoch.
         self.runner_state['epoch'] += 1
 
-        for i, data_dict in enumerate(self.train_loader):
+        for i, data_dict in enumerate(RunnerHelper.iter_batches(self, self.train_loader)):
             Trainer.update(self, solver_dict=self.configer.get('solver'))
             self.data_time.update(time.time() - start_time)
             # Forward pass.
-            data_dict = RunnerHelper.to_device(self, data_dict)
+            data_dict = self.batch_aug_transform(data_dict)
             out = self.det_net(data_dict)
             loss_dict = self.det_loss(out)
             loss = loss_dict['loss'].mean()
@@ -98,6 +100,7 @@ class FasterRCNN(object):
             self.batch_time.update(time.time() - start_time)
             start_time = time.time()
             self.runner_state['iters'] += 1
+            RunnerHelper.record_step(self, len(DCHelper.tolist(data_dict['meta'])), loss)
 
             # Print the log info & reset the states.
             if self.runner_state['iters'] % self.configer.get('solver', 'display_iter') == 0:
@@ -128,9 +131,8 @@ class FasterRCNN(object):
         self.det_net.eval()
         start_time = time.time()
         with torch.no_grad():
-            for j, data_dict in enumerate(self.val_loader):
+            for j, data_dict in enumerate(RunnerHelper.iter_batches(self, self.val_loader)):
                 # Forward pass.
-                data_dict = RunnerHelper.to_device(self, data_dict)
                 out = self.det_net(data_dict)
                 loss_dict = self.det_loss(out)
                 # Compute the loss of the train batch & backward.
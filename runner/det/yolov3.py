@@ -9,6 +9,7 @@ import torch
 
 from data.det.data_loader import DataLoader
 from runner.det.yolov3_test import YOLOv3Test
+from lib.data.batch_aug_transforms import BatchAugCompose
 from lib.runner.runner_helper import RunnerHelper
 from lib.runner.trainer import Trainer
 from model.det.model_manager import ModelManager
@@ -32,6 +33,7 @@ class YOLOv3(object):
         self.det_visualizer = DetVisualizer(configer)
         self.det_model_manager = ModelManager(configer)
         self.det_data_loader = DataLoader(configer)
+        self.batch_aug_transform = BatchAugCompose(configer, split='train')
         self.det_running_score = DetRunningScore(configer)
 
         self.det_net = None
@@ -77,12 +79,13 @@ class YOLOv3(object):
         self.runner_state['epoch'] += 1
 
         # data_tuple: (inputs, heatmap, maskmap, vecmap)
-        for i, data_dict in enumerate(self.train_loader):
+        for i, data_dict in enumerate(RunnerHelper.iter_batches(self, self.train_loader, to_device=False)):
             Trainer.update(self, warm_list=(0,),
                            warm_lr_list=(self.configer.get('solver', 'lr')['base_lr'],),
                            solver_dict=self.configer.get('solver'))
 
             self.data_time.update(time.time() - start_time)
+            data_dict = self.batch_aug_transform(data_dict)
             # Forward pass.
             out_dict = self.det_net(data_dict)
             # Compute the loss of the train batch & backward.
@@ -96,6 +99,7 @@ class YOLOv3(object):
             self.batch_time.update(time.time() - start_time)
             start_time = time.time()
             self.runner_state['iters'] += 1
+            RunnerHelper.record_step(self, len(DCHelper.tolist(data_dict['meta'])), loss)
 
             # Print the log info & reset the states.
             if self.runner_state['iters'] % self.configer.get('solver', 'display_iter') == 0:
@@ -126,7 +130,7 @@ class YOLOv3(object):
         self.det_net.eval()
         start_time = time.time()
         with torch.no_grad():
-            for i, data_dict in enumerate(self.val_loader):
+            for i, data_dict in enumerate(RunnerHelper.iter_batches(self, self.val_loader, to_device=False)):
                 # Forward pass.
                 out_dict = self.det_net(data_dict)
 
@@ -59,7 +59,7 @@ class FaceGAN(object):
         self.gan_net.train()
         start_time = time.time()
         # Adjust the learning rate after every epoch.
-        for i, data_dict in enumerate(self.train_loader):
+        for i, data_dict in enumerate(RunnerHelper.iter_batches(self, self.train_loader, to_device=False)):
             Trainer.update(self, solver_dict=self.configer.get('solver'))
             self.data_time.update(time.time() - start_time)
 
@@ -76,6 +76,7 @@ class FaceGAN(object):
             self.batch_time.update(time.time() - start_time)
             start_time = time.time()
             self.runner_state['iters'] += 1
+            RunnerHelper.record_step(self, len(DCHelper.tolist(data_dict['meta'])), loss)
 
             # Print the log info & reset the states.
             if self.runner_state['iters'] % self.configer.get('solver', 'display_iter') == 0:
@@ -109,7 +110,7 @@ class FaceGAN(object):
         start_time = time.time()
 
         data_loader = self.val_loader if data_loader is None else data_loader
-        for j, data_dict in enumerate(data_loader):
+        for j, data_dict in enumerate(RunnerHelper.iter_batches(self, data_loader, to_device=False)):
 
             with torch.no_grad():
                 # Forward pass.
@@ -69,7 +69,7 @@ class ImageTranslator(object):
         # Adjust the learning rate after every epoch.
         self.scheduler_G.step(self.runner_state['epoch'])
         self.scheduler_D.step(self.runner_state['epoch'])
-        for i, data_dict in enumerate(self.train_loader):
+        for i, data_dict in enumerate(RunnerHelper.iter_batches(self, self.train_loader, to_device=False)):
             self.data_time.update(time.time() - start_time)
 
             # Forward pass.
@@ -91,6 +91,9 @@ class ImageTranslator(object):
             self.batch_time.update(time.time() - start_time)
             start_time = time.time()
             self.runner_state['iters'] += 1
+            RunnerHelper.record_step(self, len(DCHelper.tolist(data_dict['meta'])),
+                                    dict(loss_G=loss_G, loss_D=loss_D),
+                                    lr=RunnerHelper.get_lr(self.optimizer_G) + RunnerHelper.get_lr(self.optimizer_D))
 
             # Print the log info & reset the states.
             if self.runner_state['iters'] % self.configer.get('solver', 'display_iter') == 0:
@@ -123,7 +126,7 @@ class ImageTranslator(object):
         self.gan_net.eval()
         start_time = time.time()
 
-        for j, data_dict in enumerate(self.val_loader):
+        for j, data_dict in enumerate(RunnerHelper.iter_batches(self, self.val_loader, to_device=False)):
             with torch.no_grad():
                 # Forward pass.
                 out_dict = self.gan_net(data_dict)
@@ -74,7 +74,7 @@ class PoseEstimator(object):
         start_time = time.time()
         # Adjust the learning rate after every epoch.
         self.runner_state['epoch'] += 1
-        for i, data_dict in enumerate(self.train_loader):
+        for i, data_dict in enumerate(RunnerHelper.iter_batches(self, self.train_loader, to_device=False)):
             Trainer.update(self, warm_list=(0,), solver_dict=self.configer.get('solver'))
             self.data_time.update(time.time() - start_time)
             # Forward pass.
@@ -84,7 +84,7 @@ class PoseEstimator(object):
             loss_dict = self.pose_loss(out)
 
             loss = loss_dict['loss']
-            self.train_losses.update({key: loss.item() for key, loss in loss_dict.items()}, data_dict['img'].size(0))
+            self.train_losses.update(loss_dict, data_dict['img'].size(0))
 
             self.optimizer.zero_grad()
             loss.backward()
@@ -94,6 +94,7 @@ class PoseEstimator(object):
             self.batch_time.update(time.time() - start_time)
             start_time = time.time()
             self.runner_state['iters'] += 1
+            RunnerHelper.record_step(self, data_dict['img'].size(0), loss_dict)
 
             # Print the log info & reset the states.
             if self.runner_state['iters'] % self.configer.get('solver', 'display_iter') == 0:
@@ -125,13 +126,13 @@ class PoseEstimator(object):
         start_time = time.time()
 
         with torch.no_grad():
-            for i, data_dict in enumerate(self.val_loader):
+            for i, data_dict in enumerate(RunnerHelper.iter_batches(self, self.val_loader, to_device=False)):
                 # Forward pass.
                 out = self.pose_net(data_dict)
                 # Compute the loss of the val batch.
                 loss_dict = self.pose_loss(out)
 
-                self.val_losses.update({key: loss.item() for key, loss in loss_dict.items()}, data_dict['img'].size(0))
+                self.val_losses.update(loss_dict, data_dict['img'].size(0))
 
                 # Update the vars of the val phase.
                 self.batch_time.update(time.time() - start_time)
@@ -5,16 +5,23 @@
 
 
 import cv2
+import os
 import time
 import numpy as np
 import torch
 
 from data.seg.data_loader import DataLoader
+from lib.data.batch_aug_transforms import BatchAugCompose
+from lib.data.feature_cache import FeatureCache
+from lib.data.size_schedule import SizeSchedule
+from lib.runner.amp_helper import AmpHelper
 from lib.runner.runner_helper import RunnerHelper
 from lib.runner.trainer import Trainer
+from lib.runner.val_worker import ValWorkerClient
 from model.seg.model_manager import ModelManager
 from lib.tools.util.average_meter import AverageMeter, DictAverageMeter
 from lib.tools.util.logger import Logger as Log
+from lib.tools.helper.dist_helper import DistHelper
 from lib.tools.helper.dc_helper import DCHelper
 from metric.seg.seg_running_score import SegRunningScore
 from lib.tools.vis.seg_visualizer import SegVisualizer
@@ -34,6 +41,8 @@ class FCNSegmentor(object):
         self.seg_visualizer = SegVisualizer(configer)
         self.seg_model_manager = ModelManager(configer)
         self.seg_data_loader = DataLoader(configer)
+        self.batch_aug_transform = BatchAugCompose(configer, split='train')
+        self.amp = AmpHelper(configer)
 
         self.seg_net = None
         self.train_loader = None
@@ -41,25 +50,99 @@ class FCNSegmentor(object):
         self.optimizer = None
         self.scheduler = None
         self.runner_state = dict()
+        self.val_worker = None
+        self.size_schedule = SizeSchedule(configer)
+        self.size_stage = None
 
         self._init_model()
+        if self.configer.get('val.worker.enable', default=False) and DistHelper.get_rank() == 0:
+            self.val_worker = ValWorkerClient(self)
 
     def _init_model(self):
         self.seg_net = self.seg_model_manager.get_seg_model()
         self.seg_net = RunnerHelper.load_net(self, self.seg_net)
 
-        self.optimizer, self.scheduler = Trainer.init(self._get_parameters(), self.configer.get('solver'))
+        if self.configer.get('phase') == 'train':
+            # The val worker builds the runner only to evaluate.
+            if self.configer.get('train.feature_cache.enable', default=False):
+                self.train_loader = self._init_feature_cache()
+
+            self.optimizer, self.scheduler = Trainer.init(self._get_parameters(), self.configer.get('solver'))
+            if self.train_loader is None and self.size_schedule.enabled:
+                self._update_size_schedule()
+            elif self.train_loader is None:
+                self.train_loader = self.seg_data_loader.get_trainloader()
+            elif self.size_schedule.enabled:
+                Log.warn('train.size_schedule is ignored, the feature cache has fixed sizes.')
 
-        self.train_loader = self.seg_data_loader.get_trainloader()
         self.val_loader = self.seg_data_loader.get_valloader()
 
         self.loss = self.seg_model_manager.get_seg_loss()
 
+    def _update_size_schedule(self):
+        """Switches to the train sizes of the train.size_schedule stage of runner_state, True on a switch."""
+        stage = self.size_schedule.get_stage(self.runner_state)
+        if stage == self.size_stage:
+            return False
+
+        self.size_stage = stage
+        self.size_schedule.apply(stage)
+        # The aug transforms & the loader workers hold the sizes of the previous stage.
+        self.seg_data_loader = DataLoader(self.configer)
+        self.train_loader = self.seg_data_loader.get_trainloader()
+        self.size_schedule.scale_lr(self.scheduler, stage)
+        return True
+
+    def _init_feature_cache(self):
+        """Freezes the backbone stages, caches their features once & returns the loader of the cache."""
+        net = self.seg_net.module if hasattr(self.seg_net, 'module') else self.seg_net
+        if not hasattr(net, 'backbone_features'):
+            Log.error('Model {} can not train from cached features.'.format(self.configer.get('network.model_name')))
+            exit(1)
+
+        stages = [getattr(net, name) for name in net.feature_stages]
+        for stage in stages:
+            stage.requires_grad_(False)
+
+        cache_dir = self.configer.get('train.feature_cache.dir', default=None)
+        if cache_dir is None:
+            cache_dir = os.path.join(RunnerHelper.get_checkpoints_dir(self.configer), 'feature_cache')
+
+        augment = self.configer.get('train.feature_cache.augment', default=False)
+        passes = self.configer.get('train.feature_cache.passes', default=1) if augment else 1
+        dtype = self.configer.get('train.feature_cache.dtype', default='float16')
+        settings = dict(model_name=self.configer.get('network.model_name'),
+                        backbone=self.configer.get('network.backbone'),
+                        weights=FeatureCache.fingerprint(stages),
+                        data_dir=self.configer.get('data.data_dir'), augment=augment, passes=passes, dtype=dtype,
+                        data_transformer=self.configer.get('train' if augment else 'val', 'data_transformer'))
+        if DistHelper.get_rank() == 0 and not FeatureCache.is_valid(cache_dir, settings):
+            Log.info('Building the feature cache {}...'.format(cache_dir))
+
+            def extract_fn(data_dict):
+                data_dict = RunnerHelper.to_device(self, data_dict)
+                with torch.no_grad(), self.amp.autocast():
+                    return net.backbone_features(data_dict['img'])
+
+            net.eval()
+            FeatureCache.build(cache_dir, extract_fn, self.seg_data_loader.get_cacheloader(augment), settings,
+                               passes=passes, shard_size=self.configer.get('train.feature_cache.shard_size', default=256),
+                               dtype=dtype)
+            net.train()
+
+        if self.configer.get('network.distributed'):
+            torch.distributed.barrier()
+
+        return self.seg_data_loader.get_feature_trainloader(cache_dir)
+
     def _get_parameters(self):
         lr_1 = []
         lr_10 = []
         params_dict = dict(self.seg_net.named_parameters())
         for key, value in params_dict.items():
+            if not value.requires_grad:
+                continue
+
             if 'backbone' not in key:
                 lr_10.append(value)
             else:
@@ -77,25 +160,30 @@ class FCNSegmentor(object):
         start_time = time.time()
         # Adjust the learning rate after every epoch.
 
-        for i, data_dict in enumerate(self.train_loader):
+        for i, data_dict in enumerate(RunnerHelper.iter_batches(self, self.train_loader)):
             Trainer.update(self, warm_list=(0,), solver_dict=self.configer.get('solver'))
             self.data_time.update(time.time() - start_time)
 
             # Forward pass.
-            data_dict = RunnerHelper.to_device(self, data_dict)
-            out = self.seg_net(data_dict)
-            # Compute the loss of the train batch & backward.
-            loss_dict = self.loss(out)
+            if 'img' in data_dict:
+                data_dict = self.batch_aug_transform(data_dict)
+
+            with self.amp.autocast():
+                out = self.seg_net(data_dict)
+                # Compute the loss of the train batch & backward.
+                loss_dict = self.loss(out)
+
             loss = loss_dict['loss']
-            self.train_losses.update({key: loss.item() for key, loss in loss_dict.items()}, data_dict['img'].size(0))
+            self.train_losses.update(loss_dict, data_dict['labelmap'].size(0))
             self.optimizer.zero_grad()
-            loss.backward()
-            self.optimizer.step()
+            self.amp.backward(loss)
+            self.amp.step(self.optimizer)
 
             # Update the vars of the train phase.
             self.batch_time.update(time.time() - start_time)
             start_time = time.time()
             self.runner_state['iters'] += 1
+            RunnerHelper.record_step(self, data_dict['labelmap'].size(0), loss_dict)
 
             # Print the log info & reset the states.
             if self.runner_state['iters'] % self.configer.get('solver', 'display_iter') == 0:
@@ -109,6 +197,8 @@ class FCNSegmentor(object):
                 self.batch_time.reset()
                 self.data_time.reset()
                 self.train_losses.reset()
+                if self.val_worker is not None:
+                    self.val_worker.collect(self)
 
             if self.runner_state['iters'] % self.configer.get('solver.save_iters') == 0 \
                     and self.configer.get('local_rank') == 0:
@@ -119,22 +209,29 @@ class FCNSegmentor(object):
                 break
 
             # Check to val the current model.
-            if self.runner_state['iters'] % self.configer.get('solver', 'test_interval') == 0 \
-                    and not self.configer.get('network.distributed'):
-                self.val()
+            if self.runner_state['iters'] % self.configer.get('solver', 'test_interval') == 0:
+                if self.val_worker is not None:
+                    self.val_worker.submit(self, self.seg_net)
+                elif not self.configer.get('network.distributed'):
+                    self.val()
+
+            # A new size stage needs a new loader, the loop restarts on it within the same epoch.
+            if self.size_stage is not None and self._update_size_schedule():
+                return
 
         self.runner_state['epoch'] += 1
+        if self.size_stage is not None:
+            self._update_size_schedule()
 
-    def val(self, data_loader=None):
+    def evaluate(self, data_loader=None):
         """
-          Validation function during the train phase.
+          Runs the val set, returns the metrics & resets the val meters.
         """
         self.seg_net.eval()
         start_time = time.time()
 
         data_loader = self.val_loader if data_loader is None else data_loader
-        for j, data_dict in enumerate(data_loader):
-            data_dict = RunnerHelper.to_device(self, data_dict)
+        for j, data_dict in enumerate(RunnerHelper.iter_batches(self, data_loader)):
             with torch.no_grad():
                 # Forward pass.
                 out = self.seg_net(data_dict)
@@ -142,28 +239,44 @@ class FCNSegmentor(object):
                 # Compute the loss of the val batch.
                 out_dict, _ = RunnerHelper.gather(self, out)
             
-            self.val_losses.update({key: loss.item() for key, loss in loss_dict.items()}, data_dict['img'].size(0))
+            self.val_losses.update(loss_dict, data_dict['img'].size(0))
             self._update_running_score(out_dict['out'], DCHelper.tolist(data_dict['meta']))
 
             # Update the vars of the val phase.
             self.batch_time.update(time.time() - start_time)
             start_time = time.time()
 
-        self.runner_state['performance'] = self.seg_running_score.get_mean_iou()
-        self.runner_state['val_loss'] = self.val_losses.avg['loss']
+        result = dict(performance=float(self.seg_running_score.get_mean_iou()),
+                      pixel_acc=float(self.seg_running_score.get_pixel_acc()),
+                      val_loss=float(self.val_losses.avg['loss']),
+                      loss_info=self.val_losses.info(), time=self.batch_time.sum, time_avg=self.batch_time.avg)
+        self.batch_time.reset()
+        self.val_losses.reset()
+        self.seg_running_score.reset()
+        return result
+
+    def val(self, data_loader=None):
+        """
+          Validation function during the train phase.
+        """
+        if self.val_worker is not None:
+            # The best checkpoints compare to the results still in flight, a silent worker is not waited for.
+            self.val_worker.collect(self, wait=True,
+                                    timeout=self.configer.get('val.worker.close_timeout', default=600))
+
+        result = self.evaluate(data_loader)
+        self.runner_state['performance'] = result['performance']
+        self.runner_state['val_loss'] = result['val_loss']
         RunnerHelper.save_net(self, self.seg_net,
-                              performance=self.seg_running_score.get_mean_iou(),
-                              val_loss=self.val_losses.avg['loss'])
+                              performance=result['performance'],
+                              val_loss=result['val_loss'])
 
         # Print the log info & reset the states.
         Log.info(
-            'Test Time {batch_time.sum:.3f}s, ({batch_time.avg:.3f})\t'
-            'Loss = {0}\n'.format(self.val_losses.info(), batch_time=self.batch_time))
-        Log.info('Mean IOU: {}\n'.format(self.seg_running_score.get_mean_iou()))
-        Log.info('Pixel ACC: {}\n'.format(self.seg_running_score.get_pixel_acc()))
-        self.batch_time.reset()
-        self.val_losses.reset()
-        self.seg_running_score.reset()
+            'Test Time {0:.3f}s, ({1:.3f})\t'
+            'Loss = {2}\n'.format(result['time'], result['time_avg'], result['loss_info']))
+        Log.info('Mean IOU: {}\n'.format(result['performance']))
+        Log.info('Pixel ACC: {}\n'.format(result['pixel_acc']))
         self.seg_net.train()
 
     def _update_running_score(self, pred, metas):
@@ -16,6 +16,7 @@ from lib.runner.runner_helper import RunnerHelper
 from model.seg.model_manager import ModelManager
 from lib.tools.helper.image_helper import ImageHelper
 from lib.tools.util.logger import Logger as Log
+from lib.tools.util.tracer import Tracer
 from lib.tools.parser.seg_parser import SegParser
 from lib.tools.vis.seg_visualizer import SegVisualizer
 from lib.tools.helper.dc_helper import DCHelper
@@ -40,32 +41,38 @@ class FCNSegmentorTest(object):
         self.seg_net.eval()
 
     def test(self, test_dir, out_dir):
-        for _, data_dict in enumerate(self.test_loader.get_testloader(test_dir=test_dir)):
+        test_loader = self.test_loader.get_testloader(test_dir=test_dir)
+        for _, data_dict in enumerate(Tracer.iterate('load', test_loader)):
             total_logits = None
-            if self.configer.get('test', 'mode') == 'ss_test':
-                total_logits = self.ss_test(data_dict)
+            with Tracer.span(self.configer.get('test', 'mode')):
+                if self.configer.get('test', 'mode') == 'ss_test':
+                    total_logits = self.ss_test(data_dict)
 
-            elif self.configer.get('test', 'mode') == 'sscrop_test':
-                total_logits = self.sscrop_test(data_dict, params_dict=self.configer.get('test', 'sscrop_test'))
+                elif self.configer.get('test', 'mode') == 'sscrop_test':
+                    total_logits = self.sscrop_test(data_dict, params_dict=self.configer.get('test', 'sscrop_test'))
 
-            elif self.configer.get('test', 'mode') == 'ms_test':
-                total_logits = self.ms_test(data_dict, params_dict=self.configer.get('test', 'ms_test'))
+                elif self.configer.get('test', 'mode') == 'ms_test':
+                    total_logits = self.ms_test(data_dict, params_dict=self.configer.get('test', 'ms_test'))
 
-            elif self.configer.get('test', 'mode') == 'mscrop_test':
-                total_logits = self.mscrop_test(data_dict, params_dict=self.configer.get('test', 'mscrop_test'))
+                elif self.configer.get('test', 'mode') == 'mscrop_test':
+                    total_logits = self.mscrop_test(data_dict,
+                                                    params_dict=self.configer.get('test', 'mscrop_test'))
 
-            else:
-                Log.error('Invalid test mode:{}'.format(self.configer.get('test', 'mode')))
-                exit(1)
+                else:
+                    Log.error('Invalid test mode:{}'.format(self.configer.get('test', 'mode')))
+                    exit(1)
 
             meta_list = DCHelper.tolist(data_dict['meta'])
             for i in range(len(meta_list)):
-                label_map = np.argmax(total_logits[i], axis=-1)
-                label_img = np.array(label_map, dtype=np.uint8)
-                ori_img_bgr = ImageHelper.read_image(meta_list[i]['img_path'], tool='cv2', mode='BGR')
-                image_canvas = self.seg_parser.colorize(label_img, image_canvas=ori_img_bgr)
-                ImageHelper.save(image_canvas,
-                                 save_path=os.path.join(out_dir, 'vis/{}.png'.format(meta_list[i]['filename'])))
+                with Tracer.span('argmax'):
+                    label_map = np.argmax(total_logits[i], axis=-1)
+                    label_img = np.array(label_map, dtype=np.uint8)
+
+                with Tracer.span('vis'):
+                    ori_img_bgr = ImageHelper.read_image(meta_list[i]['img_path'], tool='cv2', mode='BGR')
+                    image_canvas = self.seg_parser.colorize(label_img, image_canvas=ori_img_bgr)
+                    ImageHelper.save(image_canvas,
+                                     save_path=os.path.join(out_dir, 'vis/{}.png'.format(meta_list[i]['filename'])))
 
                 if self.configer.get('data.label_list', default=None) is not None:
                     label_img = self.__relabel(label_img)
@@ -77,7 +84,8 @@ class FCNSegmentorTest(object):
                 label_img = Image.fromarray(label_img, 'P')
                 label_path = os.path.join(out_dir, 'label/{}.png'.format(meta_list[i]['filename']))
                 Log.info('Label Path: {}'.format(label_path))
-                ImageHelper.save(label_img, label_path)
+                with Tracer.span('write_label'):
+                    ImageHelper.save(label_img, label_path)
 
     def ss_test(self, in_data_dict):
         data_dict = self.blob_helper.get_blob(in_data_dict, scale=1.0)
@@ -207,15 +215,18 @@ class FCNSegmentorTest(object):
     def _predict(self, data_dict):
         with torch.no_grad():
             total_logits = list()
-            results = self.seg_net(data_dict)
+            with Tracer.span('forward', sync=True):
+                results = self.seg_net(data_dict)
+
             results = results if isinstance(results, (list, tuple)) else [results]
             for res in results:
                 assert res['out'].size(0) == 1, 'Only support one image per gpu.'
                 total_logits.append(res['out'].squeeze(0).permute(1, 2, 0).cpu().numpy())
 
-            for i, meta in enumerate(DCHelper.tolist(data_dict['meta'])):
-                total_logits[i] = cv2.resize(total_logits[i][:meta['border_wh'][1], :meta['border_wh'][0]],
-                                             tuple(meta['ori_img_size']), interpolation=cv2.INTER_CUBIC)
+            with Tracer.span('resize'):
+                for i, meta in enumerate(DCHelper.tolist(data_dict['meta'])):
+                    total_logits[i] = cv2.resize(total_logits[i][:meta['border_wh'][1], :meta['border_wh'][0]],
+                                                 tuple(meta['ori_img_size']), interpolation=cv2.INTER_CUBIC)
 
         return total_logits
 
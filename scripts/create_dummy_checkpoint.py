@@ -19,6 +19,8 @@ def main():
                         help='Path to config file.')
     parser.add_argument('--output', type=str, default='',
                         help='Output checkpoint path (.pth). If empty, use config checkpoints_dir/name.')
+    parser.add_argument('--backbone', type=str, default=None,
+                        help='Overrides network.backbone, e.g. deepbase_resnet18 for small test models.')
     args = parser.parse_args()
 
     Log.init(log_level='info')
@@ -44,6 +46,9 @@ def main():
     if configer.get('network', 'resume_val', default=None) is None:
         configer.add('network.resume_val', False)
 
+    if args.backbone is not None:
+        configer.update('network.backbone', args.backbone)
+
     # 构建模型（不加载预训练）
     Log.info('Building model from config: {}'.format(args.config))
     model_manager = ModelManager(configer)
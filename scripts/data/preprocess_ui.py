@@ -3,14 +3,21 @@
 """
 UI数据集预处理脚本
 将边界框标注转换为像素级分割掩码
+使用进程池并行处理，并通过清单文件(manifest)只重新处理发生变化的输入
 """
 
 import os
+import sys
 import json
 import numpy as np
 from PIL import Image
 import argparse
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from lib.tools.util.logger import Logger as Log
+from lib.tools.util.preprocess_runner import PreprocessRunner
+
 
 def create_segmentation_mask(width, height, boxes):
     """
@@ -42,52 +49,92 @@ def create_segmentation_mask(width, height, boxes):
     return mask
 
 
-def parse_rico_json(json_path):
+def load_rico_bounds(json_path):
     """
-    解析Rico数据集的JSON标注文件
-    
+    读取Rico数据集JSON标注中的 (类别名称, 边界框) 列表
+
     Args:
         json_path: JSON文件路径
-    
+
     Returns:
-        包含图片路径和边界框列表的字典
+        [(class_name, [x_min, y_min, x_max, y_max]), ...]
     """
     with open(json_path, 'r', encoding='utf-8') as f:
         data = json.load(f)
-    
+
     # Rico数据集格式：假设JSON包含 'bounds' 字段，每个元素有 'class' 和坐标信息
     # 这里需要根据实际JSON格式调整
+    items = []
+    for item in data.get('bounds', []):
+        if 'class' not in item or 'bounds' not in item or len(item['bounds']) != 4:
+            continue
+
+        bounds = item['bounds']
+        # 判断是 [x, y, w, h] 还是 [x_min, y_min, x_max, y_max]
+        if bounds[2] > bounds[0] and bounds[3] > bounds[1]:
+            # 可能是 [x_min, y_min, x_max, y_max]
+            x_min, y_min, x_max, y_max = bounds
+        else:
+            # 可能是 [x, y, w, h]
+            x_min, y_min, w, h = bounds
+            x_max = x_min + w
+            y_max = y_min + h
+
+        items.append((item['class'], [x_min, y_min, x_max, y_max]))
+
+    return items
+
+
+def parse_rico_json(json_path, class_mapping=None):
+    """
+    解析Rico数据集的JSON标注文件
+
+    Args:
+        json_path: JSON文件路径
+        class_mapping: 全局类别映射，为None时按文件内出现顺序编号
+
+    Returns:
+        边界框列表和类别映射
+    """
+    class_mapping = dict() if class_mapping is None else class_mapping
     boxes = []
-    class_mapping = {}  # 类别名称到ID的映射
-    
-    if 'bounds' in data:
-        for i, item in enumerate(data['bounds']):
-            if 'class' in item:
-                class_name = item['class']
-                if class_name not in class_mapping:
-                    class_mapping[class_name] = len(class_mapping) + 1  # 从1开始，0作为背景
-                
-                class_id = class_mapping[class_name]
-                
-                # 提取坐标 (假设格式为 [x, y, width, height] 或 [x_min, y_min, x_max, y_max])
-                if 'bounds' in item:
-                    bounds = item['bounds']
-                    if len(bounds) == 4:
-                        # 判断是 [x, y, w, h] 还是 [x_min, y_min, x_max, y_max]
-                        if bounds[2] > bounds[0] and bounds[3] > bounds[1]:
-                            # 可能是 [x_min, y_min, x_max, y_max]
-                            x_min, y_min, x_max, y_max = bounds
-                        else:
-                            # 可能是 [x, y, w, h]
-                            x_min, y_min, w, h = bounds
-                            x_max = x_min + w
-                            y_max = y_min + h
-                        
-                        boxes.append([x_min, y_min, x_max, y_max, class_id])
-    
+    for class_name, (x_min, y_min, x_max, y_max) in load_rico_bounds(json_path):
+        if class_name not in class_mapping:
+            class_mapping[class_name] = len(class_mapping) + 1  # 从1开始，0作为背景
+
+        boxes.append([x_min, y_min, x_max, y_max, class_mapping[class_name]])
+
     return boxes, class_mapping
 
 
+def collect_class_names(task):
+    """进程池任务：返回单个JSON文件中出现的类别名称"""
+    return sorted(set(class_name for class_name, _ in load_rico_bounds(task['inputs'][0])))
+
+
+def rasterize_mask(task):
+    """进程池任务：读取图片尺寸，按全局类别映射生成并保存掩码"""
+    json_path, image_path = task['inputs']
+    with Image.open(image_path) as img:
+        width, height = img.size
+
+    boxes, _ = parse_rico_json(json_path, class_mapping=dict(task['params']['class_mapping']))
+    mask = create_segmentation_mask(width, height, boxes)
+    Image.fromarray(mask, mode='P').save(task['outputs'][0])
+    return len(boxes)
+
+
+def build_class_mapping(class_names, init_mapping=None):
+    """
+    生成确定性的全局类别映射：已有映射保持不变，新类别按名称排序追加
+    """
+    class_mapping = dict() if init_mapping is None else dict(init_mapping)
+    for class_name in sorted(set(class_names) - set(class_mapping.keys())):
+        class_mapping[class_name] = max(list(class_mapping.values()) + [0]) + 1
+
+    return class_mapping
+
+
 def main():
     """
     主函数：读取JSON标注文件，生成分割掩码并保存
@@ -103,82 +150,72 @@ def main():
                         help='图片文件扩展名 (默认: .png)')
     parser.add_argument('--json_ext', type=str, default='.json',
                         help='JSON文件扩展名 (默认: .json)')
-    
+    parser.add_argument('--workers', type=int, default=None,
+                        help='并行进程数 (默认: CPU核数, 0表示单进程)')
+    parser.add_argument('--class_mapping', type=str, default=None,
+                        help='已有的类别映射文件，保证多次运行类别ID一致 (默认: output_dir/class_mapping.json)')
+    parser.add_argument('--force', action='store_true',
+                        help='忽略清单文件，重新处理所有输入')
+
     args = parser.parse_args()
-    
+
     # 创建输出目录
     os.makedirs(args.output_dir, exist_ok=True)
-    
-    # 获取所有JSON文件
-    json_files = [f for f in os.listdir(args.json_dir) if f.endswith(args.json_ext)]
-    
-    class_mapping = {}
-    total_images = 0
-    processed_images = 0
-    
+
+    # 获取所有JSON文件，排序保证结果与文件系统顺序无关
+    json_files = sorted(f for f in os.listdir(args.json_dir) if f.endswith(args.json_ext))
+
+    tasks = []
     for json_file in json_files:
-        json_path = os.path.join(args.json_dir, json_file)
-        
         # 获取对应的图片文件名
         image_name = os.path.splitext(json_file)[0] + args.image_ext
         image_path = os.path.join(args.image_dir, image_name)
-        
         if not os.path.exists(image_path):
-            print(f"警告: 图片文件不存在: {image_path}")
-            continue
-        
-        # 读取图片获取尺寸
-        try:
-            img = Image.open(image_path)
-            width, height = img.size
-        except Exception as e:
-            print(f"错误: 无法读取图片 {image_path}: {e}")
-            continue
-        
-        # 解析JSON文件
-        try:
-            boxes, file_class_mapping = parse_rico_json(json_path)
-            
-            # 更新全局类别映射
-            for class_name, class_id in file_class_mapping.items():
-                if class_name not in class_mapping:
-                    class_mapping[class_name] = len(class_mapping) + 1
-            
-            # 重新映射类别ID以匹配全局映射
-            for box in boxes:
-                # 这里需要根据实际JSON格式调整，暂时保持原样
-                pass
-            
-        except Exception as e:
-            print(f"错误: 无法解析JSON文件 {json_path}: {e}")
+            Log.warn('图片文件不存在: {}'.format(image_path))
             continue
-        
-        # 生成掩码
-        mask = create_segmentation_mask(width, height, boxes)
-        
-        # 保存掩码
+
         mask_name = os.path.splitext(json_file)[0] + '.png'
-        mask_path = os.path.join(args.output_dir, mask_name)
-        
-        mask_image = Image.fromarray(mask, mode='P')
-        mask_image.save(mask_path)
-        
-        processed_images += 1
-        total_images += 1
-        
-        if processed_images % 100 == 0:
-            print(f"已处理 {processed_images} 张图片...")
-    
-    print(f"处理完成! 总共处理了 {processed_images}/{total_images} 张图片")
-    print(f"类别映射: {class_mapping}")
-    
+        tasks.append(dict(key=json_file,
+                          inputs=[os.path.join(args.json_dir, json_file), image_path],
+                          outputs=[os.path.join(args.output_dir, mask_name)]))
+
+    manifest_dir = os.path.join(args.output_dir, '.manifest')
+    if args.force and os.path.exists(manifest_dir):
+        for file_name in os.listdir(manifest_dir):
+            os.remove(os.path.join(manifest_dir, file_name))
+
+    # 第一遍：并行收集所有类别名称，生成全局类别映射
+    name_tasks = [dict(key=task['key'], inputs=task['inputs'][:1]) for task in tasks]
+    name_runner = PreprocessRunner(os.path.join(manifest_dir, 'class_names.json'),
+                                   workers=args.workers, name='Collect classes')
+    class_names = [name for names in name_runner.run(name_tasks, collect_class_names) if names for name in names]
+
+    mapping_path = args.class_mapping or os.path.join(args.output_dir, 'class_mapping.json')
+    init_mapping = None
+    if os.path.exists(mapping_path):
+        with open(mapping_path, 'r', encoding='utf-8') as f:
+            init_mapping = json.load(f)
+
+    class_mapping = build_class_mapping(class_names, init_mapping)
+
+    # 第二遍：并行生成掩码，类别映射作为参数参与哈希，映射变化时自动重新生成
+    for task in tasks:
+        task['params'] = dict(class_mapping=sorted(class_mapping.items()))
+
+    mask_runner = PreprocessRunner(os.path.join(manifest_dir, 'masks.json'),
+                                   workers=args.workers, name='Rasterize masks')
+    results = mask_runner.run(tasks, rasterize_mask)
+    processed_images = sum(result is not None for result in results)
+
+    Log.info('处理完成! 总共处理了 {}/{} 张图片'.format(processed_images, len(json_files)))
+    Log.info('类别映射: {}'.format(class_mapping))
+
     # 保存类别映射到文件
     mapping_path = os.path.join(args.output_dir, 'class_mapping.json')
     with open(mapping_path, 'w', encoding='utf-8') as f:
         json.dump(class_mapping, f, indent=2, ensure_ascii=False)
-    print(f"类别映射已保存到: {mapping_path}")
+    Log.info('类别映射已保存到: {}'.format(mapping_path))
 
 
 if __name__ == '__main__':
     main()
-
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+# Start N local main.py processes for distributed smoke tests.
+#   python scripts/dist_launch.py --nproc 2 --cpu -- --config_file configs/seg/xxx.conf --phase train
+
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Launch N local distributed processes of main.py.')
+    parser.add_argument('--nproc', default=2, type=int, help='The number of processes.')
+    parser.add_argument('--cpu', action='store_true', help='Train on CPU over gloo (passes --gpu -1).')
+    parser.add_argument('--master_addr', default='127.0.0.1', type=str)
+    parser.add_argument('--master_port', default=29500, type=int)
+    parser.add_argument('--script', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                         'main.py'), type=str)
+    parser.add_argument('main_args', nargs=argparse.REMAINDER, help='Arguments passed to main.py after "--".')
+    args = parser.parse_args()
+
+    main_args = args.main_args[1:] if args.main_args[:1] == ['--'] else args.main_args
+    main_args = main_args + ['--dist', 'y']
+    if args.cpu:
+        main_args = main_args + ['--gpu', '-1']
+
+    procs = []
+    for rank in range(args.nproc):
+        env = dict(os.environ, MASTER_ADDR=args.master_addr, MASTER_PORT=str(args.master_port),
+                   WORLD_SIZE=str(args.nproc), RANK=str(rank), LOCAL_RANK=str(rank))
+        if args.cpu:
+            # Split the cores, or every rank spins up all intra-op threads.
+            env.setdefault('OMP_NUM_THREADS', str(max(1, (os.cpu_count() or 1) // args.nproc)))
+
+        procs.append(subprocess.Popen([sys.executable, args.script] + main_args, env=env))
+
+    # A crashed rank leaves the others blocked in a collective, so stop them all.
+    ret = 0
+    while procs:
+        for proc in list(procs):
+            code = proc.poll()
+            if code is None:
+                continue
+
+            procs.remove(proc)
+            if code != 0:
+                ret = code
+                for other in procs:
+                    other.kill()
+
+                for other in procs:
+                    other.wait()
+
+                procs = []
+                break
+
+        time.sleep(0.5)
+
+    sys.exit(ret)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,7 @@ UI推理主脚本
 
 import os
 import sys
+import time
 import argparse
 import numpy as np
 import torch
@@ -20,6 +21,8 @@ sys.path.insert(0, APP_BASE_DIR)
 
 from lib.tools.util.configer import Configer
 from lib.tools.util.logger import Logger as Log
+from lib.tools.util.telemetry import Telemetry
+from lib.tools.util.tracer import Tracer
 from lib.tools.helper.image_helper import ImageHelper
 from lib.runner.runner_helper import RunnerHelper
 from lib.runner.blob_helper import BlobHelper
@@ -37,14 +40,15 @@ def load_and_preprocess_image(image_path, configer):
     
     # 读取图片（ImageHelper.read_image已修复中文路径问题，会自动尝试多种方法）
     try:
-        # 使用配置的工具读取图片（cv2或pil）
-        img_np = ImageHelper.read_image(image_path, tool=image_tool, mode=input_mode)
-        # 确保返回的是numpy数组
-        if isinstance(img_np, Image.Image):
-            img_np = np.array(img_np)
-            # 如果input_mode是BGR，需要将RGB转换为BGR
-            if input_mode == 'BGR':
-                img_np = cv2.cvtColor(img_np, cv2.COLOR_RGB2BGR)
+        with Tracer.span('decode', tool=image_tool):
+            # 使用配置的工具读取图片（cv2或pil）
+            img_np = ImageHelper.read_image(image_path, tool=image_tool, mode=input_mode)
+            # 确保返回的是numpy数组
+            if isinstance(img_np, Image.Image):
+                img_np = np.array(img_np)
+                # 如果input_mode是BGR，需要将RGB转换为BGR
+                if input_mode == 'BGR':
+                    img_np = cv2.cvtColor(img_np, cv2.COLOR_RGB2BGR)
     except Exception as e:
         # 如果读取失败，记录错误并重新抛出
         Log.error(f"Failed to load image from {image_path}: {e}")
@@ -54,23 +58,26 @@ def load_and_preprocess_image(image_path, configer):
     height, width = img_np.shape[:2]
     img_size = [width, height]
     
-    # 为了显示，创建一个PIL Image（用于后续的可视化）
-    # 如果input_mode是BGR，转换为RGB用于显示
-    if input_mode == 'BGR':
-        img_for_display = Image.fromarray(cv2.cvtColor(img_np, cv2.COLOR_BGR2RGB))
-    else:
-        img_for_display = Image.fromarray(img_np)
-    
+    # 为了显示，创建一个PIL Image（用于后续的可视化），单独计时，不计入preprocess
+    with Tracer.span('display_convert', size=img_size):
+        # 如果input_mode是BGR，转换为RGB用于显示
+        if input_mode == 'BGR':
+            img_for_display = Image.fromarray(cv2.cvtColor(img_np, cv2.COLOR_BGR2RGB))
+        else:
+            img_for_display = Image.fromarray(img_np)
+
     # 预处理为tensor（使用numpy数组，保持BGR格式）
     from lib.data.transforms import ToTensor, Normalize, Compose
-    
-    img_transform = Compose([
-        ToTensor(),
-        Normalize(**configer.get('data', 'normalize')),
-    ])
-    
-    # ToTensor可以处理numpy数组，会保持颜色通道顺序（BGR）
-    img_tensor = img_transform(img_np)
+
+    # preprocess只包含ToTensor+Normalize
+    with Tracer.span('preprocess', size=img_size):
+        img_transform = Compose([
+            ToTensor(),
+            Normalize(**configer.get('data', 'normalize')),
+        ])
+
+        # ToTensor可以处理numpy数组，会保持颜色通道顺序（BGR）
+        img_tensor = img_transform(img_np)
     
     return img_tensor, img_size, img_for_display
 
@@ -86,9 +93,10 @@ def inference_single_image(model, img_tensor, original_size, device, configer, b
     data_dict = {'img': img_bchw}
     
     # 推理
-    with torch.no_grad():
+    with torch.no_grad(), Tracer.span('forward', sync=True, size=list(img_bchw.shape)):
         output = model(data_dict)
-        
+
+    with Tracer.span('resize_argmax', size=original_size):
         # 处理输出
         if isinstance(output, dict):
             logits = output['out']
@@ -140,8 +148,15 @@ def main():
                         help='类别名称列表（不包括背景）')
     parser.add_argument('--gpu', type=int, default=0,
                         help='使用的GPU ID（-1表示使用CPU）')
+    parser.add_argument('--trace', type=str, default=None,
+                        help='把各阶段耗时写成 Chrome trace JSON（chrome://tracing 或 ui.perfetto.dev 打开）')
+    parser.add_argument('--telemetry_dir', type=str, default=None,
+                        help='把各阶段耗时与峰值内存追加到该目录的 ui_inference.jsonl / ui_inference.prom')
     
     args = parser.parse_args()
+    start_time = time.time()
+    if args.trace is not None or args.telemetry_dir is not None:
+        Tracer.enable()
     
     # 规范化可能的相对路径（支持打包目录）
     def resolve_path(p):
@@ -152,62 +167,65 @@ def main():
             return cand
         return os.path.join(APP_BASE_DIR, p)
 
-    args.config = resolve_path(args.config)
-    args.checkpoint = resolve_path(args.checkpoint)
-    args.image = resolve_path(args.image)
-    args.output = os.path.abspath(args.output)
+    with Tracer.span('resolve_paths'):
+        args.config = resolve_path(args.config)
+        args.checkpoint = resolve_path(args.checkpoint)
+        args.image = resolve_path(args.image)
+        args.output = os.path.abspath(args.output)
 
     # 初始化日志
     Log.init(log_level='info')
     
     # 加载配置 - 处理配置文件路径
-    config_path = args.config
-    if not os.path.isabs(config_path):
-        config_path = os.path.normpath(config_path)
-        # 在打包环境中，优先从 _MEIPASS 目录查找配置文件
-        if getattr(sys, 'frozen', False):
-            # 单文件模式：配置文件在临时解压目录中
-            meipass_path = os.path.join(APP_BASE_DIR, config_path)
-            if os.path.exists(meipass_path):
-                config_path = meipass_path
-            else:
-                # 尝试从当前工作目录查找
-                cwd_path = os.path.abspath(config_path)
-                if os.path.exists(cwd_path):
-                    config_path = cwd_path
+    with Tracer.span('resolve_paths'):
+        config_path = args.config
+        if not os.path.isabs(config_path):
+            config_path = os.path.normpath(config_path)
+            # 在打包环境中，优先从 _MEIPASS 目录查找配置文件
+            if getattr(sys, 'frozen', False):
+                # 单文件模式：配置文件在临时解压目录中
+                meipass_path = os.path.join(APP_BASE_DIR, config_path)
+                if os.path.exists(meipass_path):
+                    config_path = meipass_path
                 else:
-                    # 尝试从可执行文件目录查找
-                    exe_dir = os.path.dirname(sys.executable)
-                    candidate = os.path.normpath(os.path.join(exe_dir, args.config))
-                    if os.path.exists(candidate):
-                        config_path = candidate
-        else:
-            # 开发环境：从当前工作目录或项目根目录查找
-            if not os.path.isabs(config_path):
-                config_path = os.path.abspath(config_path)
+                    # 尝试从当前工作目录查找
+                    cwd_path = os.path.abspath(config_path)
+                    if os.path.exists(cwd_path):
+                        config_path = cwd_path
+                    else:
+                        # 尝试从可执行文件目录查找
+                        exe_dir = os.path.dirname(sys.executable)
+                        candidate = os.path.normpath(os.path.join(exe_dir, args.config))
+                        if os.path.exists(candidate):
+                            config_path = candidate
+            else:
+                # 开发环境：从当前工作目录或项目根目录查找
+                if not os.path.isabs(config_path):
+                    config_path = os.path.abspath(config_path)
     
     if not os.path.exists(config_path):
         Log.error(f"Config file not found: {config_path}")
         Log.error(f"Tried paths: {args.config}, {os.path.abspath(args.config)}, {os.path.join(APP_BASE_DIR, args.config) if getattr(sys, 'frozen', False) else 'N/A'}")
         raise FileNotFoundError(f"Config file not found: {config_path}")
     
-    configer = Configer(config_file=config_path)
-    configer.add('network.resume', args.checkpoint)  # 临时设置，后面会更新为解析后的路径
-    # 推理阶段设置为 test，避免模型内根据 phase 访问失败
-    _phase = configer.get('phase', default=None)
-    if _phase is None:
-        configer.add('phase', 'test')
-    else:
-        configer.update('phase', 'test')
-    # 兼容缺失的严格加载开关
-    if configer.get('network', 'resume_strict', default=None) is None:
-        configer.add('network.resume_strict', False)
-    if configer.get('network', 'resume_continue', default=None) is None:
-        configer.add('network.resume_continue', False)
-    if configer.get('network', 'resume_val', default=None) is None:
-        configer.add('network.resume_val', False)
-    if configer.get('network', 'gather', default=None) is None:
-        configer.add('network.gather', True)
+    with Tracer.span('config_parse'):
+        configer = Configer(config_file=config_path)
+        configer.add('network.resume', args.checkpoint)  # 临时设置，后面会更新为解析后的路径
+        # 推理阶段设置为 test，避免模型内根据 phase 访问失败
+        _phase = configer.get('phase', default=None)
+        if _phase is None:
+            configer.add('phase', 'test')
+        else:
+            configer.update('phase', 'test')
+        # 兼容缺失的严格加载开关
+        if configer.get('network', 'resume_strict', default=None) is None:
+            configer.add('network.resume_strict', False)
+        if configer.get('network', 'resume_continue', default=None) is None:
+            configer.add('network.resume_continue', False)
+        if configer.get('network', 'resume_val', default=None) is None:
+            configer.add('network.resume_val', False)
+        if configer.get('network', 'gather', default=None) is None:
+            configer.add('network.gather', True)
     
     # 设置设备
     if args.gpu >= 0 and torch.cuda.is_available():
@@ -228,59 +246,63 @@ def main():
     
     # 加载模型
     Log.info('Loading model...')
-    model_manager = ModelManager(configer)
-    model = model_manager.get_seg_model()
+    with Tracer.span('model_build'):
+        model_manager = ModelManager(configer)
+        model = model_manager.get_seg_model()
     
     # 加载检查点 - 处理相对路径
-    checkpoint_path = args.checkpoint
-    if not os.path.isabs(checkpoint_path):
-        checkpoint_path = os.path.normpath(checkpoint_path)
+    with Tracer.span('resolve_paths'):
+        checkpoint_path = args.checkpoint
         if not os.path.isabs(checkpoint_path):
-            checkpoint_path = os.path.abspath(checkpoint_path)
-        # 如果还是不存在，尝试从可执行文件目录解析
-        if not os.path.exists(checkpoint_path) and getattr(sys, 'frozen', False):
-            exe_dir = os.path.dirname(sys.executable)
-            candidate = os.path.normpath(os.path.join(exe_dir, args.checkpoint))
-            if os.path.exists(candidate):
-                checkpoint_path = candidate
-    
-    if os.path.exists(checkpoint_path):
-        Log.info(f'Loading checkpoint from {checkpoint_path}')
-        configer.update('network.resume', checkpoint_path)
-        model = RunnerHelper.load_net(type('obj', (object,), {'configer': configer})(), model)
-        # 如果模型是DataParallel，获取底层模型
-        if hasattr(model, 'module'):
-            model = model.module
-    else:
-        Log.warn(f'Checkpoint not found: {checkpoint_path}')
-        Log.warn(f'Original path: {args.checkpoint}')
-        if getattr(sys, 'frozen', False):
-            Log.warn(f'Executable directory: {os.path.dirname(sys.executable)}')
-        Log.warn('Using untrained model!')
+            checkpoint_path = os.path.normpath(checkpoint_path)
+            if not os.path.isabs(checkpoint_path):
+                checkpoint_path = os.path.abspath(checkpoint_path)
+            # 如果还是不存在，尝试从可执行文件目录解析
+            if not os.path.exists(checkpoint_path) and getattr(sys, 'frozen', False):
+                exe_dir = os.path.dirname(sys.executable)
+                candidate = os.path.normpath(os.path.join(exe_dir, args.checkpoint))
+                if os.path.exists(candidate):
+                    checkpoint_path = candidate
+    
+    with Tracer.span('checkpoint_load'):
+        if os.path.exists(checkpoint_path):
+            Log.info(f'Loading checkpoint from {checkpoint_path}')
+            configer.update('network.resume', checkpoint_path)
+            model = RunnerHelper.load_net(type('obj', (object,), {'configer': configer})(), model)
+            # 如果模型是DataParallel，获取底层模型
+            if hasattr(model, 'module'):
+                model = model.module
+        else:
+            Log.warn(f'Checkpoint not found: {checkpoint_path}')
+            Log.warn(f'Original path: {args.checkpoint}')
+            if getattr(sys, 'frozen', False):
+                Log.warn(f'Executable directory: {os.path.dirname(sys.executable)}')
+            Log.warn('Using untrained model!')
     
-    model = model.to(device)
-    model.eval()
+        model = model.to(device)
+        model.eval()
     
     # 初始化BlobHelper
     blob_helper = BlobHelper(configer)
     
     # 加载图片 - 处理相对路径和绝对路径
-    image_path = args.image
-    # 如果是相对路径，先尝试规范化（处理 .. 等）
-    if not os.path.isabs(image_path):
-        # 规范化路径（解析 .. 和 .）
-        image_path = os.path.normpath(image_path)
-        # 如果不是绝对路径，尝试从当前工作目录解析
+    with Tracer.span('resolve_paths'):
+        image_path = args.image
+        # 如果是相对路径，先尝试规范化（处理 .. 等）
         if not os.path.isabs(image_path):
-            # 从当前工作目录解析
-            image_path = os.path.abspath(image_path)
-        # 如果还是不存在，尝试从可执行文件目录解析（针对打包后的exe）
-        if not os.path.exists(image_path) and getattr(sys, 'frozen', False):
-            exe_dir = os.path.dirname(sys.executable)
-            # 尝试将路径相对于exe目录解析
-            candidate = os.path.normpath(os.path.join(exe_dir, args.image))
-            if os.path.exists(candidate):
-                image_path = candidate
+            # 规范化路径（解析 .. 和 .）
+            image_path = os.path.normpath(image_path)
+            # 如果不是绝对路径，尝试从当前工作目录解析
+            if not os.path.isabs(image_path):
+                # 从当前工作目录解析
+                image_path = os.path.abspath(image_path)
+            # 如果还是不存在，尝试从可执行文件目录解析（针对打包后的exe）
+            if not os.path.exists(image_path) and getattr(sys, 'frozen', False):
+                exe_dir = os.path.dirname(sys.executable)
+                # 尝试将路径相对于exe目录解析
+                candidate = os.path.normpath(os.path.join(exe_dir, args.image))
+                if os.path.exists(candidate):
+                    image_path = candidate
     
     Log.info(f'Loading image: {image_path}')
     if not os.path.exists(image_path):
@@ -303,17 +325,19 @@ def main():
     Log.info(f'Unique classes in prediction: {np.unique(prediction_mask)}')
     
     # 确保预测掩码尺寸与原始图片一致
-    if prediction_mask.shape[0] != img_size[1] or prediction_mask.shape[1] != img_size[0]:
-        Log.info('Resizing prediction mask to original image size...')
-        prediction_mask = cv2.resize(
-            prediction_mask.astype(np.uint8),
-            (img_size[0], img_size[1]),
-            interpolation=cv2.INTER_NEAREST
-        ).astype(np.int32)
+    with Tracer.span('mask_resize'):
+        if prediction_mask.shape[0] != img_size[1] or prediction_mask.shape[1] != img_size[0]:
+            Log.info('Resizing prediction mask to original image size...')
+            prediction_mask = cv2.resize(
+                prediction_mask.astype(np.uint8),
+                (img_size[0], img_size[1]),
+                interpolation=cv2.INTER_NEAREST
+            ).astype(np.int32)
     
     # 解析掩码为组件
     Log.info('Parsing mask to components...')
-    components = parse_mask_to_components(prediction_mask, args.class_names)
+    with Tracer.span('parse_mask_to_components'):
+        components = parse_mask_to_components(prediction_mask, args.class_names)
     Log.info(f'Found {len(components)} components')
     
     # 打印组件信息
@@ -321,32 +345,47 @@ def main():
         Log.info(f'Component {i+1}: {comp["type"]} at {comp["bbox"]}')
     
     # 创建输出目录
-    os.makedirs(args.output, exist_ok=True)
+    with Tracer.span('write_mask'):
+        os.makedirs(args.output, exist_ok=True)
     
-    # 保存预测掩码可视化
-    mask_vis_path = os.path.join(args.output, 'prediction_mask.png')
-    mask_vis = (prediction_mask * 255 / max(1, prediction_mask.max())).astype(np.uint8)
-    Image.fromarray(mask_vis).save(mask_vis_path)
-    Log.info(f'Saved prediction mask to {mask_vis_path}')
+        # 保存预测掩码可视化
+        mask_vis_path = os.path.join(args.output, 'prediction_mask.png')
+        mask_vis = (prediction_mask * 255 / max(1, prediction_mask.max())).astype(np.uint8)
+        Image.fromarray(mask_vis).save(mask_vis_path)
+        Log.info(f'Saved prediction mask to {mask_vis_path}')
     
     # 生成HTML
     output_html_path = os.path.join(args.output, 'output.html')
     image_name = os.path.basename(image_path)
     
     # 复制图片到输出目录（相对路径）
-    output_image_path = os.path.join(args.output, image_name)
-    if not os.path.exists(output_image_path):
-        import shutil
-        shutil.copy2(image_path, output_image_path)
+    with Tracer.span('copy_image'):
+        output_image_path = os.path.join(args.output, image_name)
+        if not os.path.exists(output_image_path):
+            import shutil
+            shutil.copy2(image_path, output_image_path)
     
     Log.info('Generating HTML...')
-    generate_html_css(
-        components,
-        output_html_path,
-        img_size,
-        background_image=image_name  # 使用相对路径
-    )
+    with Tracer.span('generate_html'):
+        generate_html_css(
+            components,
+            output_html_path,
+            img_size,
+            background_image=image_name  # 使用相对路径
+        )
     Log.info(f'HTML generated: {output_html_path}')
+
+    if args.telemetry_dir is not None:
+        telemetry = Telemetry(os.path.abspath(args.telemetry_dir), 'ui_inference', flush_iters=1,
+                              labels=dict(device=str(device)))
+        telemetry.record(step_time=time.time() - start_time, batch_size=1, image=image_path,
+                         width=img_size[0], height=img_size[1], components=len(components),
+                         stage_seconds=Tracer.totals())
+        Log.info(f'Telemetry written to {telemetry.jsonl_path}')
+
+    if args.trace is not None:
+        Tracer.export(args.trace)
+        Log.info(f'Trace written to {args.trace}\n{Tracer.summary()}')
     
     Log.info('Done!')
     return 0